@@ -13,7 +13,10 @@ import tempfile
 
 import pytest
 
+import isa
 import machine
+import profiler
+import tracer
 import translator
 
 
@@ -72,3 +75,74 @@ def test_whole_by_golden(golden, caplog):
         assert code == golden.out["code"]
         assert stdout.getvalue() == golden.out["output"]
         assert caplog.text == golden.out["log"]
+
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+
+
+def translate(name: str, cache_dir=None) -> list:
+    """Машинный код примера examples/<name>.asm."""
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        target = os.path.join(tmpdirname, "target.txt")
+        translator.main([os.path.join(EXAMPLES, name + ".asm"), target] + ([cache_dir] if cache_dir else []))
+        return isa.read_code(target)
+
+
+def test_binary_tracer():
+    code = translate("hello")
+    stream = io.BytesIO()
+    assert machine.simulation(code, [], 250, 100000, tracer=tracer.BinaryTracer(stream)) == ("Hello World!", 63, 166)
+
+    records = list(tracer.read_binary_trace(stream.getvalue()))
+    # instruction -- перед каждой инструкцией, в том числе перед HALT (не входит в instr_counter).
+    assert len([record for record in records if record[0] == tracer.INSTRUCTION]) == 63 + 1
+    assert "".join(chr(record[1]) for record in records if record[0] == tracer.OUTPUT) == "Hello World!"
+    assert records[-1] == (tracer.HALT, 166, "halt")
+
+
+def test_checkpoint_restore():
+    code = translate("hello")
+    expect = machine.simulation(code, [], 250, 100000)
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        target = os.path.join(tmpdirname, "checkpoint.json")
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            assert machine.simulation(code, [], 250, 7, checkpoint_file=target) == ("H", 7, 19)
+        assert stdout.getvalue() == "too long execution, increase limit!\n"
+        assert machine.read_state(target)["reason"] == "limit"
+        assert machine.simulation(None, None, None, 100000, restore=target) == expect
+
+        # Снимок остановившейся модели возвращает тот же результат, не продолжая исполнение.
+        assert machine.simulation(code, [], 250, 100000, checkpoint_file=target, checkpoint_every=10) == expect
+        assert machine.read_state(target)["reason"] == "halt"
+        assert machine.simulation(None, None, None, 100000, restore=target) == expect
+
+
+def test_prefix_state():
+    hello = translate("hello")
+    for _ in range(2):  # второй запуск -- из кэша
+        assert machine.simulation(hello, [], 250, 100000, precompute_prefix=True) == ("Hello World!", 63, 166)
+        assert machine.prefix_state(hello, 250, 100000)["reason"] == "halt"
+
+    cat = translate("cat")
+    for text in ["ab", "", "hello"]:
+        tokens = list(text) + [chr(0)]
+        expect = machine.simulation(cat, tokens, 250, 100000)
+        assert machine.simulation(cat, tokens, 250, 100000, precompute_prefix=True) == expect
+    assert expect[0] == "hello"
+
+
+def test_profiler():
+    code = translate("hello")
+    profile = profiler.Profiler()
+    _, instr_counter, ticks = machine.simulation(code, [], 250, 100000, tracer=profile)
+    assert (sum(profile.counts), sum(profile.ticks)) == (instr_counter, ticks) == (63, 166)
+    assert profiler.report(profile)[0] == "instr: 63 ticks: 166"
+
+
+def test_translation_cache():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name in ["hello", "cat", "fact"]:
+            expect = translate(name)
+            assert translate(name, cache_dir) == expect  # запись в кэш
+            assert translate(name, cache_dir) == expect  # чтение из кэша
+        assert len(os.listdir(cache_dir)) > 0
@@ -1,10 +1,14 @@
+import hashlib
+import json
 import logging
+import os
 from collections import deque
 import sys
 
-from typing import List, Tuple, Deque
+from typing import Dict, List, Tuple, Deque, Optional, Union
 
 from isa import Opcode, read_code, STDOUT_PORT, STDIN_PORT, ops_gr
+from tracer import Tracer, TextTracer, INPUT, OUTPUT
 
 
 class RegisterUnit:
@@ -249,16 +253,49 @@ class DataPath:
             self.latch_imm_gen()
 
 
+DATA_PATH_SIGNALS = (
+    "latch_instruct", "latch_program_counter", "latch_regs_to_bc",
+    "latch_address_to_memory", "latch_address_to_memory_from_imm", "latch_reg_from_memory",
+    "store_data_to_memory_from_reg", "store_data_to_memory_from_imm",
+    "latch_imm_to_alu", "latch_rs1_to_alu", "latch_rs2_to_alu", "compute_alu", "latch_reg_from_alu",
+)
+
+
+def _handles(tracer: Tracer, event: str) -> bool:
+    handler = getattr(tracer, event)
+    return getattr(handler, "__func__", handler) is not getattr(Tracer, event)
+
+
+def _traced_signal(method, hook, name: str):
+    def traced(*args, **kwargs):
+        hook(name)
+        return method(*args, **kwargs)
+    return traced
+
+
 class ControlUnit:
     data_path: DataPath
+    tracer: Optional[Tracer]
 
     def __init__(self, data_path):
         self.data_path = data_path
         self._tick = 0
+        self.tracer = None
+
+    def attach_tracer(self, tracer: Tracer):
+        """Подключает трассировщик: сигналы и такты перехватываются, только если он их обрабатывает."""
+        self.tracer = tracer
+        if _handles(tracer, "signal"):
+            for name in DATA_PATH_SIGNALS:
+                setattr(self.data_path, name, _traced_signal(getattr(self.data_path, name), tracer.signal, name))
+        if _handles(tracer, "tick"):
+            def traced_tick():
+                tracer.tick(self)
+                self._tick += 1
+            self.tick = traced_tick
 
     def tick(self):
         """Счётчик тактов процессора. Вызывается при переходе на следующий такт."""
-        logging.debug('%s', self)
         self._tick += 1
 
     def current_tick(self):
@@ -268,9 +305,6 @@ class ControlUnit:
     def decode_and_execute_instruction(self):
         opcode = Opcode(self.data_path.select_instruction())
 
-        print(opcode)
-        print(self.data_path.ru.registers)
-
         dp = self.data_path
         dp.latch_instruct()
         self.tick()
@@ -313,11 +347,17 @@ class ControlUnit:
 
         elif opcode in ops_gr["io"]:
             if self.data_path.immediately_generator == STDOUT_PORT:
-                self.data_path.io.output(self.data_path.ru.get_rs1_data())
+                value = self.data_path.ru.get_rs1_data()
+                self.data_path.io.output(value)
+                if self.tracer is not None:
+                    self.tracer.io(self.data_path, OUTPUT, value)
             elif self.data_path.immediately_generator == STDIN_PORT:
                 if self.data_path.io.eof():
                     raise EOFError
-                self.data_path.ru.set_rd_data(self.data_path.io.input())
+                value = self.data_path.io.input()
+                self.data_path.ru.set_rd_data(value)
+                if self.tracer is not None:
+                    self.tracer.io(self.data_path, INPUT, value)
 
         elif opcode is Opcode.HALT:
             raise StopIteration()
@@ -366,31 +406,188 @@ def show_memory(data_memory) -> str:
     return data_memory_state
 
 
-def simulation(united_memory: list, input_tokens, data_memory_size, limit):
+def save_state(control_unit: ControlUnit, instr_counter: int, reason: str = "limit") -> dict:
+    """Снимок полного состояния модели (JSON-совместимый словарь).
+
+    reason -- причина остановки: после "halt" и "eof" указатель инструкций уже
+    за остановившей инструкцией, поэтому такой снимок не продолжается, а
+    возвращает тот же результат (см. simulation)."""
+    dp = control_unit.data_path
+    opcode, args = dp.current_instruction
+    return {
+        "reason": reason,
+        "tick": control_unit.current_tick(),
+        "instr_counter": instr_counter,
+        "united_memory": dp.united_memory,
+        "data_memory_size": dp.data_memory_size,
+        "instruction_pointer": dp.instruction_pointer,
+        "current_address": dp.current_address,
+        "current_data": dp.current_data,
+        "immediately_generator": dp.immediately_generator,
+        "current_instruction": [opcode, list(args)],
+        "current_addr_type": dp.current_addr_type,
+        "args": list(dp.args) if hasattr(dp, "args") else None,
+        "registers": list(dp.ru.registers),
+        "rd_rs1_rs2": [dp.ru.rd, dp.ru.rs1, dp.ru.rs2],
+        "alu": [dp.alu.a, dp.alu.b, dp.alu.output],
+        "bc": [dp.bc.a, dp.bc.b],
+        "input_buffer": list(dp.io.input_buffer),
+        "output_buffer": list(dp.io.output_buffer),
+    }
+
+
+def restore_state(state: dict) -> Tuple[ControlUnit, int]:
+    """Модель и счётчик инструкций из снимка `save_state`."""
+    united_memory = state["united_memory"]
+    for word in united_memory:
+        if "opcode" in word:
+            word["opcode"] = Opcode(word["opcode"])
+    dp = DataPath(united_memory, state["data_memory_size"], [])
+    dp.instruction_pointer = state["instruction_pointer"]
+    dp.current_address = state["current_address"]
+    dp.current_data = state["current_data"]
+    dp.immediately_generator = state["immediately_generator"]
+    opcode, args = state["current_instruction"]
+    dp.current_instruction = Opcode(opcode), args
+    dp.current_addr_type = state["current_addr_type"]
+    if state["args"] is not None:
+        dp.args = deque(state["args"])
+    dp.ru.registers = list(state["registers"])
+    dp.ru.rd, dp.ru.rs1, dp.ru.rs2 = state["rd_rs1_rs2"]
+    dp.alu.a, dp.alu.b, dp.alu.output = state["alu"]
+    dp.bc.a, dp.bc.b = state["bc"]
+    dp.io.input_buffer = deque(state["input_buffer"])
+    dp.io.output_buffer = deque(state["output_buffer"])
+
+    control_unit = ControlUnit(dp)
+    control_unit._tick = state["tick"]
+    return control_unit, state["instr_counter"]
+
+
+def write_state(filename: str, state: dict):
+    tmp = filename + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(tmp, filename)
+
+
+def read_state(filename: str) -> dict:
+    with open(filename, encoding="utf-8") as file:
+        return json.load(file)
+
+
+_prefixes: Dict[Tuple[str, int], str] = {}
+
+
+def _waits_input(state: dict) -> bool:
+    word = state["united_memory"][state["instruction_pointer"]]
+    return word["opcode"] == Opcode.IN and int(word["args"][1]) == STDIN_PORT
+
+
+def prefix_state(united_memory: list, data_memory_size: int, limit: int) -> Optional[dict]:
+    """Снимок состояния перед первым чтением из порта ввода (IN ..., 0) -- эта часть
+    программы от ввода не зависит. Если программа остановилась раньше (HALT или
+    limit), снимок содержит эту причину остановки. Кэшируется по хэшу программы;
+    None, если снимок сделан позже limit инструкций."""
+    key = hashlib.sha256(json.dumps(united_memory).encode()).hexdigest(), data_memory_size
+    cached = json.loads(_prefixes[key]) if key in _prefixes else None
+    if cached is None or (cached["reason"] == "limit" and cached["instr_counter"] < limit
+                          and not _waits_input(cached)):
+        # Копия через JSON: исходная united_memory не должна изменяться.
+        initial = save_state(ControlUnit(DataPath(united_memory, data_memory_size, [])), 0)
+        control_unit, instr_counter = restore_state(json.loads(json.dumps(initial)))
+        dp = control_unit.data_path
+        reason = "limit"
+        try:
+            while limit > instr_counter:
+                word = dp.united_memory[dp.instruction_pointer]
+                if word["opcode"] is Opcode.IN and int(word["args"][1]) == STDIN_PORT:
+                    break
+                control_unit.decode_and_execute_instruction()
+                instr_counter += 1
+        except StopIteration:
+            reason = "halt"
+        _prefixes[key] = json.dumps(save_state(control_unit, instr_counter, reason))
+    state = json.loads(_prefixes[key])
+    return state if limit >= state["instr_counter"] else None
+
+
+def run(control_unit: ControlUnit, instr_counter: int, limit: int) -> Tuple[int, str]:
+    """Исполнение до limit инструкций. Возвращает счётчик и причину остановки ("halt", "eof", "limit")."""
+    tracer = control_unit.tracer
+    if tracer is not None and not _handles(tracer, "instruction"):
+        tracer = None
+    try:
+        if tracer is None:
+            while limit > instr_counter:
+                control_unit.decode_and_execute_instruction()
+                instr_counter += 1
+        else:
+            while limit > instr_counter:
+                tracer.instruction(control_unit)
+                control_unit.decode_and_execute_instruction()
+                instr_counter += 1
+    except EOFError:
+        return instr_counter, "eof"
+    except StopIteration:
+        return instr_counter, "halt"
+    return instr_counter, "limit"
+
+
+def simulation(united_memory: list, input_tokens, data_memory_size, limit, tracer: Optional[Tracer] = None,
+               restore: Union[str, dict, None] = None, checkpoint_file: Optional[str] = None,
+               checkpoint_every: Optional[int] = None, precompute_prefix: bool = False):
     """Запуск симуляции процессора.
 
     Длительность моделирования ограничена количеством выполненных инструкций.
+    Трассировщик по умолчанию -- TextTracer при уровне журнала DEBUG, иначе без трассировки.
+
+    Контрольные точки: restore -- продолжить с сохранённого состояния (файл или словарь;
+    united_memory и input_tokens тогда берутся из него), checkpoint_file -- записать
+    состояние при остановке, а при checkpoint_every -- ещё и каждые checkpoint_every инструкций.
+    Состояние остановившейся модели (HALT, конец ввода) хранит причину остановки и при
+    restore не продолжается: возвращается тот же результат.
+    precompute_prefix -- начать с кэшированного состояния перед первым вводом (prefix_state).
     """
     # logging.info("{ INPUT MESSAGE } [ `%s` ]", "".join(input_tokens))
     # logging.info("{ INPUT TOKENS  } [ %s ]", ",".join(
     #     [str(ord(token)) for token in input_tokens]))
 
-    data_path = DataPath(united_memory, data_memory_size, input_tokens)
-
-    control_unit = ControlUnit(data_path)
-    instr_counter = 0
-
-    try:
-        while True:
-            if not limit > instr_counter:
-                print("too long execution, increase limit!")
-                break
-            control_unit.decode_and_execute_instruction()
-            instr_counter += 1
-    except EOFError:
+    if restore is None and precompute_prefix:
+        restore = prefix_state(united_memory, data_memory_size, limit)
+        if restore is not None:
+            restore["input_buffer"] = [ord(token) for token in input_tokens]
+    reason = "limit"
+    if restore is not None:
+        state = read_state(restore) if isinstance(restore, str) else restore
+        control_unit, instr_counter = restore_state(state)
+        data_path = control_unit.data_path
+        # Снимок остановившейся модели не продолжается: результат -- тот же.
+        reason = state.get("reason", "limit")
+    else:
+        data_path = DataPath(united_memory, data_memory_size, input_tokens)
+        control_unit = ControlUnit(data_path)
+        instr_counter = 0
+
+    if tracer is None and logging.getLogger().isEnabledFor(logging.DEBUG):
+        tracer = TextTracer()
+    if tracer is not None:
+        control_unit.attach_tracer(tracer)
+
+    step = checkpoint_every or limit
+    while reason == "limit" and limit > instr_counter:
+        instr_counter, reason = run(control_unit, instr_counter, min(limit, instr_counter + step))
+        if checkpoint_file is not None and reason == "limit" and limit > instr_counter:
+            write_state(checkpoint_file, save_state(control_unit, instr_counter))
+    if checkpoint_file is not None:
+        write_state(checkpoint_file, save_state(control_unit, instr_counter, reason))
+
+    if reason == "limit":
+        print("too long execution, increase limit!")
+    elif reason == "eof":
         logging.warning('Input buffer is empty!')
-    except StopIteration:
-        pass
+    if tracer is not None:
+        tracer.halt(control_unit, reason)
     # ... control_unit.current_tick(), show_memory(data_path.united_memory)
     return ''.join(map(chr, data_path.io.output_buffer)), instr_counter, control_unit.current_tick()
 
@@ -0,0 +1,192 @@
+"""
+profiler
+
+Профиль исполнения модели процессора по адресам инструкций.
+
+Profiler -- трассировщик (tracer.Tracer) для machine.simulation. Модель вызывает
+`instruction` перед каждой инструкцией, поэтому каждый вызов завершает предыдущую:
+её счётчик исполнений увеличивается, к её тактам добавляются такты с прошлого вызова.
+Счётчики -- `array("Q")` по элементу на слово кода, выделяются при первом событии;
+сигналы и такты не перехватываются.
+
+Сумма counts -- instr_counter, сумма ticks -- счётчик тактов (HALT и IN на конце
+ввода добавляют такты без исполнения). После restore учитывается только
+исполненная часть.
+
+Счётчики сводятся по базовым блокам и циклам. В машинном коде нет позиций в
+исходном тексте, поэтому горячие места показываются адресом и текстом инструкции.
+Цикл -- диапазон адресов обратного перехода: от его цели (заголовка) до последнего
+обратного перехода на этот заголовок.
+
+Запуск: profiler.py <code.txt> <input> [<profile.json>]
+"""
+import json
+import logging
+import sys
+from array import array
+from typing import Dict, List, NamedTuple, Optional
+
+import machine
+from isa import Opcode, ops_gr, read_code
+from tracer import Tracer
+
+
+class BlockProfile(NamedTuple):
+    """Базовый блок [start, end): количество входов, исполненные инструкции и такты."""
+    start: int
+    end: int
+    count: int
+    instr: int
+    ticks: int
+
+
+class LoopProfile(NamedTuple):
+    """Цикл [header, end): исполнения заголовка, исполненные инструкции и такты."""
+    header: int
+    end: int
+    count: int
+    instr: int
+    ticks: int
+
+
+def code_size(united_memory: list) -> int:
+    """Количество слов кода (код расположен перед данными)."""
+    size = 0
+    while size < len(united_memory) and "opcode" in united_memory[size]:
+        size += 1
+    return size
+
+
+def _target(word: dict) -> Optional[int]:
+    if word["opcode"] in ops_gr["branch"]:
+        return word["args"][-1]
+    return None
+
+
+class Profiler(Tracer):
+    """Счётчики исполнений и тактов по адресам инструкций, накапливаются между запусками."""
+
+    def __init__(self):
+        self.code: List[dict] = []
+        self.counts: Optional[array] = None
+        self.ticks: Optional[array] = None
+        self._pc: Optional[int] = None
+        self._tick = 0
+
+    def instruction(self, control_unit):
+        tick = control_unit.current_tick()
+        pc = self._pc
+        if pc is None:
+            self._start(control_unit.data_path.united_memory)
+        else:
+            self.counts[pc] += 1
+            self.ticks[pc] += tick - self._tick
+        self._pc = control_unit.data_path.instruction_pointer
+        self._tick = tick
+
+    def halt(self, control_unit, reason: str):
+        # Счётчики нужны и после запуска без единой инструкции.
+        self._start(control_unit.data_path.united_memory)
+        if self._pc is not None:
+            self.ticks[self._pc] += control_unit.current_tick() - self._tick
+            self._pc = None
+
+    def _start(self, united_memory: list):
+        if self.counts is None:
+            self.code = united_memory[:code_size(united_memory)]
+            self.counts = array("Q", bytes(8 * len(self.code)))
+            self.ticks = array("Q", bytes(8 * len(self.code)))
+
+    def blocks(self) -> List[BlockProfile]:
+        """Профили базовых блоков в порядке адресов."""
+        leaders = {0}
+        for pc, word in enumerate(self.code):
+            target = _target(word)
+            if target is not None:
+                leaders.update((target, pc + 1))
+            elif word["opcode"] is Opcode.HALT:
+                leaders.add(pc + 1)
+        starts = sorted(leader for leader in leaders if leader < len(self.code))
+        return [
+            BlockProfile(start, end, self.counts[start], sum(self.counts[start:end]), sum(self.ticks[start:end]))
+            for start, end in zip(starts, starts[1:] + [len(self.code)])
+        ]
+
+    def loops(self) -> List[LoopProfile]:
+        """Профили циклов, от вложенных (коротких) к внешним."""
+        ends: Dict[int, int] = {}
+        for pc, word in enumerate(self.code):
+            target = _target(word)
+            if target is not None and target <= pc:
+                ends[target] = max(ends.get(target, 0), pc + 1)
+        loops = [
+            LoopProfile(header, end, self.counts[header], sum(self.counts[header:end]), sum(self.ticks[header:end]))
+            for header, end in ends.items()
+        ]
+        return sorted(loops, key=lambda loop: (loop.end - loop.header, loop.header))
+
+    def text(self, pc: int) -> str:
+        """Инструкция по адресу `pc` в виде `OPCODE args`."""
+        word = self.code[pc]
+        return " ".join([str(word["opcode"])] + [str(arg) for arg in word["args"]])
+
+
+def _hot(profiles: list) -> list:
+    return sorted((profile for profile in profiles if profile.instr), key=lambda profile: -profile.ticks)
+
+
+def report(profiler: Profiler, top: int = 10) -> List[str]:
+    """Итоги и до `top` самых затратных по тактам блоков и циклов."""
+    total = sum(profiler.ticks)
+    result = [f"instr: {sum(profiler.counts)} ticks: {total}"]
+    for kind, profiles in (("block", profiler.blocks()), ("loop", profiler.loops())):
+        for profile in _hot(profiles)[:top]:
+            start, end = profile[0], profile[1]
+            share = 100 * profile.ticks / total if total else 0
+            result.append(f"{kind} {start}-{end - 1} count: {profile.count} instr: {profile.instr} "
+                          f"ticks: {profile.ticks} ({share:.1f}%) at {profiler.text(start)}")
+    return result
+
+
+def dump(profiler: Profiler) -> dict:
+    """Профиль в виде словаря для JSON: счётчики инструкций в порядке адресов,
+    блоки и циклы -- от самых затратных по тактам."""
+    return {
+        "instr": sum(profiler.counts),
+        "ticks": sum(profiler.ticks),
+        "instructions": [
+            {"index": pc, "text": profiler.text(pc), "count": count, "ticks": ticks}
+            for pc, (count, ticks) in enumerate(zip(profiler.counts, profiler.ticks))
+        ],
+        "blocks": [profile._asdict() for profile in _hot(profiler.blocks())],
+        "loops": [profile._asdict() for profile in _hot(profiler.loops())],
+    }
+
+
+def main(args):
+    assert 2 <= len(args) <= 3, \
+        "Wrong arguments: profiler.py <code.txt> <input> [<profile.json>]"
+    code_file, input_file = args[:2]
+
+    with open(input_file, encoding="utf-8") as file:
+        input_token = list(file.read()) + [chr(0)]
+
+    profiler = Profiler()
+    output, _, _ = machine.simulation(
+        united_memory=read_code(code_file),
+        input_tokens=input_token,
+        data_memory_size=250,
+        limit=1000000,
+        tracer=profiler
+    )
+
+    print(f"Output is `{output}`")
+    print("\n".join(report(profiler)))
+    if len(args) == 3:
+        with open(args[2], "w", encoding="utf-8") as file:
+            json.dump(dump(profiler), file, indent=1)
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.INFO)
+    main(sys.argv[1:])
@@ -0,0 +1,120 @@
+"""
+tracer
+
+Протокол трассировщика модели процессора. Обработчики:
+
+- instruction -- состояние перед началом очередной инструкции;
+- signal -- управляющий сигнал (имя метода DataPath);
+- tick -- конец такта;
+- io -- значение, прочитанное из порта или записанное в порт;
+- halt -- конец моделирования ("halt", "eof" или "limit").
+
+Приёмники: NullTracer, TextTracer (журнал DEBUG в прежнем формате) и BinaryTracer;
+profiler.Profiler считает исполнения и такты по адресам инструкций.
+Без трассировщика модель работает без трассировки, сигналы и такты не перехватываются.
+"""
+import logging
+import struct
+from typing import BinaryIO, Dict
+
+INSTRUCTION, SIGNAL, TICK, INPUT, OUTPUT, HALT, NAME = range(7)
+
+
+class Tracer:
+    """Базовый трассировщик: все обработчики ничего не делают."""
+
+    def instruction(self, control_unit):
+        pass
+
+    def signal(self, name: str):
+        pass
+
+    def tick(self, control_unit):
+        pass
+
+    def io(self, data_path, kind: int, value: int):
+        pass
+
+    def halt(self, control_unit, reason: str):
+        pass
+
+
+class NullTracer(Tracer):
+    pass
+
+
+class TextTracer(Tracer):
+    """Состояние процессора на каждом такте, уровень DEBUG."""
+
+    def tick(self, control_unit):
+        logging.debug('%s', control_unit)
+
+
+class BinaryTracer(Tracer):
+    """Двоичные записи, каждая начинается с байта типа:
+
+    INSTRUCTION (такт, pc, регистры), SIGNAL (номер имени), TICK (такт),
+    INPUT/OUTPUT (значение), HALT (такт, номер имени), NAME (номер, длина, байты utf-8).
+    """
+
+    def __init__(self, stream: BinaryIO, signals: bool = False, ticks: bool = False):
+        self.stream = stream
+        self._names: Dict[str, int] = {}
+        if not signals:
+            self.signal = super().signal
+        if not ticks:
+            self.tick = super().tick
+
+    def _name(self, name: str) -> int:
+        if name not in self._names:
+            self._names[name] = len(self._names)
+            data = name.encode("utf-8")
+            self.stream.write(_HEADERS[NAME].pack(NAME, self._names[name], len(data)) + data)
+        return self._names[name]
+
+    def instruction(self, control_unit):
+        dp = control_unit.data_path
+        self.stream.write(_HEADERS[INSTRUCTION].pack(
+            INSTRUCTION, control_unit.current_tick(), dp.instruction_pointer, *dp.ru.registers))
+
+    def signal(self, name: str):
+        self.stream.write(_HEADERS[SIGNAL].pack(SIGNAL, self._name(name)))
+
+    def tick(self, control_unit):
+        self.stream.write(_HEADERS[TICK].pack(TICK, control_unit.current_tick()))
+
+    def io(self, data_path, kind: int, value: int):
+        self.stream.write(_HEADERS[kind].pack(kind, value))
+
+    def halt(self, control_unit, reason: str):
+        self.stream.write(_HEADERS[HALT].pack(HALT, control_unit.current_tick(), self._name(reason)))
+
+
+_HEADERS = {
+    INSTRUCTION: struct.Struct("<BQI5q"),
+    SIGNAL: struct.Struct("<BH"),
+    TICK: struct.Struct("<BQ"),
+    INPUT: struct.Struct("<Bq"),
+    OUTPUT: struct.Struct("<Bq"),
+    HALT: struct.Struct("<BQH"),
+    NAME: struct.Struct("<BHB"),
+}
+
+
+def read_binary_trace(data: bytes):
+    """Разбор двоичной трассы в кортежи (тип, поля...)."""
+    names = []
+    offset = 0
+    while offset < len(data):
+        header = _HEADERS[data[offset]]
+        record = header.unpack_from(data, offset)
+        offset += header.size
+        if record[0] == NAME:
+            names.append(data[offset:offset + record[2]].decode("utf-8"))
+            offset += record[2]
+        elif record[0] == SIGNAL:
+            yield SIGNAL, names[record[1]]
+        elif record[0] == HALT:
+            yield HALT, record[1], names[record[2]]
+        else:
+            yield record
@@ -1,9 +1,17 @@
+import os
 import re
 import sys
 
 from typing import Tuple, List
 from isa import write_code
 
+# Кэш трансляции общий с основной моделью (translation_cache.py в корне репозитория).
+# Корень добавляется в конец пути поиска, чтобы одноимённые модули EX (isa и др.) не подменялись.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from translation_cache import TranslationCache  # noqa: E402  pylint: disable=wrong-import-position
+
+VERSION = "1"  # входит в ключ кэша трансляции
+
 
 def translate_stage_1(raw: str) -> str:
     raws = raw.split("\n")
@@ -226,15 +234,29 @@ def translate_to_struct(text) -> list:
 
 
 def main(args):
-    assert len(args) == 2, \
-        "Wrong arguments: translator.py <input_file> <target_code_file>"
+    assert len(args) in (2, 3), \
+        "Wrong arguments: translator.py <input_file> <target_code_file> [<cache_dir>]"
 
-    source, target = args
+    source, target = args[:2]
+    cache_dir = args[2] if len(args) == 3 else None
     with open(source, "rt", encoding="utf-8") as f:
         source = f.read()
 
-    united_memory = translate_to_struct(source)
-    write_code(target, united_memory)
+    if cache_dir is None:
+        write_code(target, translate_to_struct(source))
+        return
+
+    cache = TranslationCache(cache_dir)
+    key = cache.key(source, VERSION)
+    text = cache.get(key)
+    if text is None:
+        write_code(target, translate_to_struct(source))
+        with open(target, encoding="utf-8") as f:
+            text = f.read()
+        cache.put(key, text)
+    else:
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(text)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+"""Пакетный запуск моделирования на пуле процессов.
+
+Задание (`Job`) -- файл машинного кода, файл ввода, лимит инструкций, размер
+памяти данных, модель: `"machine"` (`machine.simulation`) или `"ex"`
+(`EX/machine.simulation`) и размер страницы страничной памяти данных
+(только для `"machine"`; тогда размер памяти -- предел роста). Задания выполняются через
+`concurrent.futures.ProcessPoolExecutor`, результат каждого -- запись `Result`
+(вывод, счётчики инструкций и тактов, причина остановки, время работы).
+
+Особенности реализации:
+
+- каждый процесс-исполнитель загружает и декодирует программу один раз и
+  использует её во всех своих заданиях (`_programs`);
+- модули `EX` называются так же, как модули основной модели (`machine`,
+  `isa`), поэтому задания `"ex"` выполняются в отдельном пуле процессов,
+  запущенных заново (`spawn`), у которых каталог `EX` -- первый в `sys.path`.
+  По той же причине модели импортируются только внутри исполнителей;
+- журнал в исполнителях ограничен уровнем `ERROR`, вывод `EX` на stdout
+  подавляется.
+
+Запуск из командной строки: `batch.py <jobs_file> [<workers> [<loop_check_every>]]`,
+где `jobs_file` -- JSON-список объектов с полями `code`, `input`, `limit`,
+`memory` и необязательными `model` и `page_size`. Результаты печатаются по
+одному JSON-объекту на строку. Задания `"ex"` на зацикливание не проверяются.
+"""
+
+import concurrent.futures
+import contextlib
+import copy
+import importlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import namedtuple
+
+EX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "EX")
+
+
+class Job(namedtuple("Job", "code_file input_file limit data_memory_size model page_size")):
+    """Задание на моделирование."""
+
+    __slots__ = ()
+
+    def __new__(cls, code_file, input_file, limit, data_memory_size, model="machine", page_size=None):
+        assert model in ("machine", "ex"), "unknown model: {}".format(model)
+        assert model == "machine" or page_size is None, "paged data memory is not supported by model: {}".format(model)
+        return super().__new__(cls, code_file, input_file, limit, data_memory_size, model, page_size)
+
+
+class Result(namedtuple("Result", "job output instr_counter ticks reason wall_time error")):
+    """Результат задания. `reason` -- `"halt"`, `"eof"`, `"limit"`, `"loop"` или
+    `"error"` (тогда `error` -- текст исключения).
+    """
+
+    __slots__ = ()
+
+
+_programs = {}
+"Кэш программ исполнителя: (имя файла, время изменения) -> программа."
+
+_engine = None
+"Движок основной модели в исполнителе."
+
+_loop_check_every = None
+"Период проверки зацикливания для основной модели в исполнителе."
+
+
+def _init_worker(engine, ex, loop_check_every):
+    global _engine, _loop_check_every
+    _engine = engine
+    _loop_check_every = loop_check_every
+    if ex:
+        sys.path.insert(0, EX_DIR)
+    logging.getLogger().setLevel(logging.ERROR)
+
+
+def _program(job):
+    key = (job.code_file, os.path.getmtime(job.code_file))
+    program = _programs.get(key)
+    if program is None:
+        if job.model == "ex":
+            program = importlib.import_module("isa").read_code(job.code_file)
+        elif _engine == "compiled":
+            program = importlib.import_module("compiler").load(job.code_file)
+        else:
+            program = importlib.import_module("isa").read_program(job.code_file)
+        _programs[key] = program
+    return program
+
+
+def _run_job(job):
+    machine = importlib.import_module("machine")
+    tracer = importlib.import_module("tracer")
+
+    class Outcome(tracer.Tracer):
+        reason = None
+
+        def halt(self, control_unit, reason):
+            self.reason = reason
+
+    outcome = Outcome()
+    start = time.perf_counter()
+    try:
+        program = _program(job)
+        with open(job.input_file, encoding="utf-8") as file:
+            if job.model == "ex":
+                # Как в `EX/machine.main`: ввод завершается нулевым символом.
+                tokens = list(file.read()) + [chr(0)]
+                with contextlib.redirect_stdout(io.StringIO()):
+                    output, instr_counter, ticks = machine.simulation(
+                        copy.deepcopy(program), tokens, job.data_memory_size, job.limit, tracer=outcome
+                    )
+            else:
+                output, instr_counter, ticks = machine.simulation(
+                    program,
+                    importlib.import_module("ports").InputPort(file),
+                    job.data_memory_size,
+                    job.limit,
+                    engine=_engine,
+                    tracer=outcome,
+                    page_size=job.page_size,
+                    loop_check_every=_loop_check_every,
+                )
+    except Exception as e:  # noqa: BLE001 -- ошибка задания не должна останавливать пакет
+        return Result(job, None, None, None, "error", time.perf_counter() - start, "{}: {}".format(type(e).__name__, e))
+    return Result(job, output, instr_counter, ticks, outcome.reason, time.perf_counter() - start, None)
+
+
+def run_batch(jobs, workers=None, engine="fast", loop_check_every=None):
+    """Выполнить задания `jobs` на `workers` процессах. Вернуть список `Result` в
+    порядке заданий. `engine` -- движок основной модели, `loop_check_every` --
+    период проверки зацикливания заданий основной модели (см.
+    `machine.simulation`).
+    """
+    jobs = [job if isinstance(job, Job) else Job(*job) for job in jobs]
+    results = [None] * len(jobs)
+    for ex in (False, True):
+        numbers = [number for number, job in enumerate(jobs) if (job.model == "ex") == ex]
+        if not numbers:
+            continue
+        context = multiprocessing.get_context("spawn") if ex else None
+        with concurrent.futures.ProcessPoolExecutor(
+            workers, mp_context=context, initializer=_init_worker, initargs=(engine, ex, loop_check_every)
+        ) as executor:
+            # Задания одной программы -- рядом, чтобы попадать в кэш исполнителя.
+            numbers.sort(key=lambda number: jobs[number].code_file)
+            chunksize = max(1, len(numbers) // (4 * (workers or os.cpu_count() or 1)))
+            for number, result in zip(numbers, executor.map(_run_job, [jobs[n] for n in numbers], chunksize=chunksize)):
+                results[number] = result
+    return results
+
+
+def main(jobs_file, workers=None, loop_check_every=None):
+    """Выполнить задания из JSON-файла и напечатать результаты."""
+    with open(jobs_file, encoding="utf-8") as file:
+        jobs = [
+            Job(
+                job["code"],
+                job["input"],
+                job["limit"],
+                job["memory"],
+                job.get("model", "machine"),
+                job.get("page_size"),
+            )
+            for job in json.load(file)
+        ]
+
+    for result in run_batch(jobs, workers, loop_check_every=loop_check_every):
+        record = result._asdict()
+        record["job"] = result.job._asdict()
+        print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    assert 2 <= len(sys.argv) <= 4, "Wrong arguments: batch.py <jobs_file> [<workers> [<loop_check_every>]]"
+    main(sys.argv[1], *map(int, sys.argv[2:]))
@@ -0,0 +1,109 @@
+"""Статический анализ границ головки памяти данных.
+
+Абстрактная интерпретация машинного кода на графе потока управления: для
+каждой инструкции вычисляется интервал `[low, high]` возможных значений
+`data_address` перед её исполнением (домен интервалов). Начальное состояние --
+`[0, 0]` на адресе 0.
+
+- `right` сдвигает интервал на +1, `left` -- на -1; после `left` интервал
+  обрезается снизу нулём: исполнение, в котором головка ушла левее, уже
+  остановлено ошибкой. Верхняя граница не обрезается, поэтому результат не
+  зависит от размера памяти данных (`high` может быть `UNBOUNDED`);
+- в точке слияния интервалы объединяются; если интервал инструкции продолжает
+  расти после `WIDENING` посещений, растущая граница расширяется до предела
+  (`0` или `UNBOUNDED`), поэтому анализ завершается за линейное время даже на
+  циклах с ненулевым смещением головки за итерацию.
+
+Сдвиг заведомо не выходит за границы памяти размера `size`, если для `right`
+`high + 1 < size`, для `left` -- `low >= 1` (`safe_moves`). Для инструкций,
+недостижимых из начала программы, интервала нет, и они также считаются
+безопасными. Результат верен для любого состояния, достижимого из начала
+программы, в том числе восстановленного из контрольной точки.
+
+Используется `interpreter.prepare`: доказанно безопасные серии сдвигов
+исполняются без проверки границ.
+"""
+
+import sys
+import weakref
+
+from isa import OP_HALT, OP_JMP, OP_JZ, OP_LEFT, OP_RIGHT
+
+UNBOUNDED = sys.maxsize
+"Верхняя граница интервала, если головка может уйти сколь угодно далеко вправо."
+
+WIDENING = 3
+"Количество расширений интервала инструкции до перехода к пределу."
+
+_intervals = weakref.WeakKeyDictionary()
+
+
+def intervals(program):
+    """Интервалы `data_address` перед каждой инструкцией программы
+    (`isa.DecodedProgram`): список пар `(low, high)` или `None` для
+    недостижимых инструкций. Результат кэшируется для каждой программы.
+
+    >>> from isa import decode_program
+    >>> program = decode_program([{"opcode": op, "arg": arg} for op, arg in [
+    ...     ("right", -1), ("jz", 5), ("right", -1), ("left", -1), ("jmp", 1), ("left", -1), ("left", -1),
+    ...     ("halt", -1)]])
+    >>> intervals(program)
+    [(0, 0), (1, 1), (1, 1), (2, 2), (1, 1), (1, 1), (0, 0), None]
+    """
+    if program in _intervals:
+        return _intervals[program]
+
+    opcodes = program.opcodes
+    args = program.args
+    states = [None] * len(opcodes)
+    visits = [0] * len(opcodes)
+    work = [(0, 0, 0)]
+    while work:
+        pc, low, high = work.pop()
+        if pc >= len(opcodes):
+            continue
+        state = states[pc]
+        if state is not None:
+            if state[0] <= low and high <= state[1]:
+                continue
+            visits[pc] += 1
+            if visits[pc] > WIDENING:
+                low = 0 if low < state[0] else state[0]
+                high = UNBOUNDED if high > state[1] else state[1]
+            else:
+                low, high = min(low, state[0]), max(high, state[1])
+        states[pc] = (low, high)
+
+        opcode = opcodes[pc]
+        if opcode == OP_RIGHT:
+            work.append((pc + 1, low + 1, high if high == UNBOUNDED else high + 1))
+        elif opcode == OP_LEFT:
+            if high >= 1:
+                work.append((pc + 1, max(low - 1, 0), high if high == UNBOUNDED else high - 1))
+        elif opcode == OP_JMP:
+            work.append((args[pc], low, high))
+        elif opcode != OP_HALT:
+            work.append((pc + 1, low, high))
+            if opcode == OP_JZ:
+                work.append((args[pc], low, high))
+
+    _intervals[program] = states
+    return states
+
+
+def safe_moves(program, size):
+    """Флаги инструкций (`bytearray`): 1 -- инструкция не сдвиг либо сдвиг,
+    который не может выйти за границы памяти данных размера `size`.
+    """
+    states = intervals(program)
+    safe = bytearray(len(states))
+    for pc, (opcode, state) in enumerate(zip(program.opcodes, states)):
+        if state is None:
+            safe[pc] = 1
+        elif opcode == OP_RIGHT:
+            safe[pc] = state[1] + 1 < size
+        elif opcode == OP_LEFT:
+            safe[pc] = state[0] >= 1
+        else:
+            safe[pc] = 1
+    return safe
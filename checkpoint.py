@@ -0,0 +1,103 @@
+"""Контрольные точки моделирования: сохранение и восстановление состояния.
+
+Состояние модели (`machine.ControlUnit` вместе с `machine.DataPath`) и счётчик
+инструкций сохраняются в словарь из простых типов, который записывается в
+JSON:
+
+- `program` -- хеш машинного кода (восстановить состояние можно только для
+  той же программы);
+- `tape` -- память данных (base64), `data_address`, `acc`; для страничной
+  памяти -- только выделенные страницы и `peak_address`;
+- `program_counter`, `tick`, `instr_counter`;
+- `input_position` -- количество прочитанных символов ввода;
+- `output` -- вывод, хранящийся в порту вывода (если у порта есть приёмник,
+  перед сохранением порт сбрасывается и сохраняется пустая строка),
+  `output_count` -- общее количество выведенных символов.
+
+Ввод в контрольную точку не входит: при восстановлении передаётся тот же ввод,
+и из него пропускаются `input_position` уже прочитанных символов.
+
+Используется `machine.simulation` (параметры `restore`, `checkpoint`,
+`checkpoint_every`).
+"""
+
+import base64
+import hashlib
+import json
+import os
+
+VERSION = 1
+"Версия формата контрольной точки."
+
+
+def program_hash(program):
+    """Хеш машинного кода (`isa.DecodedProgram`)."""
+    digest = hashlib.sha256(program.opcodes.tobytes())
+    digest.update(program.args.tobytes())
+    return digest.hexdigest()
+
+
+def save(control_unit, instr_counter):
+    """Снять состояние модели в словарь."""
+    data_path = control_unit.data_path
+    data_path.output_port.flush()
+    return {
+        "version": VERSION,
+        "program": program_hash(control_unit.program),
+        "tape": base64.b64encode(data_path.tape).decode("ascii"),
+        "data_address": data_path.data_address,
+        "peak_address": data_path.peak_address,
+        "acc": data_path.acc,
+        "program_counter": control_unit.program_counter,
+        "tick": control_unit.current_tick(),
+        "instr_counter": instr_counter,
+        "input_position": data_path.input_port.position,
+        "output": data_path.output_port.getvalue(),
+        "output_count": data_path.output_port.count,
+    }
+
+
+def restore(state, control_unit):
+    """Восстановить состояние `state` в только что созданную модель (порты уже
+    подключены к вводу и выводу). Вернуть счётчик инструкций.
+    """
+    assert state["version"] == VERSION, "unsupported checkpoint version: {}".format(state["version"])
+    assert state["program"] == program_hash(control_unit.program), "checkpoint of another program"
+    data_path = control_unit.data_path
+    tape = base64.b64decode(state["tape"])
+    if data_path.page_size is None:
+        assert len(tape) == data_path.data_memory_size, "checkpoint of another data memory size"
+        data_path.tape[:] = tape
+    else:
+        peak_address = state.get("peak_address")
+        if peak_address is None:  # снимок нестраничной памяти
+            peak_address = len(tape) - 1
+        assert data_path.reach(len(tape) - 1) == len(tape), "checkpoint of another data memory size"
+        data_path.tape[: len(tape)] = tape
+        data_path.peak_address = peak_address
+    data_path.data_address = state["data_address"]
+    data_path.acc = state["acc"]
+    control_unit.program_counter = state["program_counter"]
+    control_unit._tick = state["tick"]
+
+    for _ in range(state["input_position"]):
+        assert data_path.input_port.read() is not None, "input is shorter than in checkpoint"
+    for symbol in state["output"]:
+        data_path.output_port.write(symbol)
+    return state["instr_counter"]
+
+
+def write(filename, state):
+    """Записать контрольную точку в файл. Запись атомарная: сначала во
+    временный файл, затем переименование.
+    """
+    tmp = filename + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(tmp, filename)
+
+
+def read(filename):
+    """Прочитать контрольную точку из файла."""
+    with open(filename, encoding="utf-8") as file:
+        return json.load(file)
@@ -0,0 +1,429 @@
+#!/usr/bin/python3
+"""Предварительная (ahead-of-time) компиляция машинного кода в модуль Python.
+
+Программа (после `interpreter.prepare`) превращается в одну функцию Python:
+
+- базовые блоки -- в линейный код без диспетчеризации, счётчики инструкций и
+  тактов обновляются один раз на блок;
+- пары `jz`/`jmp` -- в циклы `while`, распознанные циклы
+  (`interpreter.OP_LINEAR`, `interpreter.OP_SCAN`) -- в вычисление по формуле.
+
+Сгенерированный код работает с памятью данных напрямую (`DataPath.tape`,
+беззнаковые байты); аккумулятор также хранится беззнаковым.
+
+Перед каждым блоком проверяется, что он целиком помещается в лимит и в границы
+памяти данных. Если нет -- функция возвращает управление, интерпретатор
+(`interpreter.run_unfolded`) исполняет инструкции по одной до следующей точки
+входа, и исполнение снова продолжает скомпилированная функция. Поэтому вывод,
+`instr_counter` и такты совпадают с `machine.simulation`. Для страничной
+памяти границей служит `DataPath.bound`: новые страницы выделяет интерпретатор.
+
+Функция продолжает исполнение с любой точки входа (`ENTRIES`): начала блока,
+`jz` или `jmp` цикла, `halt`. Для этого код верхнего уровня и первая
+(неполная) итерация цикла, внутри которого продолжается исполнение,
+генерируются с проверками `entry <= адрес` (пропуск уже исполненного);
+обычные итерации циклов -- без них. Так моделирование продолжается
+скомпилированным кодом после контрольных точек, порций `machine.simulation` и
+отката к интерпретатору, а точки входа внутри блоков достигаются
+интерпретатором за несколько инструкций.
+
+Сгенерированный модуль содержит и саму программу, и кэшируется на диске по
+хэшу файла с машинным кодом (`load`). Повторный запуск той же программы не
+требует ни разбора JSON, ни интерпретации.
+
+Компилируются только структурированные программы (переходы -- только пары
+`jz`/`jmp` циклов, как в результате трансляции Brainfuck). Для остальных
+используется интерпретатор.
+"""
+
+import hashlib
+import importlib.util
+import os
+import sys
+import tempfile
+import weakref
+from array import array
+
+import interpreter
+from isa import OP_HALT, OP_INPUT, OP_JMP, OP_JZ, OP_PRINT, DecodedProgram, LazyTerms, Term, read_program
+
+COMPILER_VERSION = "4"
+"Версия генератора. Входит в ключ кэша: при изменении генератора кэш устаревает."
+
+FALLBACK = "fallback"
+"Статус сгенерированной функции: продолжить исполнение интерпретатором."
+
+MAX_LOOP_DEPTH = 16
+"Максимальная вложенность циклов (ограничение CPython на вложенность блоков)."
+
+_functions = weakref.WeakKeyDictionary()
+
+
+def _structure(folded):
+    """Разобрать свёрнутую программу на вложенные последовательности.
+
+    Результат -- список, элемент которого: адрес инструкции либо кортеж
+    `(jz, jmp, body)` для цикла. Если программа не структурирована (есть
+    переходы помимо пар `jz`/`jmp`), возвращается `None`.
+    """
+    loop_opcodes = (OP_JZ, interpreter.OP_LINEAR, interpreter.OP_SCAN)
+    root = []
+    stack = [(None, root)]
+    for pc in range(len(folded)):
+        opcode = folded.opcodes[pc]
+        if opcode in loop_opcodes:
+            end = folded.args[pc] - 1
+            if end <= pc or folded.opcodes[end] != OP_JMP or folded.args[end] != pc:
+                return None
+            if len(stack) > MAX_LOOP_DEPTH:
+                return None
+            body = []
+            stack[-1][1].append((pc, end, body))
+            stack.append((end, body))
+        elif opcode == OP_JMP:
+            if stack[-1][0] != pc:
+                return None
+            stack.pop()
+        else:
+            stack[-1][1].append(pc)
+    if len(stack) != 1:
+        return None
+    return root
+
+
+def _shift(expr, value):
+    """Выражение `expr + value` без лишних `+ 0` и `+ -1`."""
+    if value == 0:
+        return expr
+    return "{} {} {}".format(expr, "+" if value > 0 else "-", abs(value))
+
+
+class _Generator:
+    """Генератор исходного кода функции `run` для свёрнутой программы."""
+
+    def __init__(self, folded):
+        self.folded = folded
+        self.lines = []
+        self.indent = 1
+        self.entries = set()
+
+    def emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    def fallback(self, pc, condition):
+        self.emit("if {}:".format(condition))
+        self.emit("    return FALLBACK, {}, addr, acc, tick, ic".format(self.folded.origins[pc]))
+
+    def guard(self, pc):
+        """Начать участок, пропускаемый, если исполнение продолжается после `pc`."""
+        self.entries.add(self.folded.origins[pc])
+        self.emit("if entry <= {}:".format(self.folded.origins[pc]))
+        self.indent += 1
+
+    def sequence(self, items, resumable=False):
+        """Последовательность; `resumable` -- с пропуском участков до `entry`."""
+        block = []
+        for item in items:
+            if isinstance(item, tuple):
+                self.block(block, resumable)
+                block = []
+                self.loop(*item, resumable=resumable)
+            elif self.folded.opcodes[item] == OP_HALT:
+                self.block(block, resumable)
+                block = []
+                self.entries.add(self.folded.origins[item])
+                if resumable:
+                    self.guard(item)
+                self.fallback(item, "ic >= limit")
+                self.emit("return HALT, {}, addr, acc, tick, ic".format(self.folded.origins[item]))
+                if resumable:
+                    self.indent -= 1
+            else:
+                block.append(item)
+        self.block(block, resumable)
+
+    def block(self, block, resumable=False):
+        """Линейный участок: одна проверка, код без проверок, счётчики."""
+        if not block:
+            return
+        self.entries.add(self.folded.origins[block[0]])
+        if resumable:
+            self.guard(block[0])
+            self.block(block)
+            self.indent -= 1
+            return
+        folded = self.folded
+        count = sum(folded.counts[pc] for pc in block)
+        offset, low, high = 0, 0, 0
+        for pc in block:
+            if folded.opcodes[pc] == interpreter.OP_MOVE:
+                low, high = min(low, offset + folded.lows[pc]), max(high, offset + folded.highs[pc])
+                offset += folded.args[pc]
+        condition = "ic + {} > limit".format(count)
+        if low < 0:
+            condition += " or {} < 0".format(_shift("addr", low))
+        if high > 0:
+            condition += " or {} >= size".format(_shift("addr", high))
+        self.fallback(block[0], condition)
+
+        last_acc = max((pc for pc in block if folded.opcodes[pc] != interpreter.OP_MOVE), default=None)
+        offset, done_count, done_ticks = 0, 0, 0
+        for pc in block:
+            opcode = folded.opcodes[pc]
+            cell = _shift("addr", offset)
+            if opcode == interpreter.OP_ADD:
+                self.emit("value = ({}) & 0xFF".format(_shift("memory[{}]".format(cell), folded.args[pc])))
+                self.emit("memory[{}] = value".format(cell))
+                if pc == last_acc:
+                    self.emit("acc = ({}) & 0xFF".format(_shift("value", -folded.lasts[pc])))
+                done_ticks += 2 * folded.counts[pc]
+            elif opcode == interpreter.OP_MOVE:
+                offset += folded.args[pc]
+                done_ticks += folded.counts[pc]
+            elif opcode == OP_PRINT:
+                self.emit("acc = memory[{}]".format(cell))
+                self.emit("write(chr(acc if acc < 128 else acc - 256))")
+                done_ticks += 2
+            elif opcode == OP_INPUT:
+                self.emit("acc = memory[{}]".format(cell))
+                self.emit("value = read()")
+                self.emit("if value is None:")
+                self.emit(
+                    "    return EOF, {}, {}, acc, tick + {}, ic + {}".format(
+                        folded.origins[pc], cell, done_ticks + 1, done_count
+                    )
+                )
+                self.emit("value = ord(value)")
+                self.emit('assert -128 <= value <= 127, "input token is out of bound: {}".format(value)')
+                self.emit("memory[{}] = value & 0xFF".format(cell))
+                done_ticks += 2
+            else:
+                raise AssertionError("internal error, unexpected opcode: {}".format(opcode))
+            done_count += folded.counts[pc]
+
+        if offset != 0:
+            self.emit("addr = {}".format(_shift("addr", offset)))
+        self.emit("ic += {}".format(count))
+        self.emit("tick += {}".format(done_ticks))
+
+    def loop(self, start, end, body, resumable=False):
+        """Цикл `jz ... jmp`: `while`, при возможности -- вычисление по формуле.
+
+        `resumable` -- исполнение может продолжаться внутри цикла: тогда первая
+        итерация тела исполняется с пропуском участков до `entry`.
+        """
+        folded = self.folded
+        self.entries.update((folded.origins[start], folded.origins[end]))
+        if resumable:
+            self.guard(end)
+            self.emit("if entry > {}:".format(folded.origins[start]))
+            self.indent += 1
+            self.sequence(body, resumable=True)
+            self.back_edge(end)
+            self.indent -= 1
+            self.emit("else:")
+            self.indent += 1
+            self.head(start)
+            self.indent -= 1
+        else:
+            self.head(start)
+
+        self.emit("while acc != 0:")
+        self.indent += 1
+        self.sequence(body)
+        self.back_edge(end)
+        self.indent -= 1
+        if resumable:
+            self.indent -= 1
+
+    def head(self, start):
+        """Вход в цикл: `jz` и, при возможности, все итерации по формуле."""
+        folded = self.folded
+        self.fallback(start, "ic >= limit")
+        self.emit("acc = memory[addr]")
+        self.emit("ic += 1")
+        self.emit("tick += 2")
+
+        if folded.opcodes[start] == interpreter.OP_LINEAR:
+            offsets, deltas, inverse, body_count, body_ticks, low, high = folded.loops[start]
+            self.emit("if acc != 0:")
+            self.emit("    iterations = (-acc * {}) & 0xFF".format(inverse))
+            self.emit(
+                "    if ic + iterations * {} <= limit and {} >= 0 and {} < size:".format(
+                    body_count + 2, _shift("addr", low), _shift("addr", high)
+                )
+            )
+            for offset, delta in zip(offsets, deltas):
+                cell = _shift("addr", offset)
+                self.emit("        memory[{0}] = (memory[{0}] + iterations * {1}) & 0xFF".format(cell, delta))
+            self.emit("        acc = 0")
+            self.emit("        ic += iterations * {}".format(body_count + 2))
+            self.emit("        tick += iterations * {}".format(body_ticks + 3))
+        elif folded.opcodes[start] == interpreter.OP_SCAN:
+            step, body_count, body_ticks, _, _ = folded.loops[start]
+            self.emit("if acc != 0:")
+            self.emit("    iterations = scan(memory, addr, size, limit - ic + 1, LOOPS[{}])".format(start))
+            self.emit("    if iterations:")
+            self.emit("        addr += iterations * {}".format(step))
+            self.emit("        acc = 0")
+            self.emit("        ic += iterations * {}".format(body_count + 2))
+            self.emit("        tick += iterations * {}".format(body_ticks + 3))
+
+    def back_edge(self, end):
+        """Конец итерации: `jmp` на заголовок и его `jz`."""
+        self.fallback(end, "ic + 2 > limit")
+        self.emit("acc = memory[addr]")
+        self.emit("ic += 2")
+        self.emit("tick += 3")
+
+
+def generate(program):
+    """Сгенерировать исходный код модуля для `isa.DecodedProgram`.
+
+    Модуль содержит программу (`OPCODES`, `ARGS`, `TERMS`), функцию `run`
+    и адреса, с которых она продолжает исполнение (`ENTRIES`), либо
+    `run = None`, если программа не структурирована.
+    """
+    folded = interpreter.prepare(program)
+    lines = [
+        '"""Сгенерировано compiler.py (версия {}). Не редактировать."""'.format(COMPILER_VERSION),
+        "",
+        "from interpreter import EOF, HALT",
+        "from interpreter import _scan as scan",
+        "",
+        "FALLBACK = {!r}".format(FALLBACK),
+        "OPCODES = {!r}".format(bytes(program.opcodes)),
+        "ARGS = {!r}".format(list(program.args)),
+        "TERMS = {!r}".format([tuple(term) if term is not None else None for term in program.terms]),
+        "LOOPS = {!r}".format(folded.loops),
+        "",
+    ]
+    structure = _structure(folded)
+    if structure is None:
+        lines.append("ENTRIES = frozenset()")
+        lines.append("run = None")
+        return "\n".join(lines) + "\n"
+
+    generator = _Generator(folded)
+    generator.sequence(structure, resumable=True)
+    generator.emit("return FALLBACK, {}, addr, acc, tick, ic".format(len(program)))
+    lines.append("ENTRIES = frozenset({!r})".format(sorted(generator.entries)))
+    lines.append("")
+    lines.append("")
+    lines.append("def run(memory, size, addr, acc, tick, ic, limit, read, write, entry):")
+    lines.extend(generator.lines)
+    return "\n".join(lines) + "\n"
+
+
+def _load_module(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def compile_program(program):
+    """Скомпилировать `isa.DecodedProgram` в памяти (без кэша на диске).
+    Возвращает пару: функцию `run` сгенерированного модуля (либо `None`) и
+    точки входа `ENTRIES`.
+    """
+    if program not in _functions:
+        namespace = {}
+        exec(compile(generate(program), "<compiled machine code>", "exec"), namespace)
+        _functions[program] = namespace["run"], namespace["ENTRIES"]
+    return _functions[program]
+
+
+def default_cache_dir():
+    """Каталог кэша по умолчанию."""
+    return os.path.join(tempfile.gettempdir(), "machine_code_cache")
+
+
+def load(code_file, cache_dir=None):
+    """Загрузить машинный код через кэш скомпилированных модулей.
+
+    Ключ кэша -- хэш содержимого `code_file` и версии компилятора. При промахе
+    файл разбирается (`isa.read_program`, JSON или двоичный формат), компилируется и сохраняется, при
+    попадании -- импортируется готовый модуль (Python дополнительно хранит его
+    байт-код в `__pycache__`). Возвращает `isa.DecodedProgram`, для которого
+    движок `run` использует скомпилированную функцию.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    with open(code_file, "rb") as file:
+        key = hashlib.sha256(COMPILER_VERSION.encode() + file.read()).hexdigest()[:32]
+
+    name = "machine_code_{}".format(key)
+    path = os.path.join(cache_dir, name + ".py")
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        with read_program(code_file) as program:
+            source = generate(program)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(source)
+        os.replace(tmp_path, path)
+
+    module = _load_module(path, name)
+
+    def term(pc):
+        return Term(*module.TERMS[pc]) if module.TERMS[pc] is not None else None
+
+    terms = LazyTerms(len(module.TERMS), term)
+    program = DecodedProgram(array("B", module.OPCODES), array("i", module.ARGS), terms)
+    _functions[program] = module.run, module.ENTRIES
+    return program
+
+
+def run(control_unit, instr_counter, limit):
+    """Движок моделирования на скомпилированном коде. Интерфейс и результат --
+    как у `interpreter.run`.
+
+    Скомпилированная функция исполняет программу с точек входа; участки, которые
+    не помещаются в лимит или в память, и продолжение с середины блока
+    исполняются интерпретатором по одной инструкции до следующей точки входа.
+    """
+    function, entries = compile_program(control_unit.program)
+    if function is None:
+        return interpreter.run(control_unit, instr_counter, limit)
+
+    data_path = control_unit.data_path
+    fallback = False
+    while instr_counter < limit:
+        if fallback or control_unit.program_counter not in entries:
+            instr_counter, reason = interpreter.run_unfolded(control_unit, instr_counter, instr_counter + 1)
+            if reason != interpreter.LIMIT:
+                return instr_counter, reason
+            fallback = False
+            continue
+
+        status, pc, addr, acc, tick, instr_counter = function(
+            data_path.tape,
+            data_path.bound,
+            data_path.data_address,
+            data_path.acc & 0xFF,
+            control_unit.current_tick(),
+            instr_counter,
+            limit,
+            data_path.input_port.read,
+            data_path.output_port.write,
+            control_unit.program_counter,
+        )
+        control_unit.program_counter = pc
+        control_unit._tick = tick
+        data_path.data_address = addr
+        data_path.acc = acc if acc < 128 else acc - 256
+        if status != FALLBACK:
+            return instr_counter, status
+        fallback = True
+    return instr_counter, interpreter.LIMIT
+
+
+def main(code_file, cache_dir=None):
+    """Скомпилировать файл с машинным кодом в кэш."""
+    program = load(code_file, cache_dir)
+    print("code instr:", len(program), "compiled:", _functions[program][0] is not None)
+
+
+if __name__ == "__main__":
+    assert 2 <= len(sys.argv) <= 3, "Wrong arguments: compiler.py <code_file> [<cache_dir>]"
+    main(*sys.argv[1:])
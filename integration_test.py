@@ -5,12 +5,63 @@
 
 import contextlib
 import io
+import json
 import os
 import tempfile
 import unittest
+from unittest import mock
 
+import batch
+import bounds
+import checkpoint
+import compiler
+import interpreter
+import isa
 import machine
+import optimizer
+import ports
+import prefix
+import profiler
+import tracefile
+import tracer
+import translator
 import translator_asm
+import wcet
+
+# Программа на Asm, затрагивающая все инструкции: переполнение ячейки,
+# вложенные циклы, сдвиги головки, ввод и вывод.
+LOOPS_ASM = """
+        decrement           ; -1
+clear:
+        jz clear_end        ; [-] -- 255 итераций
+        decrement
+        jmp clear
+clear_end:
+        increment
+        increment
+        increment
+outer:
+        jz outer_end        ; [->++>+++<<]
+        decrement
+        right
+        increment
+        increment
+        right
+        increment
+        increment
+        increment
+        left
+        left
+        jmp outer
+outer_end:
+        right
+        print
+        right
+        print
+        input
+        print
+        halt
+"""
 
 
 class TestTranslatorAndMachine(unittest.TestCase):
@@ -29,7 +80,7 @@ class TestTranslatorAndMachine(unittest.TestCase):
 
             # Собираем весь стандартный вывод в переменную stdout.
             with contextlib.redirect_stdout(io.StringIO()) as stdout:
-                translator_asm.main(source, target)
+                translator.main(source, target)
                 machine.main(target, input_stream)
 
             # Проверяем, что было напечатано то, что мы ожидали.
@@ -39,14 +90,14 @@ class TestTranslatorAndMachine(unittest.TestCase):
 
     def test_cat_example(self):
         with tempfile.TemporaryDirectory() as tmpdirname:
-            source = "examples/cat.asm"
+            source = "examples/cat.bf"
             target = os.path.join(tmpdirname, "machine_code.out")
             input_stream = "examples/input.txt"
 
             with contextlib.redirect_stdout(io.StringIO()) as stdout:
                 # Собираем журнал событий по уровню INFO в переменную logs.
                 with self.assertLogs("", level="INFO") as logs:
-                    translator_asm.main(source, target)
+                    translator.main(source, target)
                     machine.main(target, input_stream)
 
             assert (
@@ -61,13 +112,13 @@ class TestTranslatorAndMachine(unittest.TestCase):
 
     def test_cat_example_log(self):
         with tempfile.TemporaryDirectory() as tmpdirname:
-            source = "examples/cat.asm"
+            source = "examples/cat.bf"
             target = os.path.join(tmpdirname, "machine_code.out")
             input_stream = "examples/foo_input.txt"
 
             with contextlib.redirect_stdout(io.StringIO()) as stdout:
                 with self.assertLogs("", level="DEBUG") as logs:
-                    translator_asm.main(source, target)
+                    translator.main(source, target)
                     machine.main(target, input_stream)
 
             assert stdout.getvalue() == "source LoC: 2 code instr: 6\nfoo\n\ninstr_counter:  15 ticks: 28\n"
@@ -101,3 +152,589 @@ class TestTranslatorAndMachine(unittest.TestCase):
                 "INFO:root:output_buffer: 'foo\\n'",
             ]
             assert logs.output == expect_log
+
+    def _translate(self, source):
+        return translator_asm.translate(source)
+
+    def test_decoded_program(self):
+        code = self._translate(LOOPS_ASM)
+        program = isa.decode_program(code)
+        assert isa.decode_program(program) is program
+        assert (program.opcodes.typecode, program.args.typecode) == ("B", "i")
+        assert [isa.OPCODES[opcode] for opcode in program.opcodes] == [instr["opcode"] for instr in code]
+        assert list(program.args) == [instr.get("arg", isa.NO_ARG) for instr in code]
+        assert program.terms == [instr["term"] for instr in code]
+        assert program.to_code() == code
+
+        # Модель исполняет предекодированную программу так же, как список словарей.
+        assert isinstance(machine.ControlUnit(code, machine.DataPath(10, [])).program, isa.DecodedProgram)
+        with self.assertLogs("", level="INFO"):
+            expect = machine.simulation(code, list("A"), data_memory_size=10, limit=10000)
+            assert machine.simulation(program, list("A"), data_memory_size=10, limit=10000) == expect
+        assert expect[1:] == (813, 1354)
+
+    def test_no_trace_formatting_without_debug(self):
+        code = self._translate(LOOPS_ASM)
+        formatted = AssertionError("trace is formatted without DEBUG")
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(mock.patch.object(machine.ControlUnit, "__repr__", side_effect=formatted))
+            stack.enter_context(mock.patch.object(ports.OutputPort, "lazy_value", side_effect=formatted))
+            stack.enter_context(mock.patch("logging.debug", side_effect=formatted))
+            with self.assertLogs("", level="INFO"):
+                result = machine.simulation(code, list("A"), data_memory_size=10, limit=10000)
+        assert result == ("\x06\tA", 813, 1354)
+
+        # С DEBUG вывод до текущего символа форматируется только при записи в журнал.
+        with self.assertLogs("", level="DEBUG") as logs:
+            machine.simulation(code, list("A"), data_memory_size=10, limit=10000)
+        outputs = [line for line in logs.output if line.startswith("DEBUG:root:output:")]
+        assert outputs == [
+            "DEBUG:root:output: '' << '\\x06'",
+            "DEBUG:root:output: '\\x06' << '\\t'",
+            "DEBUG:root:output: '\\x06\\t' << 'A'",
+        ]
+
+    def test_fast_engine_matches_signal(self):
+        code = self._translate(LOOPS_ASM)
+        for input_text, limit in [("A", 10000), ("", 10000), ("A", 100)]:
+            with self.assertLogs("", level="INFO"):
+                expect = machine.simulation(code, list(input_text), data_memory_size=10, limit=limit)
+                actual = machine.simulation(code, list(input_text), data_memory_size=10, limit=limit, engine="fast")
+            assert actual == expect
+
+        with self.assertRaisesRegex(AssertionError, "out of memory: 2"):
+            machine.simulation(code, [], data_memory_size=2, limit=10000, engine="fast")
+
+    def test_fast_engine_folded_runs_stop_exactly(self):
+        code = self._translate(LOOPS_ASM)
+        data_path = machine.DataPath(10, list("A"))
+        control_unit = machine.ControlUnit(code, data_path)
+        assert len(interpreter.fold_runs(control_unit.program)) < len(control_unit.program)
+
+        # Лимит, попадающий внутрь свёрнутой серии, и продолжение с того же места.
+        instr_counter, reason = 0, interpreter.LIMIT
+        while reason == interpreter.LIMIT:
+            instr_counter, reason = interpreter.run(control_unit, instr_counter, instr_counter + 7)
+        assert reason == interpreter.HALT
+        assert (data_path.output_port.getvalue(), instr_counter, control_unit.current_tick()) == ("\x06\tA", 813, 1354)
+
+    def test_fast_engine_loop_idioms(self):
+        code = self._translate(LOOPS_ASM)
+        folded = interpreter.prepare(machine.ControlUnit(code, machine.DataPath(10, [])).program)
+        assert list(folded.opcodes).count(interpreter.OP_LINEAR) == 2
+
+        scan = self._translate("increment\nright\nincrement\nleft\nloop:\njz end\nright\njmp loop\nend:\nhalt\n")
+        folded = interpreter.prepare(machine.ControlUnit(scan, machine.DataPath(10, [])).program)
+        assert list(folded.opcodes).count(interpreter.OP_SCAN) == 1
+        with self.assertLogs("", level="INFO"):
+            expect = machine.simulation(scan, [], data_memory_size=10, limit=1000)
+            assert machine.simulation(scan, [], data_memory_size=10, limit=1000, engine="fast") == expect
+            with self.assertRaisesRegex(AssertionError, "out of memory: 2"):
+                machine.simulation(scan, [], data_memory_size=2, limit=1000, engine="fast")
+
+    def test_bounds_analysis(self):
+        # Головка возвращается на место в каждом цикле: все сдвиги без проверок.
+        program = isa.decode_program(translator.translate("-[>>-[>+<-.]<<-]>>>>"))
+        assert bounds.intervals(program)[-2] == (3, 3)
+        opcodes = list(interpreter.prepare(program, 5).opcodes)
+        assert interpreter.OP_MOVE not in opcodes and interpreter.OP_SHIFT in opcodes
+        # При меньшей памяти последняя серия может выйти за границы -- проверка остаётся только у неё.
+        opcodes = list(interpreter.prepare(program, 4).opcodes)
+        assert opcodes.count(interpreter.OP_MOVE) == 1 and opcodes[-2] == interpreter.OP_MOVE
+
+        # Смещение за итерацию не ограничено: проверка у сдвига в цикле.
+        drift = isa.decode_program(translator.translate("+[>+]"))
+        assert bounds.intervals(drift)[2] == (0, bounds.UNBOUNDED)
+        assert interpreter.OP_MOVE in interpreter.prepare(drift, 10).opcodes
+        for engine in ["signal", "fast"]:
+            with self.assertRaisesRegex(AssertionError, "out of memory: 10"):
+                machine.simulation(drift, [], data_memory_size=10, limit=1000, engine=engine)
+
+    def test_byte_tape(self):
+        data_path = machine.DataPath(3, [])
+        assert type(data_path.tape) is bytearray
+        assert data_path.data_memory.format == "b" and data_path.data_memory.obj is data_path.tape
+
+        # Переполнение -- арифметика по модулю 256, чтение -- со знаком.
+        for acc, sel, expect in [(127, isa.Opcode.INC, -128), (-128, isa.Opcode.DEC, 127), (0, isa.Opcode.DEC, -1)]:
+            data_path.acc = acc
+            data_path.signal_wr(sel.value)
+            data_path.signal_latch_acc()
+            assert (data_path.acc, data_path.tape[0]) == (expect, expect & 0xFF)
+
+        # Движки работают с той же лентой: память после исполнения совпадает.
+        code = self._translate(LOOPS_ASM)
+        tapes = []
+        for engine in ["signal", "fast"]:
+            data_path = machine.DataPath(10, list("A"))
+            control_unit = machine.ControlUnit(code, data_path)
+            if engine == "fast":
+                assert interpreter.run(control_unit, 0, 10000) == (813, interpreter.HALT)
+            else:
+                with self.assertRaises(StopIteration):
+                    while True:
+                        control_unit.decode_and_execute_instruction()
+            tapes.append((bytes(data_path.tape), data_path.data_memory.tolist()))
+        assert tapes[0] == tapes[1]
+        assert tapes[0][1][:3] == [0, 6, 65]
+
+    def test_paged_tape(self):
+        code = self._translate(LOOPS_ASM)
+        with self.assertLogs("", level="INFO") as logs:
+            expect = machine.simulation(code, list("A"), data_memory_size=10, limit=10000)
+            for engine in ["signal", "fast", "compiled"]:
+                assert machine.simulation(code, list("A"), None, limit=10000, engine=engine, page_size=2) == expect
+        assert logs.output.count("INFO:root:pages touched: 2 peak address: 2") == 3
+
+        # Память растёт по мере продвижения головки, до предела роста.
+        far = translator.translate("++++++[>++++++++<-]>--[[>+<-]>-]+.")
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            target = os.path.join(tmpdirname, "checkpoint.json")
+            with self.assertLogs("", level="INFO") as logs:
+                expect = machine.simulation(far, [], data_memory_size=100, limit=100000)
+                for engine in ["signal", "fast", "compiled"]:
+                    machine.simulation(far, [], None, limit=1000, engine=engine, checkpoint_file=target, page_size=16)
+                    assert len(checkpoint.read(target)["tape"]) < 100
+                    resumed = machine.simulation(
+                        far, [], None, limit=100000, engine=engine, restore=target, page_size=16
+                    )
+                    assert resumed == expect
+            assert logs.output[-2] == "INFO:root:pages touched: 3 peak address: 47"
+
+            path = os.path.join(tmpdirname, "trace.bin")
+            with self.assertLogs("", level="INFO"):
+                machine.simulation(far, [], None, limit=100000, tracer=tracefile.TraceWriter(path, 64), page_size=16)
+            with tracefile.TraceFile(path) as trace:
+                assert trace.state_at(10**9)[4].rstrip(b"\0") == bytes(47) + b"\1"
+
+        for engine in ["signal", "fast", "compiled"]:
+            with self.assertRaisesRegex(AssertionError, "out of memory: 20"):
+                machine.simulation(far, [], data_memory_size=20, limit=100000, engine=engine, page_size=8)
+
+    def test_compiled_engine_uses_disk_cache(self):
+        code = self._translate(LOOPS_ASM)
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            target = os.path.join(tmpdirname, "machine_code.out")
+            cache_dir = os.path.join(tmpdirname, "cache")
+            isa.write_code(target, code)
+
+            with self.assertLogs("", level="INFO"):
+                expect = machine.simulation(code, list("A"), data_memory_size=10, limit=10000)
+                for _ in range(2):
+                    program = compiler.load(target, cache_dir)
+                    actual = machine.simulation(program, list("A"), data_memory_size=10, limit=10000, engine="compiled")
+                    assert actual == expect
+            assert len([name for name in os.listdir(cache_dir) if name.endswith(".py")]) == 1
+
+    def test_compiled_engine_resumes(self):
+        code = self._translate(LOOPS_ASM)
+        program = isa.decode_program(code)
+        _, entries = compiler.compile_program(program)
+        assert {1, 3, 7, 18} <= entries  # `jz` и `jmp` обоих циклов
+
+        with self.assertLogs("", level="INFO"):
+            expect = machine.simulation(program, list("A"), data_memory_size=10, limit=10000)
+            # Продолжение с каждой точки входа, в том числе внутри циклов.
+            control_unit = machine.ControlUnit(program, machine.DataPath(10, list("A")))
+            states = {}
+            for instr_counter in range(expect[1]):
+                if control_unit.program_counter in entries:
+                    states.setdefault(control_unit.program_counter, checkpoint.save(control_unit, instr_counter))
+                control_unit.decode_and_execute_instruction()
+            assert set(states) == entries - {len(program) - 1}
+            for state in states.values():
+                actual = machine.simulation(program, list("A"), 10, limit=10000, engine="compiled", restore=state)
+                assert actual == expect
+
+    def test_streaming_ports(self):
+        with open("examples/cat.asm", encoding="utf-8") as file:
+            code = self._translate(file.read())
+        text = "streaming " * 50
+        for engine in ["signal", "fast", "compiled"]:
+            sink = io.StringIO()
+            port = ports.InputPort(io.StringIO(text), chunk_size=7)
+            with self.assertLogs("", level="INFO"):
+                output, instr_counter, _ = machine.simulation(
+                    code, port, data_memory_size=10, limit=100000, engine=engine, output_port=ports.OutputPort(sink, 16)
+                )
+            assert (output, sink.getvalue(), port.position) == ("", text, len(text))
+            assert instr_counter > len(text)
+
+    def test_tracers(self):
+        code = self._translate(LOOPS_ASM)
+        stream = io.BytesIO()
+        with self.assertLogs("", level="DEBUG") as logs:
+            result = machine.simulation(code, list("A"), data_memory_size=10, limit=10000, tracer=tracer.NullTracer())
+            binary = tracer.BinaryTracer(stream, signals=True, ticks=True)
+            assert machine.simulation(code, list("A"), data_memory_size=10, limit=10000, tracer=binary) == result
+        assert [record.levelname for record in logs.records] == ["INFO", "INFO"]
+
+        records = list(tracer.read_binary_trace(stream.getvalue()))
+        kinds = [record[0] for record in records]
+        assert kinds.count(tracer.INSTRUCTION) == result[1] + 1
+        assert kinds.count(tracer.TICK) == result[2]
+        assert [record[1] for record in records if record[0] == tracer.OUTPUT] == [ord(char) for char in result[0]]
+        assert records[-1] == (tracer.HALT, result[2], "halt")
+
+    def test_ring_recorder(self):
+        code = self._translate(LOOPS_ASM)
+        program = isa.decode_program(code)
+        with self.assertLogs("", level="DEBUG") as logs:
+            machine.simulation(program, list("A"), data_memory_size=10, limit=10000)
+        states = [line[len("DEBUG:root:") :] for line in logs.output if line.startswith("DEBUG:root:TICK:")]
+
+        spill = io.BytesIO()
+        recorder = tracer.RingRecorder(depth=5, spill=spill)
+        machine.simulation(program, list("A"), data_memory_size=10, limit=10000, tracer=recorder)
+        assert recorder.count == len(states)
+        assert list(tracer.render_records(recorder.records(), program)) == states[-5:]
+        assert list(tracer.render_records(spill.getvalue(), program)) == states
+
+        # Посмертная трасса: после аварийной остановки в буфере -- последние инструкции.
+        recorder = tracer.RingRecorder(depth=3)
+        with self.assertRaisesRegex(AssertionError, "out of memory"):
+            machine.simulation(program, [], data_memory_size=2, limit=10000, tracer=recorder)
+        last = list(tracer.render_records(recorder.records(), program))[-1]
+        assert last.startswith("TICK:") and "ADDR:   1" in last and last.endswith("\tright  ('right'@17:0)")
+
+        # Быстрые движки не сообщают о границах инструкций: пустая запись была бы ошибкой.
+        for sink in [tracer.RingRecorder(depth=3), tracer.TextTracer(), tracer.BinaryTracer(io.BytesIO())]:
+            with self.assertRaisesRegex(AssertionError, "requires the signal engine, not fast"):
+                machine.simulation(program, list("A"), data_memory_size=10, limit=10000, engine="fast", tracer=sink)
+
+    def test_indexed_trace_file(self):
+        code = self._translate(LOOPS_ASM)
+        program = isa.decode_program(code)
+        recorder = tracer.RingRecorder(depth=1000)
+        machine.simulation(program, list("A"), data_memory_size=10, limit=10000, tracer=recorder)
+        lines = list(tracer.render_records(recorder.records(), program))
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            path = os.path.join(tmpdirname, "trace.bin")
+            machine.simulation(
+                program, list("A"), data_memory_size=10, limit=10000, tracer=tracefile.TraceWriter(path, 64)
+            )
+            with tracefile.TraceFile(path) as trace:
+                assert len(trace.index) == (len(lines) + 63) // 64
+                assert list(trace.export(program)) == lines
+                window = [line for line in lines if 1000 <= int(line.split()[1]) < 1010]
+                assert list(trace.export(program, 1000, 1010)) == window
+
+                tick, pc, addr, acc, memory = trace.state_at(1000)
+                data_path = machine.DataPath(10, list("A"))
+                control_unit = machine.ControlUnit(program, data_path)
+                while control_unit.current_tick() < tick:
+                    control_unit.decode_and_execute_instruction()
+                assert tick in (999, 1000)
+                assert (pc, addr, acc) == (control_unit.program_counter, data_path.data_address, data_path.acc)
+                assert memory == data_path.tape
+
+            # Аварийная остановка: трасса записана до последней инструкции.
+            data_path = machine.DataPath(2, [])
+            control_unit = machine.ControlUnit(program, data_path)
+            with self.assertRaisesRegex(AssertionError, "out of memory"):
+                while True:
+                    state = (control_unit.current_tick(), control_unit.program_counter, data_path.data_address)
+                    control_unit.decode_and_execute_instruction()
+            with self.assertRaisesRegex(AssertionError, "out of memory"):
+                machine.simulation(
+                    program, [], data_memory_size=2, limit=10000, tracer=tracefile.TraceWriter(path, 64)
+                )
+            with tracefile.TraceFile(path) as trace:
+                assert trace.state_at(10**9)[:3] == state
+
+            # Начатая порция записывается `flush`; без индекса порции читаются по заголовкам.
+            with tracefile.TraceWriter(path, 4) as writer:
+                control_unit = machine.ControlUnit(program, machine.DataPath(10, list("A")))
+                for _ in range(10):
+                    writer.instruction(control_unit)
+                    control_unit.decode_and_execute_instruction()
+                writer.flush()
+                with tracefile.TraceFile(path) as trace:
+                    assert [entry[3] for entry in trace.index] == [4, 4, 2]
+                    assert list(trace.export(program)) == lines[:10]
+            with tracefile.TraceFile(path) as trace:
+                assert [entry[3] for entry in trace.index] == [4, 4, 2]
+
+            # Файл создаётся при первой записи; быстрые движки трассу не пишут.
+            unused = os.path.join(tmpdirname, "unused.bin")
+            tracefile.TraceWriter(unused)
+            with self.assertRaisesRegex(AssertionError, "TraceWriter requires the signal engine, not compiled"):
+                machine.simulation(
+                    program, list("A"), 10, limit=10000, engine="compiled", tracer=tracefile.TraceWriter(unused)
+                )
+            assert not os.path.exists(unused)
+            with tracefile.TraceWriter(unused):
+                pass
+            with tracefile.TraceFile(unused) as trace:
+                assert trace.index == []
+
+    def test_checkpoint_restore(self):
+        code = self._translate(LOOPS_ASM)
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            target = os.path.join(tmpdirname, "checkpoint.json")
+            with self.assertLogs("", level="INFO"):
+                expect = machine.simulation(code, list("A"), data_memory_size=10, limit=10000)
+                for engine in ["signal", "fast", "compiled"]:
+                    paused = machine.simulation(code, list("A"), 10, limit=500, engine=engine, checkpoint_file=target)
+                    assert paused[1:] == (500, 834)
+                    resumed = machine.simulation(code, list("A"), 10, limit=10000, engine=engine, restore=target)
+                    assert resumed == expect
+
+                    machine.simulation(code, list("A"), 10, limit=10000, checkpoint_file=target, checkpoint_every=100)
+                    assert checkpoint.read(target)["instr_counter"] == expect[1]
+
+    def test_loop_detection(self):
+        code = self._translate(LOOPS_ASM)
+        with self.assertLogs("", level="INFO"):
+            expect = machine.simulation(code, list("A"), data_memory_size=10, limit=10000)
+            for engine in ["signal", "fast", "compiled"]:
+                assert machine.simulation(code, list("A"), 10, limit=10000, engine=engine, loop_check_every=5) == expect
+
+        # Цикл из 256 итераций по состоянию (ячейка справа переполняется) и вечный цикл без тела.
+        for source, expect in [("+[>+<]", ("", 23296, 32615)), (",[]", ("", 28, 43))]:
+            for engine in ["signal", "fast", "compiled"]:
+                with self.assertLogs("", level="INFO") as logs:
+                    result = machine.simulation(
+                        translator.translate(source), ["A"], 10, limit=10**6, engine=engine, loop_check_every=7
+                    )
+                assert result == expect
+                assert "WARNING:root:Infinite loop detected!" in logs.output
+
+        # Вывод между отпечатками: зацикливание не доказано, работа до лимита.
+        with self.assertLogs("", level="INFO") as logs:
+            result = machine.simulation(translator.translate("+[.]"), [], 10, limit=1000, loop_check_every=7)
+        assert result[1] == 1000 and "WARNING:root:Limit exceeded!" in logs.output
+
+    def test_precomputed_prefix(self):
+        code = self._translate(LOOPS_ASM)
+        state = prefix.snapshot(code, 10, limit=10000)
+        assert (state["reason"], state["instr_counter"], state["input_position"]) == (interpreter.HALT, 811, 0)
+        assert prefix.snapshot(code, 10, limit=100) is None
+
+        with self.assertLogs("", level="INFO"):
+            for input_text in ["A", "B", ""]:
+                expect = machine.simulation(code, list(input_text), data_memory_size=10, limit=10000)
+                assert machine.simulation(code, list(input_text), 10, limit=10000, precompute_prefix=True) == expect
+
+    def test_batch_runner(self):
+        code = self._translate(LOOPS_ASM)
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            target = os.path.join(tmpdirname, "machine_code.out")
+            isa.write_code(target, code)
+            jobs = []
+            for number, input_text in enumerate(["A", "", "B"]):
+                input_stream = os.path.join(tmpdirname, "input_{}.txt".format(number))
+                with open(input_stream, "w", encoding="utf-8") as file:
+                    file.write(input_text)
+                jobs.append(batch.Job(target, input_stream, 10000, 10))
+            jobs.append(batch.Job(target, input_stream, 100, 10))
+
+            results = batch.run_batch(jobs, workers=2)
+        assert [(result.output, result.instr_counter, result.ticks, result.reason) for result in results] == [
+            ("\x06\tA", 813, 1354, "halt"),
+            ("\x06\t", 811, 1351, "eof"),
+            ("\x06\tB", 813, 1354, "halt"),
+            ("", 100, 167, "limit"),
+        ]
+
+    def test_translation_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            cache_dir = os.path.join(tmpdirname, "cache")
+            targets = [os.path.join(tmpdirname, "code_{}.out".format(number)) for number in range(3)]
+            outputs = []
+            for target in targets[:2]:
+                with contextlib.redirect_stdout(io.StringIO()) as stdout:
+                    translator_asm.main("examples/cat.asm", target, cache_dir)
+                outputs.append(stdout.getvalue())
+            with contextlib.redirect_stdout(io.StringIO()):
+                translator_asm.main("examples/cat.asm", targets[2])
+
+            contents = []
+            for target in targets:
+                with open(target, encoding="utf-8") as file:
+                    contents.append(file.read())
+            assert contents[0] == contents[1] == contents[2]
+            assert outputs[0] == outputs[1] == "source LoC: 9 code instr: 6\n"
+            assert len(os.listdir(cache_dir)) == 1
+
+    def test_streaming_assembler(self):
+        # Ссылки вперёд исправляются по таблице, ссылки назад подставляются сразу.
+        code = translator_asm.translate("jz end\nloop:\nright ; comment\njmp loop\nend:\nhalt")
+        assert [(instr["opcode"], instr.get("arg")) for instr in code] == [
+            (isa.Opcode.JZ, 3),
+            (isa.Opcode.RIGHT, None),
+            (isa.Opcode.JMP, 1),
+            (isa.Opcode.HALT, None),
+        ]
+        assert code[2]["term"] == isa.Term(4, 0, "jmp loop")
+        with self.assertRaisesRegex(AssertionError, "Label not defined: nowhere"):
+            translator_asm.translate("jmp nowhere\nhalt")
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            target = os.path.join(tmpdirname, "machine_code.out")
+            with contextlib.redirect_stdout(io.StringIO()) as stdout:
+                translator_asm.main("examples/cat.asm", target, quiet=True)
+            assert stdout.getvalue() == ""
+            with open("examples/cat.asm", encoding="utf-8") as file:
+                expect = isa.dump_code(translator_asm.translate(file.read()))
+            with open(target, encoding="utf-8") as file:
+                assert file.read() == expect
+
+    def test_optimizing_translator(self):
+        with open("examples/hello.bf", encoding="utf-8") as file:
+            text = file.read()
+        program, saved = translator.translate_program(text)
+        optimized, saved_optimized = translator.translate_program(text, optimize=True)
+        assert saved == (0, 0)
+        # Удалён начальный цикл-комментарий: выполняется на одну `jz` меньше.
+        assert len(program) - len(optimized) == saved_optimized.instr == 24
+        with self.assertLogs("", level="INFO"):
+            output, instr_counter, ticks = machine.simulation(program, [], 100, limit=10000)
+            assert machine.simulation(optimized, [], 100, limit=10000) == (
+                output,
+                instr_counter - 1,
+                ticks - saved_optimized.ticks,
+            )
+
+        code = translator.translate("+>-<+-.>< ++--[-][+.]", optimize=True)
+        assert [str(instr["opcode"]) for instr in code] == [
+            "increment",
+            "right",
+            "decrement",
+            "left",
+            "print",
+            "jz",
+            "decrement",
+            "jmp",
+            "halt",
+        ]
+        assert code[1]["term"] == isa.Term(1, 2, ">")
+        with self.assertRaisesRegex(AssertionError, "Unbalanced brackets"):
+            translator.translate("[[]")
+        with self.assertRaisesRegex(AssertionError, "Unbalanced brackets"):
+            translator.translate("[]]", optimize=True)
+
+    def test_peephole_optimizer(self):
+        code = translator_asm.translate(
+            "input\nloop:\njz exit\nprint\nincrement\ndecrement\ninput\njmp again\nagain:\njmp loop\n"
+            "exit:\njmp done\nprint\ndone:\nhalt\n"
+        )
+        program, saved = optimizer.optimize(code)
+        optimized = program.to_code()
+        assert [(str(instr["opcode"]), instr.get("arg")) for instr in optimized] == [
+            ("input", None),
+            ("jz", 5),
+            ("print", None),
+            ("input", None),
+            ("jmp", 1),
+            ("halt", None),
+        ]
+        assert [instr["index"] for instr in optimized] == list(range(6))
+        assert optimized[4]["term"] == isa.Term(8, 0, "jmp again")
+        assert saved == (len(code) - 6, 1 + 4 + 1)
+
+        with self.assertLogs("", level="INFO"):
+            output, instr_counter, ticks = machine.simulation(code, list("ab\0"), 10, limit=1000)
+            assert output == "ab"
+            # За итерацию: пара `increment`/`decrement` и `jmp` на `jmp`; на выходе -- `jmp` после `jz`.
+            expect = (output, instr_counter - 2 * 3 - 1, ticks - 2 * 5 - 1)
+            assert machine.simulation(program, list("ab\0"), 10, limit=1000) == expect
+
+    def test_wcet_estimate(self):
+        # Значения счётчиков циклов известны: оценка точная.
+        code = self._translate(LOOPS_ASM)
+        assert wcet.estimate(code) == ((813, 813), (1354, 1354))
+
+        with open("examples/hello.bf", encoding="utf-8") as file:
+            hello = translator.translate(file.read())
+        # Внешний цикл содержит поиск `[<]`: без заданной границы худшая оценка не ограничена.
+        assert wcet.estimate(hello, size=100) == ((67, wcet.UNBOUNDED), (124, wcet.UNBOUNDED))
+        with self.assertLogs("", level="INFO"):
+            _, instr_counter, ticks = machine.simulation(hello, [], 100, limit=10000)
+        estimate = wcet.estimate(hello, {32: 8, 38: (4, 4), 67: 5}, size=100)
+        assert estimate.instr[0] <= instr_counter == estimate.instr[1]
+        assert estimate.ticks[0] <= ticks == estimate.ticks[1]
+
+        # Несводимый поток управления: только нижняя оценка.
+        jumps = self._translate(
+            "input\njz second\nfirst:\nprint\njz done\nsecond:\nincrement\njmp first\ndone:\nhalt\n"
+        )
+        assert wcet.estimate(jumps) == ((4, wcet.UNBOUNDED), (8, wcet.UNBOUNDED))
+
+    def test_profiler(self):
+        code = self._translate(LOOPS_ASM)
+        profile = profiler.Profiler()
+        with self.assertLogs("", level="INFO"):
+            result = machine.simulation(code, list("A"), 10, limit=10000, tracer=profile)
+        assert (sum(profile.counts), sum(profile.ticks)) == result[1:] == (813, 1354)
+
+        report = profiler.report(profile, top=2)
+        assert report[:3] == [
+            "instr: 813 ticks: 1354",
+            "block 2-3 count: 255 instr: 510 ticks: 765 (56.5%) at 5:0-6:0",
+            "block 1-1 count: 256 instr: 256 ticks: 512 (37.8%) at 4:0",
+        ]
+        assert report[3] == "loop 1 blocks: 2 count: 256 instr: 766 ticks: 1277 (94.3%) at 4:0-6:0"
+        assert report[5] == "line 4 instr: 256 ticks: 512 (37.8%)"
+
+        dump = json.loads(json.dumps(profiler.dump(profile)))
+        assert dump["instructions"][1] == {
+            "index": 1, "opcode": "jz", "count": 256, "ticks": 512, "term": [4, 0, "jz clear_end"]
+        }
+        assert [loop["header"] for loop in dump["loops"]] == [1, 7]
+
+        # Быстрые движки не сообщают о границах инструкций: профилировать ими нельзя.
+        for engine in ["fast", "compiled"]:
+            with self.assertRaisesRegex(AssertionError, "Profiler requires the signal engine, not " + engine):
+                machine.simulation(code, list("A"), 10, limit=10000, engine=engine, tracer=profiler.Profiler())
+        empty = profiler.Profiler()
+        with self.assertLogs("", level="INFO"):
+            machine.simulation(code, list("A"), 10, limit=0, tracer=empty)
+        assert profiler.report(empty) == ["instr: 0 ticks: 0"] and profiler.dump(empty)["blocks"] == []
+
+        # Такты `input` на конце ввода учитываются без исполнения; счётчики накапливаются.
+        with self.assertLogs("", level="INFO"):
+            machine.simulation(code, [], 10, limit=10000, tracer=profile)
+        assert (sum(profile.counts), sum(profile.ticks)) == (813 + 811, 1354 + 1351)
+
+    def test_binary_code_format(self):
+        code = self._translate(LOOPS_ASM)
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            binary = os.path.join(tmpdirname, "machine_code.bin")
+            text = os.path.join(tmpdirname, "machine_code.out")
+            isa.write_binary(binary, code)
+            isa.write_code(text, code)
+
+            program = isa.read_program(binary)
+            assert isinstance(program.opcodes, memoryview)
+            # Отладочная информация читается только по запросу.
+            assert program.terms._cache == {}
+            assert program.terms[0] == isa.decode_program(code).terms[0]
+            assert list(program.terms._cache) == [0]
+            assert program.to_code() == isa.read_program(text).to_code()
+            # Из JSON сохраняются только кортежи `term`, а не разобранные словари инструкций.
+            loaded = isa.read_program(text)
+            cells = [cell.cell_contents for cell in loaded.terms._load.__closure__]
+            assert [type(cell) for cell in cells] == [list]
+            assert all(term is None or type(term) is tuple for term in cells[0])
+            assert list(loaded.terms) == isa.decode_program(code).terms
+            with open(text, encoding="utf-8") as file:
+                assert isa.dump_code(program.to_code()) == file.read()
+
+            with self.assertLogs("", level="INFO"):
+                expect = machine.simulation(code, list("A"), data_memory_size=10, limit=10000)
+                for engine in ["signal", "fast"]:
+                    assert machine.simulation(program, list("A"), 10, limit=10000, engine=engine) == expect
+                compiled = compiler.load(binary, os.path.join(tmpdirname, "cache"))
+                assert machine.simulation(compiled, list("A"), 10, limit=10000, engine="compiled") == expect
+
+            # Отображение файла освобождается при выходе из `with`, после чего программа недоступна.
+            with isa.read_program(binary) as mapped, self.assertLogs("", level="INFO"):
+                assert machine.simulation(mapped, list("A"), 10, limit=10000, engine="fast") == expect
+            with self.assertRaises(ValueError):
+                mapped.opcodes[0]
+            program.close()
+            program.close()
+            with isa.read_program(text) as loaded:
+                assert loaded.to_code() == isa.decode_program(code).to_code()
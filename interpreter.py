@@ -0,0 +1,527 @@
+"""Быстрый интерпретатор машинного кода.
+
+В отличие от `machine.ControlUnit`, который моделирует каждый управляющий
+сигнал отдельным методом, интерпретатор исполняет программу в одном цикле на
+локальных переменных и начисляет такты сразу на инструкцию (по таблице из
+README). Результат (вывод, `instr_counter`, такты) совпадает с потактовой
+моделью, которая остаётся эталонной.
+
+Интерпретатор работает с состоянием `ControlUnit` и `DataPath`: в начале
+состояние считывается в локальные переменные, по завершении -- записывается
+обратно. Поэтому движки можно чередовать в рамках одного моделирования.
+Память данных используется напрямую (`DataPath.tape`, беззнаковые байты),
+аккумулятор внутри цикла также хранится беззнаковым.
+
+Перед исполнением программа проходит через `fold_runs`: последовательности
+`increment`/`decrement` и `right`/`left` сворачиваются в одну
+суперинструкцию, которая начисляет ровно столько инструкций и тактов, сколько
+заняла бы исходная последовательность.
+
+Затем `recognize_loops` находит типовые циклы (`[-]`, `[->+<]`,
+`[->++>+++<<]`, `[>]` и т.п.) и заменяет их `jz` на суперинструкции, которые
+вычисляют результат цикла сразу (по формуле или одним поиском по памяти) и
+начисляют столько инструкций и тактов, сколько занял бы цикл.
+
+Наконец, для конкретного размера памяти данных серии сдвигов, которые по
+анализу `bounds` не могут выйти за её границы, заменяются на `OP_SHIFT` и
+исполняются без проверки границ. Проверка остаётся только у сдвигов, которые
+могут выйти за границы (если анализ доказал безопасность всех сдвигов, цикл
+исполняется вовсе без проверок).
+
+Страничная память данных (`machine.DataPath.page_size`) проверяется по
+`DataPath.bound` -- границе уже пройденных головкой адресов: сдвиг за неё
+выделяет страницы (`DataPath.reach`) и продолжается без развёртывания. Серии
+сдвигов здесь не заменяются на `OP_SHIFT`, так как должны обновлять
+`peak_address`, а циклы `OP_LINEAR`/`OP_SCAN`, выходящие за границу,
+исполняются как обычные циклы -- только пока головка впервые проходит
+новые адреса.
+"""
+
+import bisect
+import copy
+import weakref
+from array import array
+
+import bounds
+
+from isa import OP_DEC, OP_HALT, OP_INC, OP_INPUT, OP_JMP, OP_JZ, OP_LEFT, OP_PRINT, OP_RIGHT, OPCODES
+
+HALT = "halt"
+"Причина остановки: выполнена инструкция `halt`."
+
+EOF = "eof"
+"Причина остановки: закончились входные данные."
+
+LIMIT = "limit"
+"Причина остановки: превышен лимит количества инструкций."
+
+LOOP = "loop"
+"Причина остановки: программа зациклилась (`loopcheck`, только `machine.simulation`)."
+
+ERROR = "error"
+"Причина остановки: ошибка модели (исключение, например выход за границы памяти; только для трассировщика)."
+
+
+OP_ADD = len(OPCODES)
+"Суперинструкция: прибавить `arg` к текущей ячейке (серия `increment`/`decrement`)."
+
+OP_MOVE = OP_ADD + 1
+"Суперинструкция: сдвинуть головку на `arg` ячеек (серия `right`/`left`)."
+
+OP_LINEAR = OP_MOVE + 1
+"""Суперинструкция: `jz` линейного цикла (`[-]`, `[->+<]`, ...). Тело цикла
+только прибавляет константы к ячейкам, головка возвращается на место."""
+
+OP_SCAN = OP_LINEAR + 1
+"Суперинструкция: `jz` цикла поиска нулевой ячейки (`[>]`, `[<<]`, ...)."
+
+OP_SHIFT = OP_SCAN + 1
+"""Суперинструкция: `OP_MOVE`, который по анализу `bounds` не может выйти за
+границы памяти данных; исполняется без проверки границ."""
+
+
+class FoldedProgram:
+    """Программа после свёртки серий (`fold_runs`).
+
+    Параллельные массивы, индекс -- адрес суперинструкции:
+
+    - `opcodes` -- номер операции (`isa.OP_*`, `OP_ADD` или `OP_MOVE`);
+    - `args` -- аргумент: адрес перехода, прибавляемое значение или сдвиг;
+    - `counts` -- сколько исходных инструкций заменено;
+    - `lasts` -- для `OP_ADD`: приращение последней инструкции серии (нужно для
+      восстановления аккумулятора);
+    - `lows`, `highs` -- для `OP_MOVE`: минимальное и максимальное смещение
+      головки внутри серии (нужно для проверки границ памяти);
+    - `origins` -- адрес первой исходной инструкции (на один элемент длиннее:
+      последний соответствует концу программы);
+    - `entries` -- обратное отображение: исходный адрес -> адрес
+      суперинструкции, либо -1, если адрес находится внутри серии;
+    - `loops` -- описания распознанных циклов (`recognize_loops`) по адресу их
+      `jz`.
+    """
+
+    def __init__(self):
+        self.opcodes = array("B")
+        self.args = array("i")
+        self.counts = array("i")
+        self.lasts = array("i")
+        self.lows = array("i")
+        self.highs = array("i")
+        self.origins = array("i")
+        self.entries = array("i")
+        self.loops = {}
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def append(self, opcode, arg, count, origin, last=0, low=0, high=0):
+        self.opcodes.append(opcode)
+        self.args.append(arg)
+        self.counts.append(count)
+        self.lasts.append(last)
+        self.lows.append(low)
+        self.highs.append(high)
+        self.origins.append(origin)
+
+
+_prepared_cache = weakref.WeakKeyDictionary()
+
+
+def prepare(program, size=None):
+    """Подготовить `isa.DecodedProgram` к исполнению: `fold_runs`, затем
+    `recognize_loops`. Если задан размер памяти данных `size`, серии сдвигов,
+    безопасность которых доказана `bounds.safe_moves`, заменяются на
+    `OP_SHIFT`. Результат кэшируется для каждой программы и размера памяти.
+    """
+    prepared = _prepared_cache.get(program)
+    if prepared is None:
+        folded = fold_runs(program)
+        recognize_loops(folded)
+        prepared = _prepared_cache[program] = {None: folded}
+    if size not in prepared:
+        prepared[size] = _unchecked(prepared[None], bounds.safe_moves(program, size))
+    return prepared[size]
+
+
+def _unchecked(folded, safe):
+    """Копия свёрнутой программы, в которой `OP_MOVE` из безопасных сдвигов
+    заменены на `OP_SHIFT`. Остальные массивы общие с `folded`.
+    """
+    specialized = copy.copy(folded)
+    specialized.opcodes = array("B", folded.opcodes)
+    for pc, opcode in enumerate(folded.opcodes):
+        if opcode == OP_MOVE:
+            start = folded.origins[pc]
+            if all(safe[start : start + folded.counts[pc]]):
+                specialized.opcodes[pc] = OP_SHIFT
+    return specialized
+
+
+def fold_runs(program):
+    """Свернуть серии `increment`/`decrement` и `right`/`left` программы
+    (`isa.DecodedProgram`) в суперинструкции `OP_ADD` и `OP_MOVE`.
+
+    Серия не может пересекать адрес, на который есть переход, поэтому после
+    перенумерации все переходы `jz`/`jmp` указывают на начало суперинструкции.
+    """
+    opcodes = program.opcodes
+    args = program.args
+    leaders = {args[pc] for pc in range(len(opcodes)) if opcodes[pc] == OP_JZ or opcodes[pc] == OP_JMP}
+    steps = {OP_INC: 1, OP_DEC: -1, OP_RIGHT: 1, OP_LEFT: -1}
+
+    folded = FoldedProgram()
+    new_pc = array("i", [0] * (len(opcodes) + 1))
+    pc = 0
+    while pc < len(opcodes):
+        opcode = opcodes[pc]
+        if opcode not in steps:
+            new_pc[pc] = len(folded)
+            folded.append(opcode, args[pc], 1, pc)
+            pc += 1
+            continue
+
+        group = (OP_INC, OP_DEC) if opcode in (OP_INC, OP_DEC) else (OP_RIGHT, OP_LEFT)
+        start, total, low, high = pc, 0, 0, 0
+        while pc < len(opcodes) and opcodes[pc] in group and (pc == start or pc not in leaders):
+            new_pc[pc] = len(folded)
+            total += steps[opcodes[pc]]
+            low, high = min(low, total), max(high, total)
+            pc += 1
+        if group[0] == OP_INC:
+            folded.append(OP_ADD, total, pc - start, start, last=steps[opcodes[pc - 1]])
+        else:
+            folded.append(OP_MOVE, total, pc - start, start, low=low, high=high)
+    new_pc[len(opcodes)] = len(folded)
+    folded.origins.append(len(opcodes))
+    folded.entries = array("i", [-1] * (len(opcodes) + 1))
+    for pc, origin in enumerate(folded.origins):
+        folded.entries[origin] = pc
+
+    for pc in range(len(folded)):
+        if folded.opcodes[pc] == OP_JZ or folded.opcodes[pc] == OP_JMP:
+            target = folded.args[pc]
+            assert 0 <= target <= len(opcodes), "internal error, jump out of program: {}".format(target)
+            folded.args[pc] = new_pc[target]
+
+    return folded
+
+
+def recognize_loops(folded):
+    """Найти в свёрнутой программе циклы вида `jz (m+1) ... jmp n`, тело
+    которых состоит только из `OP_ADD` и `OP_MOVE`, и заменить их `jz`:
+
+    - `OP_LINEAR` -- головка возвращается на место, а текущая ячейка меняется
+      на нечётное число за итерацию. Тогда число итераций `t` -- решение
+      `v + t * d = 0 (mod 256)`, а каждая ячейка тела получает `t * delta`.
+      Описание: `(offsets, deltas, inverse, body_count, body_ticks, low, high)`.
+
+    - `OP_SCAN` -- тело только сдвигает головку. Число итераций определяется
+      поиском первой нулевой ячейки с шагом сдвига.
+      Описание: `(step, body_count, body_ticks, low, high)`.
+
+    Переходы внутрь тела цикла (кроме самого цикла) исключают распознавание.
+    """
+    targets = {}
+    for pc in range(len(folded)):
+        if folded.opcodes[pc] == OP_JZ or folded.opcodes[pc] == OP_JMP:
+            targets[folded.args[pc]] = targets.get(folded.args[pc], 0) + 1
+
+    for start in range(len(folded)):
+        if folded.opcodes[start] != OP_JZ:
+            continue
+        end = folded.args[start] - 1
+        if end <= start or folded.opcodes[end] != OP_JMP or folded.args[end] != start:
+            continue
+        body = range(start + 1, end)
+        if any(folded.opcodes[pc] not in (OP_ADD, OP_MOVE) or pc in targets for pc in body):
+            continue
+        if targets.get(end, 0) > 0:
+            continue
+
+        offset, low, high, body_count, body_ticks, deltas = 0, 0, 0, 0, 0, {}
+        for pc in body:
+            body_count += folded.counts[pc]
+            if folded.opcodes[pc] == OP_ADD:
+                deltas[offset] = deltas.get(offset, 0) + folded.args[pc]
+                body_ticks += 2 * folded.counts[pc]
+            else:
+                low = min(low, offset + folded.lows[pc])
+                high = max(high, offset + folded.highs[pc])
+                offset += folded.args[pc]
+                body_ticks += folded.counts[pc]
+        deltas = {cell: delta % 256 for cell, delta in deltas.items() if delta % 256 != 0}
+
+        if offset == 0 and deltas.get(0, 0) % 2 == 1:
+            offsets = tuple(deltas)
+            folded.opcodes[start] = OP_LINEAR
+            folded.loops[start] = (
+                offsets,
+                tuple(deltas[cell] for cell in offsets),
+                pow(deltas[0], -1, 256),
+                body_count,
+                body_ticks,
+                low,
+                high,
+            )
+        elif offset != 0 and not deltas:
+            folded.opcodes[start] = OP_SCAN
+            folded.loops[start] = (offset, body_count, body_ticks, low, high)
+
+
+def run(control_unit, instr_counter, limit):
+    """Исполнять программу `control_unit`, пока `instr_counter < limit`.
+
+    Исполняется подготовленная программа (`prepare`). Если суперинструкция не
+    помещается в оставшийся лимит или может выйти за границы памяти данных,
+    остаток работы передаётся `run_unfolded`, чтобы остановка произошла на той
+    же инструкции, что и в потактовой модели.
+
+    Возвращает пару: новое значение счётчика инструкций и причину остановки
+    (`HALT`, `EOF` или `LIMIT`). Выход за границы памяти данных, как и в
+    `DataPath.signal_latch_data_addr`, приводит к `AssertionError`.
+    """
+    data_path = control_unit.data_path
+    folded = prepare(control_unit.program, data_path.data_memory_size if data_path.page_size is None else None)
+    pc = folded.entries[control_unit.program_counter]
+    if pc == -1:
+        # Предыдущий запуск остановился внутри серии: доисполнить её по одной
+        # инструкции до начала следующей суперинструкции.
+        run_end = folded.origins[bisect.bisect_right(folded.origins, control_unit.program_counter)]
+        instr_counter, reason = run_unfolded(
+            control_unit, instr_counter, min(limit, instr_counter + run_end - control_unit.program_counter)
+        )
+        if reason != LIMIT or instr_counter >= limit:
+            return instr_counter, reason
+        pc = folded.entries[control_unit.program_counter]
+
+    opcodes = folded.opcodes
+    args = folded.args
+    counts = folded.counts
+    lasts = folded.lasts
+    lows = folded.lows
+    highs = folded.highs
+    origins = folded.origins
+    loops = folded.loops
+    memory = data_path.tape
+    size = data_path.bound
+    read = data_path.input_port.read
+    write = data_path.output_port.write
+
+    addr = data_path.data_address
+    acc = data_path.acc & 0xFF
+    tick = control_unit.current_tick()
+    reason = LIMIT
+    unfold = False
+
+    try:
+        while instr_counter < limit:
+            opcode = opcodes[pc]
+            if opcode == OP_ADD:
+                count = counts[pc]
+                if instr_counter + count > limit:
+                    unfold = True
+                    break
+                value = (memory[addr] + args[pc]) & 0xFF
+                memory[addr] = value
+                acc = (value - lasts[pc]) & 0xFF
+                pc += 1
+                tick += 2 * count
+                instr_counter += count
+                continue
+            if opcode == OP_SHIFT:
+                count = counts[pc]
+                if instr_counter + count > limit:
+                    unfold = True
+                    break
+                addr += args[pc]
+                pc += 1
+                tick += count
+                instr_counter += count
+                continue
+            if opcode == OP_MOVE:
+                count = counts[pc]
+                if instr_counter + count > limit or addr + lows[pc] < 0 or addr + highs[pc] >= size:
+                    if instr_counter + count <= limit and addr + lows[pc] >= 0:
+                        size = data_path.reach(addr + highs[pc])
+                    if instr_counter + count > limit or addr + lows[pc] < 0 or addr + highs[pc] >= size:
+                        unfold = True
+                        break
+                addr += args[pc]
+                pc += 1
+                tick += count
+                instr_counter += count
+                continue
+            if opcode == OP_LINEAR and memory[addr] != 0:
+                offsets, deltas, inverse, body_count, body_ticks, low, high = loops[pc]
+                iterations = (-memory[addr] * inverse) & 0xFF
+                count = iterations * (body_count + 2) + 1
+                if instr_counter + count <= limit and addr + low >= 0 and addr + high < size:
+                    for offset, delta in zip(offsets, deltas):
+                        cell = addr + offset
+                        memory[cell] = (memory[cell] + iterations * delta) & 0xFF
+                    acc = 0
+                    pc = args[pc]
+                    tick += iterations * (body_ticks + 3) + 2
+                    instr_counter += count
+                    continue
+            elif opcode == OP_SCAN and memory[addr] != 0:
+                iterations = _scan(memory, addr, size, limit - instr_counter, loops[pc])
+                if iterations:
+                    step, body_count, body_ticks = loops[pc][:3]
+                    addr += iterations * step
+                    acc = 0
+                    pc = args[pc]
+                    tick += iterations * (body_ticks + 3) + 2
+                    instr_counter += iterations * (body_count + 2) + 1
+                    continue
+
+            if opcode == OP_JZ or opcode == OP_LINEAR or opcode == OP_SCAN:
+                acc = memory[addr]
+                pc = args[pc] if acc == 0 else pc + 1
+                tick += 2
+            elif opcode == OP_JMP:
+                pc = args[pc]
+                tick += 1
+            elif opcode == OP_INPUT:
+                acc = memory[addr]
+                tick += 1
+                symbol = read()
+                if symbol is None:
+                    reason = EOF
+                    break
+                symbol_code = ord(symbol)
+                assert -128 <= symbol_code <= 127, "input token is out of bound: {}".format(symbol_code)
+                memory[addr] = symbol_code & 0xFF
+                pc += 1
+                tick += 1
+            elif opcode == OP_PRINT:
+                acc = memory[addr]
+                write(chr(acc if acc < 128 else acc - 256))
+                pc += 1
+                tick += 2
+            elif opcode == OP_HALT:
+                reason = HALT
+                break
+            instr_counter += 1
+    finally:
+        control_unit.program_counter = origins[pc]
+        control_unit._tick = tick
+        data_path.data_address = addr
+        data_path.acc = acc if acc < 128 else acc - 256
+
+    if unfold:
+        return run_unfolded(control_unit, instr_counter, limit)
+    return instr_counter, reason
+
+
+def _scan(memory, addr, size, budget, loop):
+    """Число итераций цикла поиска (`OP_SCAN`) из ячейки `addr` памяти `memory`
+    (`bytearray`, поиск нуля выполняется встроенным `find`), либо 0, если
+    цикл нельзя выполнить сразу: нулевая ячейка не найдена, цикл выходит за
+    границы памяти или не помещается в оставшийся лимит инструкций `budget`.
+    """
+    step, body_count, _, low, high = loop
+    start = addr + step
+    if not 0 <= start < size:
+        return 0
+    if step == 1:
+        found = memory.find(0, start)
+    elif step == -1:
+        found = memory.rfind(0, 0, start + 1)
+    else:
+        found = memory[start::step].find(0)
+        found = start + found * step if found != -1 else -1
+    if found == -1:
+        return 0
+    iterations = (found - addr) // step
+    last = addr + (iterations - 1) * step
+    if min(addr, last) + low < 0 or max(addr, last) + high >= size:
+        return 0
+    if iterations * (body_count + 2) + 1 > budget:
+        return 0
+    return iterations
+
+
+def run_unfolded(control_unit, instr_counter, limit):
+    """Исполнять программу `control_unit` по одной исходной инструкции, пока
+    `instr_counter < limit`. Результат -- как у `run`.
+
+    Возвращает пару: новое значение счётчика инструкций и причину остановки
+    (`HALT`, `EOF` или `LIMIT`). Выход за границы памяти данных, как и в
+    `DataPath.signal_latch_data_addr`, приводит к `AssertionError`.
+    """
+    program = control_unit.program
+    opcodes = program.opcodes
+    args = program.args
+    data_path = control_unit.data_path
+    memory = data_path.tape
+    size = data_path.bound
+    read = data_path.input_port.read
+    write = data_path.output_port.write
+
+    pc = control_unit.program_counter
+    addr = data_path.data_address
+    acc = data_path.acc & 0xFF
+    tick = control_unit.current_tick()
+    reason = LIMIT
+
+    try:
+        while instr_counter < limit:
+            opcode = opcodes[pc]
+            if opcode == OP_INC:
+                acc = memory[addr]
+                memory[addr] = (acc + 1) & 0xFF
+                pc += 1
+                tick += 2
+            elif opcode == OP_DEC:
+                acc = memory[addr]
+                memory[addr] = (acc - 1) & 0xFF
+                pc += 1
+                tick += 2
+            elif opcode == OP_RIGHT:
+                addr += 1
+                if addr >= size:
+                    size = data_path.reach(addr)
+                    assert addr < size, "out of memory: {}".format(addr)
+                pc += 1
+                tick += 1
+            elif opcode == OP_LEFT:
+                addr -= 1
+                assert addr >= 0, "out of memory: {}".format(addr)
+                pc += 1
+                tick += 1
+            elif opcode == OP_JZ:
+                acc = memory[addr]
+                pc = args[pc] if acc == 0 else pc + 1
+                tick += 2
+            elif opcode == OP_JMP:
+                pc = args[pc]
+                tick += 1
+            elif opcode == OP_INPUT:
+                acc = memory[addr]
+                tick += 1
+                symbol = read()
+                if symbol is None:
+                    reason = EOF
+                    break
+                symbol_code = ord(symbol)
+                assert -128 <= symbol_code <= 127, "input token is out of bound: {}".format(symbol_code)
+                memory[addr] = symbol_code & 0xFF
+                pc += 1
+                tick += 1
+            elif opcode == OP_PRINT:
+                acc = memory[addr]
+                write(chr(acc if acc < 128 else acc - 256))
+                pc += 1
+                tick += 2
+            elif opcode == OP_HALT:
+                reason = HALT
+                break
+            instr_counter += 1
+    finally:
+        control_unit.program_counter = pc
+        control_unit._tick = tick
+        data_path.data_address = addr
+        data_path.acc = acc if acc < 128 else acc - 256
+
+    return instr_counter, reason
@@ -30,11 +30,33 @@
 - `opcode` -- строка с кодом операции (тип: `Opcode`);
 - `arg` -- аргумент инструкции (если требуется);
 - `term` -- информация о связанном месте в исходном коде (если есть).
+
+Помимо JSON (формат экспорта, удобен для чтения человеком) машинный код
+хранится в компактном двоичном формате (`write_binary`, `read_binary`):
+
+- заголовок `BINARY_HEADER`: сигнатура `BINARY_MAGIC`, версия формата, флаги,
+  количество инструкций, смещение и размер отладочной секции;
+- таблица инструкций фиксированной ширины: коды операций (`uint8` на
+  инструкцию), затем (с выравниванием на 4 байта) аргументы (`int32`, `NO_ARG`
+  если аргумента нет), little-endian;
+- необязательная отладочная секция (флаг `BINARY_HAS_TERMS`): таблица
+  `BINARY_TERM` (строка, позиция, смещение и длина символа; строка `-1` --
+  `term` нет) и следующий за ней пул строк UTF-8.
+
+Двоичный файл читается через `mmap`: коды операций и аргументы -- `memoryview`
+над отображённым файлом, объекты на каждую инструкцию не создаются. Отображение
+освобождается `DecodedProgram.close` (или при выходе из `with`).
+`read_program` определяет формат файла по сигнатуре.
 """
 
 import json
+import mmap
+import struct
+import sys
+from array import array
 from collections import namedtuple
 from enum import Enum
+from json.encoder import encode_basestring_ascii
 
 
 class Opcode(str, Enum):
@@ -75,6 +97,18 @@ class Opcode(str, Enum):
         return str(self.value)
 
 
+OPCODES = tuple(Opcode)
+"Таблица декодирования: номер кода операции (индекс) -> `Opcode`."
+
+OP_RIGHT, OP_LEFT, OP_INC, OP_DEC, OP_INPUT, OP_PRINT, OP_JMP, OP_JZ, OP_HALT = range(len(OPCODES))
+
+TICKS = (1, 1, 2, 2, 2, 2, 1, 2, 0)
+"Количество тактов инструкции по номеру кода операции (см. README)."
+
+NO_ARG = -1
+"Значение аргумента для инструкций, у которых аргумента нет."
+
+
 class Term(namedtuple("Term", "line pos symbol")):
     """Описание выражения из исходного текста программы.
 
@@ -82,15 +116,43 @@ class Term(namedtuple("Term", "line pos symbol")):
     """
 
 
+class Savings(namedtuple("Savings", "instr ticks")):
+    """Экономия от оптимизации: на сколько инструкций меньше машинный код и
+    сколько тактов экономится при однократном исполнении каждого изменённого
+    места.
+    """
+
+    __slots__ = ()
+
+
+def _dumps(code):
+    """Инструкции машинного кода (список или `DecodedProgram`) в виде строк JSON."""
+    if isinstance(code, DecodedProgram):
+        return code.json_lines()
+    return map(json.dumps, code)
+
+
+def dump_code(code):
+    """Машинный код в виде текста JSON (формат файла `write_code`)."""
+    # Почему не: `json.dumps(code, indent=4)`?
+    # Чтобы одна инструкция была на одну строку.
+    return "[" + ",\n ".join(_dumps(code)) + "]"
+
+
 def write_code(filename, code):
-    """Записать машинный код в файл."""
+    """Записать машинный код (список инструкций или `DecodedProgram`) в файл.
+
+    Текст совпадает с `dump_code`, но пишется по одной инструкции, не собираясь
+    в памяти целиком.
+    """
     with open(filename, "w", encoding="utf-8") as file:
-        # Почему не: `file.write(json.dumps(code, indent=4))`?
-        # Чтобы одна инструкция была на одну строку.
-        buf = []
-        for instr in code:
-            buf.append(json.dumps(instr))
-        file.write("[" + ",\n ".join(buf) + "]")
+        file.write("[")
+        separator = ""
+        for line in _dumps(code):
+            file.write(separator)
+            file.write(line)
+            separator = ",\n "
+        file.write("]")
 
 
 def read_code(filename):
@@ -114,3 +176,270 @@ def read_code(filename):
             instr["term"] = Term(instr["term"][0], instr["term"][1], instr["term"][2])
 
     return code
+
+
+class DecodedProgram:
+    """Предекодированное представление машинного кода.
+
+    Вместо списка словарей программа хранится в виде параллельных компактных
+    массивов, индекс в которых -- адрес инструкции:
+
+    - `opcodes` -- номера кодов операций (`array("B")`, индекс в `OPCODES`);
+    - `args` -- аргументы инструкций (`array("i")`, `NO_ARG` если аргумента нет);
+    - `terms` -- побочная таблица `Term` (или `None`), нужна только для журнала
+      (при чтении из файла -- `LazyTerms`).
+
+    Декодирование выполняется один раз при загрузке, поэтому во время
+    моделирования не требуется ни поиск по словарю, ни сравнение `Enum`.
+
+    Программа, прочитанная `read_binary`, ссылается на отображённый в память
+    файл; `close` (или выход из `with`) освобождает его, после чего программа
+    недоступна. Для остальных программ `close` ничего не делает.
+    """
+
+    opcodes = None
+    "Номера кодов операций."
+
+    args = None
+    "Аргументы инструкций."
+
+    terms = None
+    "Информация о связанном месте в исходном коде."
+
+    _mapping = None
+
+    def __init__(self, opcodes, args, terms):
+        assert len(opcodes) == len(args) == len(terms), "internal error"
+        self.opcodes = opcodes
+        self.args = args
+        self.terms = terms
+
+    def close(self):
+        """Освободить отображённый в память файл (`read_binary`)."""
+        if self._mapping is None:
+            return
+        for view in (self.opcodes, self.args):
+            if isinstance(view, memoryview):
+                view.release()
+        self._mapping.close()
+        self._mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def opcode(self, pc):
+        """`Opcode` инструкции по адресу `pc`."""
+        return OPCODES[self.opcodes[pc]]
+
+    def instruction(self, pc):
+        """Инструкция по адресу `pc` в виде словаря, как в JSON-представлении."""
+        instr = {"index": pc, "opcode": self.opcode(pc)}
+        if self.args[pc] != NO_ARG:
+            instr["arg"] = self.args[pc]
+        if self.terms[pc] is not None:
+            instr["term"] = self.terms[pc]
+        return instr
+
+    def json_lines(self):
+        """Инструкции в виде строк JSON: то же, что `json.dumps(self.instruction(pc))`,
+        но без промежуточных словарей.
+        """
+        names = [encode_basestring_ascii(opcode.value) for opcode in OPCODES]
+        for pc, (opcode, arg, term) in enumerate(zip(self.opcodes, self.args, self.terms)):
+            text = '{"index": %d, "opcode": %s' % (pc, names[opcode])
+            if arg != NO_ARG:
+                text += ', "arg": %d' % arg
+            if term is not None:
+                if type(term.symbol) is str:
+                    text += ', "term": [%d, %d, %s]' % (term.line, term.pos, encode_basestring_ascii(term.symbol))
+                else:
+                    text += ', "term": ' + json.dumps(term)
+            yield text + "}"
+
+    def to_code(self):
+        """Экспорт в список словарей (формат `write_code`)."""
+        return [self.instruction(pc) for pc in range(len(self))]
+
+
+class LazyTerms:
+    """Таблица `Term`, элементы которой создаются только при обращении.
+
+    Отладочная информация нужна лишь трассировщику и сообщениям об ошибках,
+    поэтому при загрузке программы `Term` не создаются: `load(pc)` вызывается
+    при первом обращении к адресу `pc`, результат запоминается.
+
+    >>> terms = LazyTerms(2, lambda pc: Term(1, pc, "+") if pc else None)
+    >>> terms[1], terms[0], len(terms._cache)
+    (Term(line=1, pos=1, symbol='+'), None, 2)
+    """
+
+    def __init__(self, count, load):
+        self._count = count
+        self._load = load
+        self._cache = {}
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, pc):
+        try:
+            return self._cache[pc]
+        except KeyError:
+            pass
+        if not 0 <= pc < self._count:
+            raise IndexError("term index out of range")
+        term = self._cache[pc] = self._load(pc)
+        return term
+
+    def __iter__(self):
+        # Полный просмотр (запись в файл) не заполняет кэш.
+        cache, load = self._cache, self._load
+        return (cache[pc] if pc in cache else load(pc) for pc in range(self._count))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+
+def decode_program(code):
+    """Преобразовать машинный код (список словарей, результат `read_code` или
+    транслятора) в `DecodedProgram`.
+
+    >>> program = decode_program([{"opcode": Opcode.JZ, "arg": 2}, {"opcode": "jmp", "arg": 0}, {"opcode": "halt"}])
+    >>> list(program.opcodes) == [OP_JZ, OP_JMP, OP_HALT], list(program.args)
+    (True, [2, 0, -1])
+    """
+    if isinstance(code, DecodedProgram):
+        return code
+
+    codes = {opcode: number for number, opcode in enumerate(OPCODES)}
+    opcodes = array("B")
+    args = array("i")
+    terms = []
+    for instr in code:
+        opcodes.append(codes[Opcode(instr["opcode"])])
+        args.append(instr.get("arg", NO_ARG))
+        term = instr.get("term")
+        if term is not None and not isinstance(term, Term):
+            term = Term(term[0], term[1], term[2])
+        terms.append(term)
+
+    return DecodedProgram(opcodes, args, terms)
+
+
+BINARY_MAGIC = b"BFMC"
+"Сигнатура двоичного формата машинного кода."
+
+BINARY_VERSION = 1
+"Версия двоичного формата."
+
+BINARY_HAS_TERMS = 1
+"Флаг заголовка: есть отладочная секция."
+
+BINARY_HEADER = struct.Struct("<4sHHIII")
+"Заголовок: сигнатура, версия, флаги, количество инструкций, смещение и размер отладочной секции."
+
+BINARY_TERM = struct.Struct("<iiII")
+"Запись отладочной секции: строка, позиция, смещение и длина символа в пуле строк."
+
+
+def _align(offset):
+    return (offset + 3) & ~3
+
+
+def write_binary(filename, code):
+    """Записать машинный код (список инструкций или `DecodedProgram`) в двоичном формате."""
+    program = decode_program(code)
+    count = len(program)
+    args_offset = _align(BINARY_HEADER.size + count)
+    debug_offset = _align(args_offset + 4 * count)
+
+    flags = 0
+    debug = b""
+    if any(term is not None for term in program.terms):
+        flags |= BINARY_HAS_TERMS
+        table = bytearray()
+        pool = bytearray()
+        for term in program.terms:
+            if term is None:
+                table += BINARY_TERM.pack(-1, 0, 0, 0)
+            else:
+                symbol = str(term.symbol).encode("utf-8")
+                table += BINARY_TERM.pack(term.line, term.pos, len(pool), len(symbol))
+                pool += symbol
+        debug = bytes(table + pool)
+
+    with open(filename, "wb") as file:
+        file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, flags, count, debug_offset, len(debug)))
+        file.write(bytes(program.opcodes))
+        file.write(bytes(args_offset - BINARY_HEADER.size - count))
+        file.write(struct.pack("<{}i".format(count), *program.args))
+        file.write(bytes(debug_offset - args_offset - 4 * count))
+        file.write(debug)
+
+
+def read_binary(filename):
+    """Прочитать машинный код в двоичном формате как `DecodedProgram`.
+
+    Коды операций и аргументы -- `memoryview` над отображённым в память файлом
+    (только чтение); файл освобождается `close` программы.
+    """
+    with open(filename, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, flags, count, debug_offset, debug_size = BINARY_HEADER.unpack_from(data)
+    assert magic == BINARY_MAGIC, "not a binary machine code file: {}".format(filename)
+    assert version == BINARY_VERSION, "unsupported machine code version: {}".format(version)
+
+    view = memoryview(data)
+    opcodes = view[BINARY_HEADER.size : BINARY_HEADER.size + count]
+    args_offset = _align(BINARY_HEADER.size + count)
+    args = view[args_offset : args_offset + 4 * count].cast("i")
+    if sys.byteorder != "little":
+        args = array("i", args)
+        args.byteswap()
+
+    assert debug_offset + debug_size <= len(data), "truncated machine code file: {}".format(filename)
+    pool = debug_offset + BINARY_TERM.size * count
+
+    def load(pc):
+        if not flags & BINARY_HAS_TERMS:
+            return None
+        line, pos, offset, length = BINARY_TERM.unpack_from(data, debug_offset + BINARY_TERM.size * pc)
+        if line < 0:
+            return None
+        return Term(line, pos, data[pool + offset : pool + offset + length].decode("utf-8"))
+
+    program = DecodedProgram(opcodes, args, LazyTerms(count, load))
+    program._mapping = data
+    return program
+
+
+def read_program(filename):
+    """Прочитать машинный код в любом формате (двоичном или JSON) как `DecodedProgram`."""
+    with open(filename, "rb") as file:
+        magic = file.read(len(BINARY_MAGIC))
+    if magic == BINARY_MAGIC:
+        return read_binary(filename)
+
+    with open(filename, encoding="utf-8") as file:
+        code = json.loads(file.read())
+    codes = {opcode.value: number for number, opcode in enumerate(OPCODES)}
+    opcodes = array("B", (codes[instr["opcode"]] for instr in code))
+    args = array("i", (instr.get("arg", NO_ARG) for instr in code))
+    # Разобранные словари инструкций не сохраняются: `load` держит только кортежи `term`.
+    raw_terms = [None if instr.get("term") is None else tuple(instr["term"]) for instr in code]
+    del code
+
+    def load(pc):
+        term = raw_terms[pc]
+        if term is None:
+            return None
+        assert len(term) == 3
+        return Term(term[0], term[1], term[2])
+
+    return DecodedProgram(opcodes, args, LazyTerms(len(raw_terms), load))
@@ -0,0 +1,59 @@
+"""Обнаружение бесконечных циклов по повторению состояния модели.
+
+Модель детерминирована: если без ввода и вывода состояние (PC, адрес,
+аккумулятор и память данных; счётчики инструкций и тактов не входят) повторилось,
+дальше повторяется и всё исполнение, то есть программа не остановится.
+
+`machine.simulation` (параметр `loop_check_every`) исполняет программу
+порциями и после каждой снимает отпечаток состояния. Отпечатки снимаются через
+равное количество инструкций, поэтому на зациклившемся исполнении они тоже
+повторяются, и движки (в том числе быстрые, которые не останавливаются на
+переходах) дают один и тот же результат.
+
+Повтор ищется алгоритмом Брента: хранится один сохранённый отпечаток, который
+заменяется текущим через 1, 2, 4, ... отпечатков. Память -- одна копия памяти
+данных, цикл из `λ` отпечатков после `μ` отпечатков разгона обнаруживается не
+позже чем через `2 * (μ + λ)` отпечатков. Отпечатки сравниваются целиком,
+поэтому ложных срабатываний нет. Ввод или вывод между отпечатками начинает
+поиск заново: состояние ввода и вывода в отпечаток не входит.
+"""
+
+
+class LoopDetector:
+    """Поиск повторения состояния модели среди последовательных отпечатков.
+
+    >>> detector = LoopDetector()
+    >>> [detector.add(state, (0, 0)) for state in [1, 2, 3, 4, 3, 4]]
+    [False, False, False, False, False, True]
+    >>> detector = LoopDetector()
+    >>> [detector.add(state, io) for state, io in [(1, (0, 0)), (1, (0, 1)), (1, (0, 1))]]
+    [False, False, True]
+    """
+
+    def __init__(self):
+        self._saved = None
+        self._io = None
+        self._power = 1
+        self._length = 0
+
+    def add(self, state, io):
+        """Добавить отпечаток `state`; `io` -- количество прочитанных и
+        выведенных символов. Вернуть `True`, если состояние повторилось.
+        """
+        if io != self._io:
+            self._saved, self._io, self._power, self._length = state, io, 1, 0
+            return False
+        if state == self._saved:
+            return True
+        self._length += 1
+        if self._length == self._power:
+            self._saved, self._power, self._length = state, self._power * 2, 0
+        return False
+
+    def check(self, control_unit):
+        """Снять отпечаток состояния `control_unit` (`machine.ControlUnit`) и
+        вернуть `True`, если программа зациклилась.
+        """
+        data_path = control_unit.data_path
+        state = (control_unit.program_counter, data_path.data_address, data_path.acc, bytes(data_path.tape))
+        return self.add(state, (data_path.input_port.position, data_path.output_port.count))
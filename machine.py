@@ -14,7 +14,29 @@
 import logging
 import sys
 
-from isa import Opcode, read_code
+import checkpoint
+import compiler
+import interpreter
+import loopcheck
+import prefix
+from isa import (
+    NO_ARG,
+    OP_DEC,
+    OP_HALT,
+    OP_INC,
+    OP_INPUT,
+    OP_JMP,
+    OP_JZ,
+    OP_LEFT,
+    OP_PRINT,
+    OP_RIGHT,
+    OPCODES,
+    Opcode,
+    decode_program,
+    read_program,
+)
+from ports import InputPort, OutputPort, as_input_port
+from tracer import INPUT, OUTPUT, TextTracer, Tracer, state_repr
 
 
 class DataPath:
@@ -54,6 +76,19 @@ class DataPath:
 
     - data_memory -- однопортовая, поэтому либо читаем, либо пишем.
 
+    - data_memory хранится компактно: `tape` -- `bytearray` (ячейка -- один байт,
+      переполнение -- естественная арифметика по модулю 256), а `data_memory` --
+      знаковое представление той же памяти (`memoryview` с форматом `"b"`) без
+      копирования. Движки, снимки и дампы памяти используют тот же буфер.
+
+    - data_memory может быть страничной (`page_size`): память выделяется
+      страницами по `page_size` ячеек при первом обращении, а
+      `data_memory_size` -- предел роста (`None` -- без предела). Головка
+      сдвигается на одну ячейку, поэтому использованная память -- всегда начало
+      ленты: страницы добавляются в конец `tape` (`reach`), а `memoryview`
+      пересоздаётся. Отслеживается максимальный адрес головки
+      (`peak_address`).
+
     - input/output -- токенизированная логика ввода-вывода. Не детализируется в
       рамках модели.
 
@@ -72,10 +107,19 @@ class DataPath:
     """
 
     data_memory_size = None
-    "Размер памяти данных."
+    "Размер памяти данных (для страничной памяти -- предел роста или `None`)."
+
+    page_size = None
+    "Размер страницы страничной памяти данных или `None` (память выделена целиком)."
+
+    peak_address = None
+    "Максимальный адрес головки (только для страничной памяти)."
+
+    tape = None
+    "Память данных (`bytearray`, беззнаковые байты). Инициализируется нулями."
 
     data_memory = None
-    "Память данных. Инициализируется нулевыми значениями."
+    "Память данных в знаковом представлении (`memoryview` над `tape`)."
 
     data_address = None
     "Адрес в памяти данных. Инициализируется нулём."
@@ -83,20 +127,76 @@ class DataPath:
     acc = None
     "Аккумулятор. Инициализируется нулём."
 
-    input_buffer = None
-    "Буфер входных данных. Инициализируется входными данными конструктора."
+    input_port = None
+    "Порт ввода (`ports.InputPort`). Инициализируется входными данными конструктора."
+
+    output_port = None
+    "Порт вывода (`ports.OutputPort`)."
 
-    output_buffer = None
-    "Буфер выходных данных."
+    tracer = None
+    "Трассировщик (`tracer.Tracer`) или `None`. Подключается через `ControlUnit`."
 
-    def __init__(self, data_memory_size, input_buffer):
-        assert data_memory_size > 0, "Data_memory size should be non-zero"
+    def __init__(self, data_memory_size, input_buffer, output_port=None, page_size=None):
+        assert page_size is None or page_size > 0, "Page size should be non-zero"
+        assert (page_size is not None and data_memory_size is None) or data_memory_size > 0, (
+            "Data_memory size should be non-zero"
+        )
         self.data_memory_size = data_memory_size
-        self.data_memory = [0] * data_memory_size
+        self.page_size = page_size
+        if page_size is None:
+            self.tape = bytearray(data_memory_size)
+        else:
+            self.tape = bytearray(page_size if data_memory_size is None else min(page_size, data_memory_size))
+            self.peak_address = 0
+        self.data_memory = memoryview(self.tape).cast("b")
         self.data_address = 0
         self.acc = 0
-        self.input_buffer = input_buffer
-        self.output_buffer = []
+        self.input_port = as_input_port(input_buffer)
+        self.output_port = output_port if output_port is not None else OutputPort()
+        self.tracer = None
+
+    @property
+    def bound(self):
+        """Граница адресов, до которой головка уже доходила: сдвиг на адрес
+        `bound` и дальше требует проверки (`reach`). Для нестраничной памяти --
+        её размер.
+        """
+        if self.page_size is None:
+            return self.data_memory_size
+        return self.peak_address + 1
+
+    @property
+    def pages_touched(self):
+        """Количество выделенных страниц памяти данных."""
+        return -(-len(self.tape) // self.page_size)
+
+    def reach(self, addr):
+        """Головка доходит до адреса `addr`: выделить недостающие страницы
+        и обновить `peak_address`. Если память не страничная или `addr` за
+        пределом роста, ничего не меняется. Вернуть новое значение `bound`.
+
+        >>> dp = DataPath(None, [], page_size=4)
+        >>> dp.reach(5), len(dp.tape), dp.pages_touched
+        (6, 8, 2)
+        >>> dp = DataPath(6, [], page_size=4)
+        >>> dp.reach(6), dp.reach(5), len(dp.tape)
+        (1, 6, 6)
+        """
+        if self.page_size is None or addr < 0:
+            return self.bound
+        limit = self.data_memory_size
+        if limit is not None and addr >= limit:
+            return self.bound
+        if addr >= len(self.tape):
+            size = (addr // self.page_size + 1) * self.page_size
+            if limit is not None:
+                size = min(size, limit)
+            # Пока есть `memoryview`, `bytearray` нельзя расширить.
+            self.data_memory.release()
+            self.tape.extend(bytes(size - len(self.tape)))
+            self.data_memory = memoryview(self.tape).cast("b")
+        self.peak_address = max(self.peak_address, addr)
+        return self.peak_address + 1
 
     def signal_latch_data_addr(self, sel):
         """Защёлкнуть адрес в памяти данных. Защёлкивание осуществляется на
@@ -114,8 +214,10 @@ class DataPath:
             self.data_address -= 1
         elif sel == Opcode.RIGHT.value:
             self.data_address += 1
+            if self.data_address >= self.bound:
+                self.reach(self.data_address)
 
-        assert 0 <= self.data_address < self.data_memory_size, "out of memory: {}".format(self.data_address)
+        assert 0 <= self.data_address < self.bound, "out of memory: {}".format(self.data_address)
 
     def signal_latch_acc(self):
         """Защёлкнуть слово из памяти (`oe` от Output Enable) и защёлкнуть его в
@@ -132,8 +234,8 @@ class DataPath:
 
         - `Opcode.DEC.value` -- декремент аккумулятора;
 
-        - `Opcode.INPUT.value` -- ввод из буфера входных данных. При исчерпании
-          буфера -- выбрасывается исключение `EOFError`.
+        - `Opcode.INPUT.value` -- ввод из порта ввода. При исчерпании
+          входных данных -- выбрасывается исключение `EOFError`.
 
         В примере ниже имитируется переполнение ячейки при инкременте. Данный
         текст является doctest-ом, корректность которого проверяется во время
@@ -157,21 +259,18 @@ class DataPath:
         }, "internal error, incorrect selector: {}".format(sel)
 
         if sel == Opcode.INC.value:
-            self.data_memory[self.data_address] = self.acc + 1
-            if self.data_memory[self.data_address] == 128:
-                self.data_memory[self.data_address] = -128
+            self.tape[self.data_address] = (self.acc + 1) & 0xFF
         elif sel == Opcode.DEC.value:
-            self.data_memory[self.data_address] = self.acc - 1
-            if self.data_memory[self.data_address] == -129:
-                self.data_memory[self.data_address] = 127
+            self.tape[self.data_address] = (self.acc - 1) & 0xFF
         elif sel == Opcode.INPUT.value:
-            if len(self.input_buffer) == 0:
+            symbol = self.input_port.read()
+            if symbol is None:
                 raise EOFError()
-            symbol = self.input_buffer.pop(0)
             symbol_code = ord(symbol)
             assert -128 <= symbol_code <= 127, "input token is out of bound: {}".format(symbol_code)
-            self.data_memory[self.data_address] = symbol_code
-            logging.debug("input: %s", repr(symbol))
+            self.tape[self.data_address] = symbol_code & 0xFF
+            if self.tracer is not None:
+                self.tracer.io(self, INPUT, symbol)
 
     def signal_output(self):
         """Вывести значение аккумулятора в порт вывода.
@@ -180,8 +279,9 @@ class DataPath:
         ASCII-таблице.
         """
         symbol = chr(self.acc)
-        logging.debug("output: %s << %s", repr("".join(self.output_buffer)), repr(symbol))
-        self.output_buffer.append(symbol)
+        if self.tracer is not None:
+            self.tracer.io(self, OUTPUT, symbol)
+        self.output_port.write(symbol)
 
     def zero(self):
         """Флаг нуля. Необходим для условных переходов."""
@@ -195,6 +295,9 @@ class ControlUnit:
     Согласно варианту, любая инструкция может быть закодирована в одно слово.
     Следовательно, индекс памяти команд эквивалентен номеру инструкции.
 
+    Память команд хранится в предекодированном виде (`isa.DecodedProgram`):
+    код операции и аргумент извлекаются из компактных массивов по индексу.
+
     ```text
     +------------------(+1)-------+
     |                             |
@@ -230,7 +333,7 @@ class ControlUnit:
     """
 
     program = None
-    "Память команд."
+    "Память команд (`isa.DecodedProgram`)."
 
     program_counter = None
     "Счётчик команд. Инициализируется нулём."
@@ -241,12 +344,37 @@ class ControlUnit:
     _tick = None
     "Текущее модельное время процессора (в тактах). Инициализируется нулём."
 
+    tracer = None
+    "Трассировщик (`tracer.Tracer`) или `None`."
+
     def __init__(self, program, data_path):
-        self.program = program
+        self.program = decode_program(program)
         self.program_counter = 0
         self.data_path = data_path
         self._tick = 0
 
+    def attach_tracer(self, tracer):
+        """Подключить трассировщик к блоку управления и тракту данных.
+
+        Сигналы и такты перехватываются (методы экземпляров оборачиваются),
+        только если трассировщик их обрабатывает. Без трассировщика модель
+        работает без каких-либо проверок.
+        """
+        self.tracer = tracer
+        self.data_path.tracer = tracer
+        if _handles(tracer, "signal"):
+            for unit, names in ((self.data_path, DATA_PATH_SIGNALS), (self, CONTROL_UNIT_SIGNALS)):
+                for name in names:
+                    setattr(unit, name, _traced_signal(getattr(unit, name), tracer.signal, name))
+        if _handles(tracer, "tick"):
+            tick = self.tick
+
+            def traced_tick():
+                tick()
+                tracer.tick(self)
+
+            self.tick = traced_tick
+
     def tick(self):
         """Продвинуть модельное время процессора вперёд на один такт."""
         self._tick += 1
@@ -264,27 +392,24 @@ class ControlUnit:
         if sel_next:
             self.program_counter += 1
         else:
-            instr = self.program[self.program_counter]
-            assert "arg" in instr, "internal error"
-            self.program_counter = instr["arg"]
+            arg = self.program.args[self.program_counter]
+            assert arg != NO_ARG, "internal error"
+            self.program_counter = arg
 
-    def decode_and_execute_control_flow_instruction(self, instr, opcode):
+    def decode_and_execute_control_flow_instruction(self, opcode):
         """Декодировать и выполнить инструкцию управления потоком исполнения. В
         случае успеха -- вернуть `True`, чтобы перейти к следующей инструкции.
         """
-        if opcode is Opcode.HALT:
+        if opcode == OP_HALT:
             raise StopIteration()
 
-        if opcode is Opcode.JMP:
-            addr = instr["arg"]
-            self.program_counter = addr
+        if opcode == OP_JMP:
+            self.program_counter = self.program.args[self.program_counter]
             self.tick()
 
             return True
 
-        if opcode is Opcode.JZ:
-            addr = instr["arg"]
-
+        if opcode == OP_JZ:
             self.data_path.signal_latch_acc()
             self.tick()
 
@@ -316,26 +441,25 @@ class ControlUnit:
         Обработка функций управления потоком исполнения вынесена в
         `decode_and_execute_control_flow_instruction`.
         """
-        instr = self.program[self.program_counter]
-        opcode = instr["opcode"]
+        opcode = self.program.opcodes[self.program_counter]
 
-        if self.decode_and_execute_control_flow_instruction(instr, opcode):
+        if self.decode_and_execute_control_flow_instruction(opcode):
             return
 
-        if opcode in {Opcode.RIGHT, Opcode.LEFT}:
-            self.data_path.signal_latch_data_addr(opcode.value)
+        if opcode == OP_RIGHT or opcode == OP_LEFT:
+            self.data_path.signal_latch_data_addr(OPCODES[opcode].value)
             self.signal_latch_program_counter(sel_next=True)
             self.tick()
 
-        elif opcode in {Opcode.INC, Opcode.DEC, Opcode.INPUT}:
+        elif opcode == OP_INC or opcode == OP_DEC or opcode == OP_INPUT:
             self.data_path.signal_latch_acc()
             self.tick()
 
-            self.data_path.signal_wr(opcode.value)
+            self.data_path.signal_wr(OPCODES[opcode].value)
             self.signal_latch_program_counter(sel_next=True)
             self.tick()
 
-        elif opcode is Opcode.PRINT:
+        elif opcode == OP_PRINT:
             self.data_path.signal_latch_acc()
             self.tick()
 
@@ -345,7 +469,8 @@ class ControlUnit:
 
     def __repr__(self):
         """Вернуть строковое представление состояния процессора."""
-        state_repr = "TICK: {:3} PC: {:3} ADDR: {:3} MEM_OUT: {} ACC: {}".format(
+        return state_repr(
+            self.program,
             self._tick,
             self.program_counter,
             self.data_path.data_address,
@@ -353,23 +478,129 @@ class ControlUnit:
             self.data_path.acc,
         )
 
-        instr = self.program[self.program_counter]
-        opcode = instr["opcode"]
-        instr_repr = str(opcode)
 
-        if "arg" in instr:
-            instr_repr += " {}".format(instr["arg"])
+DATA_PATH_SIGNALS = ("signal_latch_data_addr", "signal_latch_acc", "signal_wr", "signal_output")
+"Сигналы `DataPath`, передаваемые трассировщику."
+
+CONTROL_UNIT_SIGNALS = ("signal_latch_program_counter",)
+"Сигналы `ControlUnit`, передаваемые трассировщику."
+
+
+def _handles(tracer, event):
+    """Переопределяет ли трассировщик обработчик события `event`."""
+    handler = getattr(tracer, event)
+    return getattr(handler, "__func__", handler) is not getattr(Tracer, event)
+
+
+def _traced_signal(method, hook, name):
+    """Обернуть сигнал `method` так, чтобы перед ним вызывался `hook(name)`."""
+
+    def traced(*args, **kwargs):
+        hook(name)
+        return method(*args, **kwargs)
+
+    return traced
+
 
-        if "term" in instr:
-            term = instr["term"]
-            instr_repr += "  ('{}'@{}:{})".format(term.symbol, term.line, term.pos)
+ENGINES = {
+    "fast": interpreter.run,
+    "compiled": compiler.run,
+}
+"Быстрые движки моделирования (в дополнение к потактовому `signal`)."
 
-        return "{} \t{}".format(state_repr, instr_repr)
 
+def run_signal(control_unit, instr_counter, limit):
+    """Потактовое исполнение инструкций `ControlUnit` до `limit` инструкций (с
+    тем же интерфейсом, что у быстрых движков). Вернуть счётчик инструкций и
+    причину остановки (`interpreter.HALT`, `EOF` или `LIMIT`).
 
-def simulation(code, input_tokens, data_memory_size, limit):
+    Если подключён трассировщик, обрабатывающий границы инструкций, он
+    вызывается после каждой инструкции.
+    """
+    tracer = control_unit.tracer
+    if tracer is not None and not _handles(tracer, "instruction"):
+        tracer = None
+    try:
+        # Без трассировщика -- цикл без каких-либо обращений к нему.
+        if tracer is None:
+            while instr_counter < limit:
+                control_unit.decode_and_execute_instruction()
+                instr_counter += 1
+        else:
+            while instr_counter < limit:
+                control_unit.decode_and_execute_instruction()
+                instr_counter += 1
+                tracer.instruction(control_unit)
+    except EOFError:
+        return instr_counter, interpreter.EOF
+    except StopIteration:
+        return instr_counter, interpreter.HALT
+    return instr_counter, interpreter.LIMIT
+
+
+def simulation(
+    code,
+    input_tokens,
+    data_memory_size,
+    limit,
+    engine="signal",
+    output_port=None,
+    tracer=None,
+    restore=None,
+    checkpoint_file=None,
+    checkpoint_every=None,
+    precompute_prefix=False,
+    page_size=None,
+    loop_check_every=None,
+):
     """Подготовка модели и запуск симуляции процессора.
 
+    `code` -- машинный код в виде списка инструкций или `isa.DecodedProgram`.
+
+    `input_tokens` -- список символов ввода либо `ports.InputPort` (потоковый
+    ввод). `output_port` -- `ports.OutputPort`; если у порта задан приёмник,
+    вывод пишется в него по мере работы, а возвращается только несброшенный
+    остаток (после `flush` -- пустая строка).
+
+    `engine` -- способ исполнения:
+
+    - `"signal"` -- потактовая модель `ControlUnit` (эталон, с журналом состояний);
+    - `"fast"` -- быстрый интерпретатор `interpreter.run` с тем же результатом;
+    - `"compiled"` -- код, скомпилированный в функцию Python (`compiler.run`).
+
+    `tracer` -- трассировщик (`tracer.Tracer`). По умолчанию, если включён
+    уровень журнала `DEBUG` и движок `signal`, -- `tracer.TextTracer`, иначе
+    трассировка отключена. Быстрые движки не исполняют инструкции по одной и сообщают
+    трассировщику только об остановке (`halt`), поэтому с трассировщиком,
+    которому нужны границы инструкций (`needs_instructions`: журнал, двоичная
+    трасса, регистраторы, `profiler.Profiler`), они не запускаются. При ошибке модели
+    трассировщик получает `halt` с причиной `interpreter.ERROR`, после чего
+    исключение передаётся дальше.
+
+    Контрольные точки (см. `checkpoint`):
+
+    - `restore` -- продолжить моделирование с контрольной точки (имя файла или
+      словарь состояния). Ввод передаётся тот же, что и в прерванном запуске,
+      `limit` -- по-прежнему общее количество инструкций;
+    - `checkpoint_file` -- куда записать состояние при остановке (например, по
+      лимиту, чтобы затем продолжить с большим `limit`);
+    - `checkpoint_every` -- дополнительно записывать состояние каждые
+      `checkpoint_every` инструкций (моделирование выполняется порциями).
+
+    `precompute_prefix` -- начинать не с нуля, а с кэшированного состояния
+    перед первым чтением ввода (см. `prefix`). Начало программы в этом случае
+    не исполняется и не трассируется, результат -- тот же.
+
+    `page_size` -- страничная память данных (см. `DataPath`): страницы
+    выделяются по мере продвижения головки, `data_memory_size` -- предел роста
+    (`None` -- без предела). По окончании в журнал пишется количество
+    выделенных страниц и максимальный адрес головки.
+
+    `loop_check_every` -- каждые `loop_check_every` инструкций проверять, не
+    зациклилась ли программа (см. `loopcheck`): если состояние без ввода и
+    вывода повторилось, моделирование останавливается с причиной
+    `interpreter.LOOP`.
+
     Длительность моделирования ограничена:
 
     - количеством выполненных инструкций (`limit`);
@@ -377,46 +608,91 @@ def simulation(code, input_tokens, data_memory_size, limit):
     - количеством данных ввода (`input_tokens`, если ввод используется), через
       исключение `EOFError`;
 
-    - инструкцией `Halt`, через исключение `StopIteration`.
+    - инструкцией `Halt`, через исключение `StopIteration`;
+
+    - повторением состояния, если задан `loop_check_every`.
     """
-    data_path = DataPath(data_memory_size, input_tokens)
+    data_path = DataPath(data_memory_size, input_tokens, output_port, page_size)
     control_unit = ControlUnit(code, data_path)
     instr_counter = 0
-
-    logging.debug("%s", control_unit)
+    if restore is None and precompute_prefix:
+        restore = prefix.snapshot(control_unit.program, data_memory_size, limit, page_size=page_size)
+    if restore is not None:
+        if isinstance(restore, str):
+            restore = checkpoint.read(restore)
+        instr_counter = checkpoint.restore(restore, control_unit)
+
+    if tracer is None and engine == "signal" and logging.getLogger().isEnabledFor(logging.DEBUG):
+        tracer = TextTracer()
+    if tracer is not None:
+        control_unit.attach_tracer(tracer)
+
+    if engine in ENGINES:
+        assert not getattr(tracer, "needs_instructions", False), "{} requires the signal engine, not {}".format(
+            type(tracer).__name__, engine
+        )
+        run = ENGINES[engine]
+    else:
+        assert engine == "signal", "unknown engine: {}".format(engine)
+        run = run_signal
+        if tracer is not None:
+            tracer.instruction(control_unit)
+
+    reason = interpreter.LIMIT
+    checkpoint_at = instr_counter + (checkpoint_every or limit)
+    loop_check_at = instr_counter + (loop_check_every or limit)
+    detector = loopcheck.LoopDetector()
     try:
-        while instr_counter < limit:
-            control_unit.decode_and_execute_instruction()
-            instr_counter += 1
-            logging.debug("%s", control_unit)
-    except EOFError:
+        while reason == interpreter.LIMIT and instr_counter < limit:
+            instr_counter, reason = run(control_unit, instr_counter, min(limit, checkpoint_at, loop_check_at))
+            if reason != interpreter.LIMIT or instr_counter >= limit:
+                break
+            if instr_counter == checkpoint_at:
+                checkpoint_at += checkpoint_every
+                if checkpoint_file is not None:
+                    checkpoint.write(checkpoint_file, checkpoint.save(control_unit, instr_counter))
+            if instr_counter == loop_check_at:
+                loop_check_at += loop_check_every
+                if detector.check(control_unit):
+                    reason = interpreter.LOOP
+    except BaseException:
+        # Трассировщик должен сохранить историю и при аварийной остановке.
+        if tracer is not None:
+            tracer.halt(control_unit, interpreter.ERROR)
+        raise
+    if checkpoint_file is not None:
+        checkpoint.write(checkpoint_file, checkpoint.save(control_unit, instr_counter))
+
+    if reason == interpreter.EOF:
         logging.warning("Input buffer is empty!")
-    except StopIteration:
-        pass
-
+    if reason == interpreter.LOOP:
+        logging.warning("Infinite loop detected!")
+    if tracer is not None:
+        tracer.halt(control_unit, reason)
     if instr_counter >= limit:
         logging.warning("Limit exceeded!")
-    logging.info("output_buffer: %s", repr("".join(data_path.output_buffer)))
-    return "".join(data_path.output_buffer), instr_counter, control_unit.current_tick()
+    if page_size is not None:
+        logging.info("pages touched: %d peak address: %d", data_path.pages_touched, data_path.peak_address)
+    data_path.output_port.flush()
+    logging.info("output_buffer: %s", repr(data_path.output_port.getvalue()))
+    return data_path.output_port.getvalue(), instr_counter, control_unit.current_tick()
 
 
-def main(code_file, input_file):
+def main(code_file, input_file, page_size=None, memory_limit=None):
     """Функция запуска модели процессора. Параметры -- имена файлов с машинным
     кодом и с входными данными для симуляции.
+
+    Если задан `page_size`, память данных страничная с пределом роста
+    `memory_limit` (по умолчанию -- без предела), иначе -- 100 ячеек.
     """
-    code = read_code(code_file)
-    with open(input_file, encoding="utf-8") as file:
-        input_text = file.read()
-        input_token = []
-        for char in input_text:
-            input_token.append(char)
-
-    output, instr_counter, ticks = simulation(
-        code,
-        input_tokens=input_token,
-        data_memory_size=100,
-        limit=1000,
-    )
+    with read_program(code_file) as code, open(input_file, encoding="utf-8") as file:
+        output, instr_counter, ticks = simulation(
+            code,
+            input_tokens=InputPort(file),
+            data_memory_size=100 if page_size is None else memory_limit,
+            limit=1000,
+            page_size=page_size,
+        )
 
     print("".join(output))
     print("instr_counter: ", instr_counter, "ticks:", ticks)
@@ -424,6 +700,7 @@ def main(code_file, input_file):
 
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.DEBUG)
-    assert len(sys.argv) == 3, "Wrong arguments: machine.py <code_file> <input_file>"
-    _, code_file, input_file = sys.argv
-    main(code_file, input_file)
+    assert 3 <= len(sys.argv) <= 5, (
+        "Wrong arguments: machine.py <code_file> <input_file> [<page_size> [<memory_limit>]]"
+    )
+    main(*sys.argv[1:3], *map(int, sys.argv[3:]))
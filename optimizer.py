@@ -0,0 +1,159 @@
+"""Оптимизатор машинного кода (peephole).
+
+Необязательный этап между трансляцией и записью машинного кода
+(`translator.main`, `translator_asm.main` с ключом `-O`). Проходы повторяются,
+пока код меняется:
+
+1. Протягивание переходов (jump threading): `jmp` на `jmp` ведёт сразу в
+   конец цепочки; `jz` -- через `jmp` и `jz` (значение текущей ячейки при
+   переходе не меняется, поэтому `jz` на `jz` тоже перейдёт).
+2. Удаление переходов на следующую инструкцию.
+3. Удаление недостижимого кода (после `halt`, `jmp` и т.п.).
+4. Сокращение соседних пар `increment`/`decrement` и `left`/`right`, если
+   на вторую инструкцию пары нет переходов. Выход за границу памяти внутри
+   такой пары при этом не обнаруживается.
+
+После каждого прохода аргументы переходов пересчитываются: адрес удалённой
+инструкции переходит к следующей оставшейся (`index` в JSON -- адрес
+инструкции, см. `isa.DecodedProgram.to_code`). Отладочная информация (`Term`)
+переносится без изменений.
+
+Экономия (`isa.Savings`): `instr` -- на сколько инструкций меньше код, `ticks`
+-- сколько тактов экономится при однократном исполнении каждого изменённого
+места (пропущенный протягиванием переход -- его такты, удалённый недостижимый
+код -- 0).
+"""
+
+from array import array
+
+from isa import (
+    OP_DEC,
+    OP_HALT,
+    OP_INC,
+    OP_JMP,
+    OP_JZ,
+    OP_LEFT,
+    OP_RIGHT,
+    TICKS,
+    DecodedProgram,
+    LazyTerms,
+    Savings,
+    decode_program,
+)
+
+OPPOSITE = {OP_INC: OP_DEC, OP_DEC: OP_INC, OP_LEFT: OP_RIGHT, OP_RIGHT: OP_LEFT}
+"Взаимно уничтожающиеся инструкции."
+
+
+def _thread(opcodes, args):
+    """Протянуть переходы. Вернуть сэкономленные такты."""
+    ticks = 0
+    for pc, opcode in enumerate(opcodes):
+        if opcode != OP_JMP and opcode != OP_JZ:
+            continue
+        target = args[pc]
+        seen = {pc}
+        hops = 0
+        while target < len(opcodes) and target not in seen:
+            if opcodes[target] != OP_JMP and not (opcode == OP_JZ and opcodes[target] == OP_JZ):
+                break
+            seen.add(target)
+            hops += TICKS[opcodes[target]]
+            target = args[target]
+        if target in seen:  # бесконечный цикл из переходов -- оставляем как есть
+            continue
+        args[pc] = target
+        ticks += hops
+    return ticks
+
+
+def _jumps_to_next(opcodes, args):
+    return [opcode in (OP_JMP, OP_JZ) and args[pc] == pc + 1 for pc, opcode in enumerate(opcodes)]
+
+
+def _unreachable(opcodes, args):
+    reached = [False] * len(opcodes)
+    stack = [0]
+    while stack:
+        pc = stack.pop()
+        if pc >= len(opcodes) or reached[pc]:
+            continue
+        reached[pc] = True
+        opcode = opcodes[pc]
+        if opcode == OP_JMP:
+            stack.append(args[pc])
+        elif opcode != OP_HALT:
+            stack.append(pc + 1)
+            if opcode == OP_JZ:
+                stack.append(args[pc])
+    return [not flag for flag in reached]
+
+
+def _pairs(opcodes, args):
+    targets = {args[pc] for pc, opcode in enumerate(opcodes) if opcode in (OP_JMP, OP_JZ)}
+    removed = [False] * len(opcodes)
+    kept = []
+    floor = 0  # инструкции стека ниже `floor` отделены от текущей целью перехода
+    for pc, opcode in enumerate(opcodes):
+        if pc in targets:
+            floor = len(kept)
+        elif len(kept) > floor and opcodes[kept[-1]] == OPPOSITE.get(opcode):
+            removed[kept.pop()] = removed[pc] = True
+            continue
+        kept.append(pc)
+    return removed
+
+
+def _remove(opcodes, args, origins, removed):
+    """Удалить отмеченные инструкции и пересчитать адреса переходов."""
+    relocation = []
+    count = 0
+    for flag in removed:
+        relocation.append(count)
+        count += not flag
+    relocation.append(count)
+
+    kept = [pc for pc, flag in enumerate(removed) if not flag]
+    new_args = []
+    for pc in kept:
+        arg = args[pc]
+        if opcodes[pc] in (OP_JMP, OP_JZ):
+            arg = relocation[arg] if arg <= len(opcodes) else arg
+        new_args.append(arg)
+    return [opcodes[pc] for pc in kept], new_args, [origins[pc] for pc in kept]
+
+
+def optimize(code):
+    """Оптимизировать машинный код (список инструкций или `DecodedProgram`).
+    Вернуть `DecodedProgram` и экономию (`isa.Savings`).
+
+    >>> from isa import Opcode
+    >>> code = [{"opcode": Opcode.INPUT}, {"opcode": Opcode.JZ, "arg": 5}, {"opcode": Opcode.RIGHT},
+    ...         {"opcode": Opcode.LEFT}, {"opcode": Opcode.JMP, "arg": 7}, {"opcode": Opcode.JMP, "arg": 0},
+    ...         {"opcode": Opcode.PRINT}, {"opcode": Opcode.HALT}]
+    >>> program, saved = optimize(code)
+    >>> [(str(instr["opcode"]), instr.get("arg")) for instr in program.to_code()], saved
+    ([('input', None), ('jz', 0), ('halt', None)], Savings(instr=5, ticks=4))
+    """
+    program = decode_program(code)
+    opcodes = list(program.opcodes)
+    args = list(program.args)
+    origins = list(range(len(opcodes)))
+    ticks = 0
+
+    while True:
+        size = len(opcodes)
+        ticks += _thread(opcodes, args)
+        removed = _jumps_to_next(opcodes, args)
+        ticks += sum(TICKS[opcode] for opcode, flag in zip(opcodes, removed) if flag)
+        opcodes, args, origins = _remove(opcodes, args, origins, removed)
+        opcodes, args, origins = _remove(opcodes, args, origins, _unreachable(opcodes, args))
+        removed = _pairs(opcodes, args)
+        ticks += sum(TICKS[opcode] for opcode, flag in zip(opcodes, removed) if flag)
+        opcodes, args, origins = _remove(opcodes, args, origins, removed)
+        if len(opcodes) == size:
+            break
+
+    source_terms = program.terms
+    terms = LazyTerms(len(origins), lambda pc: source_terms[origins[pc]])
+    return DecodedProgram(array("B", opcodes), array("i", args), terms), Savings(len(program) - len(opcodes), ticks)
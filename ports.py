@@ -0,0 +1,129 @@
+"""Порты ввода-вывода модели процессора.
+
+- `InputPort` -- лениво читает символы из файла или итератора порциями, не
+  загружая весь ввод в память. Чтение символа -- O(1).
+
+- `OutputPort` -- накапливает выводимые символы и сбрасывает их в приёмник
+  (`sink`, например, файл) порциями. Если приёмник не задан, весь вывод
+  хранится в памяти и доступен через `getvalue`.
+
+`machine.simulation` принимает порты вместо списков символов.
+"""
+
+
+class InputPort:
+    """Порт ввода.
+
+    Источник (`source`) -- файловый объект (читается методом `read` порциями по
+    `chunk_size` символов) либо итерируемый объект строк (например, список
+    символов или генератор строк).
+
+    >>> port = InputPort(iter(["ab", "", "c"]))
+    >>> port.read(), port.read(), port.read(), port.read(), port.position
+    ('a', 'b', 'c', None, 3)
+    """
+
+    position = None
+    "Количество прочитанных символов."
+
+    def __init__(self, source, chunk_size=65536):
+        if hasattr(source, "read"):
+            self._chunks = iter(lambda: source.read(chunk_size), "")
+        else:
+            self._chunks = iter(source)
+        self._buffer = ""
+        self._index = 0
+        self.position = 0
+
+    def read(self):
+        """Прочитать следующий символ. При исчерпании ввода -- вернуть `None`."""
+        while self._index >= len(self._buffer):
+            self._buffer = next(self._chunks, None)
+            self._index = 0
+            if self._buffer is None:
+                self._buffer = ""
+                return None
+        symbol = self._buffer[self._index]
+        self._index += 1
+        self.position += 1
+        return symbol
+
+
+class OutputPort:
+    """Порт вывода.
+
+    Если задан приёмник `sink` (объект с методом `write`), символы сбрасываются
+    в него порциями по `buffer_size` и при вызове `flush`; в памяти вывод не
+    хранится. Иначе весь вывод хранится в памяти.
+
+    >>> port = OutputPort()
+    >>> port.write("h"); port.write("i")
+    >>> port.getvalue(), port.count
+    ('hi', 2)
+    """
+
+    def __init__(self, sink=None, buffer_size=4096):
+        self.sink = sink
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._flushed = 0
+        if sink is None:
+            # Без приёмника запись -- просто добавление в список.
+            self.write = self._buffer.append
+
+    @property
+    def count(self):
+        """Количество выведенных символов."""
+        return self._flushed + len(self._buffer)
+
+    def write(self, symbol):
+        """Вывести символ."""
+        self._buffer.append(symbol)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Сбросить накопленные символы в приёмник (если он задан)."""
+        if self.sink is not None and self._buffer:
+            self.sink.write("".join(self._buffer))
+            self._flushed += len(self._buffer)
+            self._buffer.clear()
+
+    def getvalue(self):
+        """Вывод, хранящийся в памяти (при записи в приёмник -- ещё не сброшенный)."""
+        return "".join(self._buffer)
+
+    def lazy_value(self):
+        """Текущий вывод для журнала: `repr` строки вычисляется только при
+        форматировании сообщения, а не при каждом вызове `logging.debug`.
+
+        >>> port = OutputPort()
+        >>> port.write("a"); value = port.lazy_value(); port.write("b")
+        >>> "%s" % value
+        "'a'"
+        """
+        return _LazyValue(self._buffer, len(self._buffer))
+
+
+class _LazyValue:
+    """Отложенное представление первых `length` символов буфера вывода."""
+
+    __slots__ = ("_buffer", "_length")
+
+    def __init__(self, buffer, length):
+        self._buffer = buffer
+        self._length = length
+
+    def __str__(self):
+        return repr("".join(self._buffer[: self._length]))
+
+
+def as_input_port(tokens):
+    """Привести входные данные к `InputPort`: порт возвращается как есть, а
+    список символов или строка оборачиваются в порт.
+    """
+    if isinstance(tokens, InputPort):
+        return tokens
+    if isinstance(tokens, str):
+        return InputPort([tokens])
+    return InputPort(tokens)
@@ -0,0 +1,72 @@
+"""Предвычисление не зависящего от ввода начала программы.
+
+Всё, что программа делает до первой инструкции `input`, не зависит от входных
+данных. Поэтому это начало (префикс) можно выполнить один раз, сохранить
+состояние модели (в формате `checkpoint`, со счётчиками инструкций и тактов и
+уже выведенными символами) и продолжать с него каждый запуск с новым вводом.
+
+Префикс вычисляется на копии программы, в которой `input` заменены на `halt`:
+модель останавливается точно перед первым чтением ввода, не расходуя на него
+тактов. Затем состояние сохраняется для исходной программы.
+
+Снимки кэшируются в памяти процесса по ключу (хэш программы, размер памяти
+данных, размер страницы) и, если задан `cache_dir`, в файлах JSON.
+"""
+
+import os
+from array import array
+
+import checkpoint
+import interpreter
+import machine
+from isa import OP_HALT, OP_INPUT, DecodedProgram, decode_program
+
+_snapshots = {}
+"""Кэш снимков: (хэш программы, размер памяти данных, размер страницы) ->
+состояние `checkpoint` и причина остановки (`reason`)."""
+
+
+def _without_input(program):
+    """Копия программы, в которой `input` заменены на `halt`."""
+    opcodes = array("B", program.opcodes)
+    for pc, opcode in enumerate(opcodes):
+        if opcode == OP_INPUT:
+            opcodes[pc] = OP_HALT
+    return DecodedProgram(opcodes, program.args, program.terms)
+
+
+def _compute(program, data_memory_size, limit, page_size):
+    data_path = machine.DataPath(data_memory_size, [], page_size=page_size)
+    control_unit = machine.ControlUnit(_without_input(program), data_path)
+    instr_counter, reason = interpreter.run(control_unit, 0, limit)
+    control_unit.program = program
+    return checkpoint.save(control_unit, instr_counter), reason
+
+
+def snapshot(code, data_memory_size, limit, cache_dir=None, page_size=None):
+    """Состояние модели перед первым чтением ввода (словарь `checkpoint`).
+
+    Если до ввода программа останавливается (`halt`) -- это её конечное
+    состояние; если превышен `limit` -- состояние на лимите. Снимок, сделанный
+    по лимиту, пересчитывается при запросе с большим `limit`; снимок с большим
+    числом инструкций, чем `limit`, не используется (возвращается `None`).
+    """
+    program = decode_program(code)
+    key = (checkpoint.program_hash(program), data_memory_size, page_size)
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, "prefix_{}_{}_{}.json".format(*key))
+
+    entry = _snapshots.get(key)
+    if entry is None and path is not None and os.path.exists(path):
+        entry = _snapshots[key] = checkpoint.read(path)
+    if entry is None or (entry["reason"] == interpreter.LIMIT and entry["instr_counter"] < limit):
+        state, reason = _compute(program, data_memory_size, limit, page_size)
+        entry = _snapshots[key] = dict(state, reason=reason)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            checkpoint.write(path, entry)
+
+    if entry["instr_counter"] > limit:
+        return None
+    return entry
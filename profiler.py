@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+"""Профилирование исполнения машинного кода по адресам инструкций.
+
+`Profiler` -- трассировщик (`tracer.Tracer`) для `machine.simulation`: на
+каждой границе инструкций он добавляет исполнение и такты к счётчикам
+завершившейся инструкции. Счётчики -- массивы `array("Q")` по одному элементу
+на инструкцию, выделяются один раз при первом событии; сигналы и такты не
+перехватываются, поэтому на инструкцию приходится один вызов обработчика.
+
+Сумма `counts` -- `instr_counter` моделирования, сумма `ticks` -- такты
+(такты незавершённой инструкции, например `input` на конце ввода, относятся
+к ней без исполнения). Если моделирование продолжено с контрольной точки или
+с префикса, учитывается только исполненная часть. Исполнение по инструкциям
+видно только потактовому движку `signal`: быстрые движки сообщают
+трассировщику лишь об остановке, поэтому `machine.simulation` не запускает их
+с профилировщиком (`needs_instructions`).
+
+Счётчики сводятся по базовым блокам и естественным циклам (`wcet.basic_blocks`,
+`wcet.loops`) и по строкам исходного кода (`Term` инструкции): `report` --
+текстовый отчёт о самых горячих местах, `dump` -- то же для JSON.
+
+Запуск: `profiler.py <code_file> <input_file> [<json_file>]`.
+"""
+
+import json
+import sys
+from array import array
+from collections import namedtuple
+
+import machine
+import wcet
+from isa import read_program
+from ports import InputPort
+from tracer import Tracer
+
+
+class BlockProfile(namedtuple("BlockProfile", "start end count instr ticks")):
+    """Профиль базового блока: инструкции `[start, end)`, количество входов в
+    блок, исполненные в нём инструкции и такты.
+    """
+
+    __slots__ = ()
+
+
+class LoopProfile(namedtuple("LoopProfile", "header end blocks count instr ticks")):
+    """Профиль цикла: адрес заголовка, адрес после последней инструкции тела,
+    адреса блоков тела, количество исполнений заголовка, исполненные в теле
+    инструкции и такты (с вложенными циклами).
+    """
+
+    __slots__ = ()
+
+
+class LineProfile(namedtuple("LineProfile", "line instr ticks")):
+    """Профиль строки исходного кода: исполненные инструкции и такты."""
+
+    __slots__ = ()
+
+
+class Profiler(Tracer):
+    """Счётчики исполнений и тактов по адресам инструкций.
+
+    Один профилировщик можно использовать для нескольких запусков одной
+    программы: счётчики накапливаются.
+    """
+
+    program = None
+    "Профилируемая программа (`isa.DecodedProgram`)."
+
+    counts = None
+    "Количество исполнений каждой инструкции."
+
+    ticks = None
+    "Такты каждой инструкции."
+
+    needs_instructions = True
+
+    def __init__(self):
+        self._pc = None
+        self._tick = 0
+
+    def instruction(self, control_unit):
+        tick = control_unit.current_tick()
+        pc = self._pc
+        if pc is None:
+            self._start(control_unit.program)
+        else:
+            self.counts[pc] += 1
+            self.ticks[pc] += tick - self._tick
+        self._pc = control_unit.program_counter
+        self._tick = tick
+
+    def halt(self, control_unit, reason):
+        # Счётчики нужны и после запуска без единой границы инструкций.
+        self._start(control_unit.program)
+        if self._pc is not None:
+            self.ticks[self._pc] += control_unit.current_tick() - self._tick
+            self._pc = None
+
+    def _start(self, program):
+        if self.program is None:
+            self.program = program
+            self.counts = array("Q", bytes(8 * len(program)))
+            self.ticks = array("Q", bytes(8 * len(program)))
+        assert len(program) == len(self.counts), "profiler is bound to another program"
+
+    def blocks(self):
+        """Профили базовых блоков в порядке адресов."""
+        return [
+            BlockProfile(
+                block.start,
+                block.end,
+                self.counts[block.start],
+                sum(self.counts[block.start : block.end]),
+                sum(self.ticks[block.start : block.end]),
+            )
+            for block in wcet.basic_blocks(self.program)
+        ]
+
+    def loops(self):
+        """Профили циклов, от вложенных к внешним."""
+        blocks = wcet.basic_blocks(self.program)
+        profiles = self.blocks()
+        result = []
+        for loop in wcet.loops(blocks):
+            body = sorted(loop.body)
+            result.append(
+                LoopProfile(
+                    blocks[loop.header].start,
+                    max(blocks[number].end for number in body),
+                    [blocks[number].start for number in body],
+                    profiles[loop.header].count,
+                    sum(profiles[number].instr for number in body),
+                    sum(profiles[number].ticks for number in body),
+                )
+            )
+        return result
+
+    def lines(self):
+        """Профили строк исходного кода в порядке строк. Инструкции без `Term`
+        не учитываются.
+        """
+        lines = {}
+        for term, count, ticks in zip(self.program.terms, self.counts, self.ticks):
+            if term is not None and count + ticks > 0:
+                instr, total = lines.get(term.line, (0, 0))
+                lines[term.line] = (instr + count, total + ticks)
+        return [LineProfile(line, instr, ticks) for line, (instr, ticks) in sorted(lines.items())]
+
+    def source(self, start, end):
+        """Место инструкций `[start, end)` в исходном коде: `строка:позиция` первой
+        и последней инструкции с `Term` (или пустая строка).
+        """
+        terms = [self.program.terms[pc] for pc in range(start, end) if self.program.terms[pc] is not None]
+        if not terms:
+            return ""
+        first, last = terms[0], terms[-1]
+        if first == last:
+            return "{}:{}".format(first.line, first.pos)
+        return "{}:{}-{}:{}".format(first.line, first.pos, last.line, last.pos)
+
+
+def _hot(profiles):
+    """Исполнявшиеся профили, от самых затратных по тактам."""
+    return sorted((profile for profile in profiles if profile.instr), key=lambda profile: -profile.ticks)
+
+
+def _share(ticks, total):
+    return "{:.1f}%".format(100 * ticks / total if total else 0)
+
+
+def report(profiler, top=10):
+    """Текстовый отчёт: итоги и до `top` самых затратных по тактам блоков,
+    циклов и строк исходного кода.
+    """
+    total = sum(profiler.ticks)
+    result = ["instr: {} ticks: {}".format(sum(profiler.counts), total)]
+    for block in _hot(profiler.blocks())[:top]:
+        result.append(
+            "block {}-{} count: {} instr: {} ticks: {} ({}) at {}".format(
+                block.start,
+                block.end - 1,
+                block.count,
+                block.instr,
+                block.ticks,
+                _share(block.ticks, total),
+                profiler.source(block.start, block.end),
+            )
+        )
+    for loop in _hot(profiler.loops())[:top]:
+        result.append(
+            "loop {} blocks: {} count: {} instr: {} ticks: {} ({}) at {}".format(
+                loop.header,
+                len(loop.blocks),
+                loop.count,
+                loop.instr,
+                loop.ticks,
+                _share(loop.ticks, total),
+                profiler.source(loop.header, loop.end),
+            )
+        )
+    for line in _hot(profiler.lines())[:top]:
+        share = _share(line.ticks, total)
+        result.append("line {} instr: {} ticks: {} ({})".format(line.line, line.instr, line.ticks, share))
+    return result
+
+
+def dump(profiler):
+    """Профиль в виде словаря для JSON: счётчики инструкций (с `Term`) в
+    порядке адресов, блоки, циклы и строки -- от самых затратных по тактам.
+    """
+    program = profiler.program
+    return {
+        "instr": sum(profiler.counts),
+        "ticks": sum(profiler.ticks),
+        "instructions": [
+            {"index": pc, "opcode": program.opcode(pc), "count": count, "ticks": ticks, "term": program.terms[pc]}
+            for pc, (count, ticks) in enumerate(zip(profiler.counts, profiler.ticks))
+        ],
+        "blocks": [
+            dict(block._asdict(), source=profiler.source(block.start, block.end)) for block in _hot(profiler.blocks())
+        ],
+        "loops": [loop._asdict() for loop in _hot(profiler.loops())],
+        "lines": [line._asdict() for line in _hot(profiler.lines())],
+    }
+
+
+def main(code_file, input_file, json_file=None):
+    """Исполнить программу с профилировщиком, напечатать вывод и отчёт;
+    если задан `json_file` -- записать в него профиль.
+    """
+    profiler = Profiler()
+    with read_program(code_file) as code:
+        with open(input_file, encoding="utf-8") as file:
+            output, _, _ = machine.simulation(
+                code, input_tokens=InputPort(file), data_memory_size=100, limit=1000000, tracer=profiler
+            )
+
+        print("".join(output))
+        print("\n".join(report(profiler)))
+        if json_file is not None:
+            with open(json_file, "w", encoding="utf-8") as file:
+                json.dump(dump(profiler), file, indent=1)
+
+
+if __name__ == "__main__":
+    assert 3 <= len(sys.argv) <= 4, "Wrong arguments: profiler.py <code_file> <input_file> [<json_file>]"
+    main(*sys.argv[1:])
@@ -0,0 +1,225 @@
+"""Файл трассы исполнения с индексом и сжатыми порциями.
+
+Трасса пишется трассировщиком `TraceWriter` (см. `tracer`) и содержит запись
+`tracer.RECORD` для каждой границы инструкций. Записи группируются в порции
+(chunk) по `keyframe_interval` инструкций; каждая порция сжимается `zlib` и
+начинается с опорного кадра (keyframe) -- полного содержимого памяти данных на
+её первой инструкции (для страничной памяти -- выделенных к этому моменту
+страниц, поэтому длина кадра у порций разная). Регистры (такт, PC, адрес, аккумулятор) есть в каждой
+записи.
+
+Формат файла:
+
+- заголовок `HEADER`: сигнатура, размер памяти данных (0 -- страничная
+  память без предела роста), интервал опорных кадров;
+- порции: заголовок `CHUNK` (такт и номер первой инструкции, количество
+  записей, длина опорного кадра, длина сжатых данных) и сжатые данные
+  (память + записи);
+- индекс: по записи `INDEX_ENTRY` на порцию (такт и номер первой инструкции,
+  смещение порции в файле, количество записей);
+- окончание `FOOTER`: смещение индекса и сигнатура.
+
+Индекс и окончание пишутся при остановке моделирования (`halt`, в том числе
+из-за ошибки модели) или явном `close`; `flush` записывает начатую порцию, не
+закрывая файл. Если файл оборван (например, процесс завершён), `TraceFile`
+восстанавливает индекс, просматривая заголовки порций.
+
+Чтобы получить состояние на такте T, достаточно найти порцию по индексу,
+распаковать только её и применить записи от опорного кадра до T: запись
+содержит значение текущей ячейки, а за инструкцию меняется только она.
+"""
+
+import bisect
+import mmap
+import struct
+import zlib
+
+from tracer import RECORD, Tracer, state_repr
+
+MAGIC = b"BFTRACE2"
+INDEX_MAGIC = b"BFTRIDX1"
+
+HEADER = struct.Struct("<8sII")
+CHUNK = struct.Struct("<QQIII")
+INDEX_ENTRY = struct.Struct("<QQQI")
+FOOTER = struct.Struct("<Q8s")
+
+
+class TraceWriter(Tracer):
+    """Трассировщик, записывающий полную историю исполнения в файл `path`.
+
+    `keyframe_interval` -- количество инструкций в порции (и период опорных
+    кадров), `level` -- уровень сжатия `zlib`.
+
+    Файл создаётся при первой записи и закрывается при остановке моделирования
+    или `close`; вне `machine.simulation` запись удобно ограничить `with`.
+    Записи нужны границы инструкций, поэтому трасса пишется только потактовым
+    движком `signal` (`needs_instructions`).
+    """
+
+    needs_instructions = True
+
+    def __init__(self, path, keyframe_interval=65536, level=6):
+        assert keyframe_interval > 0, "keyframe interval should be positive"
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self._path = path
+        self._file = None
+        self._closed = False
+        self._index = []
+        self._chunk = bytearray()
+        self._count = 0
+        self._first = None
+        self._instr = 0
+        self._header = False
+
+    def instruction(self, control_unit):
+        data_path = control_unit.data_path
+        if not self._header:
+            self._write_header(data_path.data_memory_size or 0)
+        if self._count == 0:
+            self._first = (control_unit._tick, self._instr, len(data_path.tape))
+            self._chunk += data_path.tape
+        addr = data_path.data_address
+        self._chunk += RECORD.pack(
+            control_unit._tick, control_unit.program_counter, addr, data_path.data_memory[addr], data_path.acc
+        )
+        self._count += 1
+        self._instr += 1
+        if self._count == self.keyframe_interval:
+            self._write_chunk()
+
+    def _write_header(self, memory_size):
+        assert not self._closed, "trace writer is closed"
+        self._file = open(self._path, "wb")
+        self._file.write(HEADER.pack(MAGIC, memory_size, self.keyframe_interval))
+        self._header = True
+
+    def _write_chunk(self):
+        data = zlib.compress(self._chunk, self.level)
+        self._index.append((self._first[0], self._first[1], self._file.tell(), self._count))
+        self._file.write(CHUNK.pack(self._first[0], self._first[1], self._count, self._first[2], len(data)))
+        self._file.write(data)
+        self._chunk = bytearray()
+        self._count = 0
+
+    def halt(self, control_unit, reason):
+        self.close()
+
+    def flush(self):
+        """Записать начатую порцию и сбросить буфер файла: трасса читается
+        `TraceFile` (без индекса), запись продолжается со следующей порции.
+        """
+        if self._closed:
+            return
+        if not self._header:
+            self._write_header(0)
+        if self._count:
+            self._write_chunk()
+        self._file.flush()
+
+    def close(self):
+        """Записать последнюю порцию и индекс, закрыть файл."""
+        if self._closed:
+            return
+        self.flush()
+        index_offset = self._file.tell()
+        for entry in self._index:
+            self._file.write(INDEX_ENTRY.pack(*entry))
+        self._file.write(FOOTER.pack(index_offset, INDEX_MAGIC))
+        self._file.close()
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceFile:
+    """Чтение файла трассы с произвольным доступом по такту.
+
+    - `state_at(tick)` -- состояние на последней границе инструкций с тактом не
+      больше `tick`: `(tick, pc, addr, acc, memory)`, где `memory` -- `bytearray`;
+    - `records(start, end)` -- записи `tracer.RECORD` с тактами в `[start, end)`;
+    - `export(program, start, end)` -- те же записи в виде строк журнала.
+
+    Файл отображается в память (`mmap`), распаковываются только нужные порции.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.memory_size, self.keyframe_interval = HEADER.unpack_from(self._data)
+        assert magic == MAGIC, "not a trace file: {}".format(path)
+        self.index = self._read_index()
+        self._ticks = [entry[0] for entry in self.index]
+
+    def _read_index(self):
+        if len(self._data) >= HEADER.size + FOOTER.size:
+            index_offset, magic = FOOTER.unpack_from(self._data, len(self._data) - FOOTER.size)
+            if magic == INDEX_MAGIC:
+                end = len(self._data) - FOOTER.size
+                return [entry for entry in INDEX_ENTRY.iter_unpack(self._data[index_offset:end])]
+
+        # Индекса нет -- файл оборван: собираем индекс по заголовкам порций.
+        index = []
+        offset = HEADER.size
+        while offset + CHUNK.size <= len(self._data):
+            first_tick, first_instr, count, _, length = CHUNK.unpack_from(self._data, offset)
+            if offset + CHUNK.size + length > len(self._data):
+                break
+            index.append((first_tick, first_instr, offset, count))
+            offset += CHUNK.size + length
+        return index
+
+    def close(self):
+        self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def chunk(self, number):
+        """Распаковать порцию: вернуть `(memory, records)` -- опорный кадр и записи."""
+        offset = self.index[number][2]
+        _, _, _, memory_size, length = CHUNK.unpack_from(self._data, offset)
+        start = offset + CHUNK.size
+        data = zlib.decompress(self._data[start : start + length])
+        return bytearray(data[:memory_size]), data[memory_size:]
+
+    def _find(self, tick):
+        """Номер порции, содержащей такт `tick`."""
+        return max(bisect.bisect_right(self._ticks, tick) - 1, 0)
+
+    def state_at(self, tick):
+        assert self.index, "empty trace"
+        memory, records = self.chunk(self._find(tick))
+        state = None
+        for record in RECORD.iter_unpack(records):
+            if record[0] > tick and state is not None:
+                break
+            if record[2] >= len(memory):  # страничная память выросла внутри порции
+                memory.extend(bytes(record[2] + 1 - len(memory)))
+            memory[record[2]] = record[3] & 0xFF
+            state = record
+        tick, pc, addr, _, acc = state
+        return tick, pc, addr, acc, memory
+
+    def records(self, start=0, end=None):
+        for number in range(self._find(start), len(self.index)):
+            if end is not None and self.index[number][0] >= end:
+                return
+            _, records = self.chunk(number)
+            for record in RECORD.iter_unpack(records):
+                if end is not None and record[0] >= end:
+                    return
+                if record[0] >= start:
+                    yield record
+
+    def export(self, program, start=0, end=None):
+        for tick, pc, addr, value, acc in self.records(start, end):
+            yield state_repr(program, tick, pc, addr, value, acc)
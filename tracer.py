@@ -0,0 +1,269 @@
+"""Трассировка работы модели процессора.
+
+Трассировщик -- объект с обработчиками событий модели (протокол `Tracer`):
+
+- `instruction` -- граница инструкций: состояние перед началом очередной
+  инструкции (в том числе до первой);
+- `signal` -- управляющий сигнал (имя метода `DataPath`/`ControlUnit`);
+- `tick` -- завершение такта;
+- `io` -- ввод или вывод символа;
+- `halt` -- остановка моделирования (`interpreter.HALT`, `EOF`, `LIMIT`,
+  `LOOP` или `ERROR`).
+
+Реализации (приёмники):
+
+- `NullTracer` -- ничего не делает;
+- `TextTracer` -- текстовый журнал через `logging` в прежнем формате (на нём
+  построены golden-тесты);
+- `BinaryTracer` -- компактная двоичная запись событий в поток, читается
+  функцией `read_binary_trace`;
+- `RingRecorder` -- запись фиксированного размера на каждую инструкцию в
+  кольцевой буфер (последние `depth` инструкций) с необязательным сбросом на
+  диск; `render_records` восстанавливает из записей текстовый журнал.
+- `profiler.Profiler` -- счётчики исполнений и тактов по адресам инструкций.
+
+Если трассировщик не подключён, `machine.simulation` использует цикл без
+трассировки, а сигналы и такты не перехватываются, поэтому трассировка ничего
+не стоит. Перехват сигналов и тактов (`ControlUnit.attach_tracer`) включается,
+только если трассировщик переопределяет соответствующие обработчики.
+"""
+
+import logging
+import struct
+
+from isa import NO_ARG
+
+INSTRUCTION, SIGNAL, TICK, INPUT, OUTPUT, HALT, NAME = range(7)
+"Типы записей двоичной трассы."
+
+
+class Tracer:
+    """Протокол трассировщика. Все обработчики по умолчанию пустые."""
+
+    needs_instructions = False
+    "Трассировщик бесполезен без событий `instruction`: с быстрыми движками `machine.simulation` его не запускает."
+
+    def instruction(self, control_unit):
+        """Граница инструкций: `control_unit` перед началом очередной инструкции."""
+
+    def signal(self, name):
+        """Управляющий сигнал `name`."""
+
+    def tick(self, control_unit):
+        """Завершился такт `control_unit.current_tick() - 1`."""
+
+    def io(self, data_path, kind, symbol):
+        """Ввод (`kind == INPUT`) или вывод (`kind == OUTPUT`) символа `symbol`."""
+
+    def halt(self, control_unit, reason):
+        """Моделирование остановлено по причине `reason`."""
+
+
+class NullTracer(Tracer):
+    """Трассировщик, отбрасывающий все события."""
+
+
+class TextTracer(Tracer):
+    """Текстовый журнал: состояние процессора на каждой границе инструкций и
+    операции ввода-вывода, уровень `DEBUG`.
+    """
+
+    needs_instructions = True
+
+    def instruction(self, control_unit):
+        logging.debug("%s", control_unit)
+
+    def io(self, data_path, kind, symbol):
+        if kind == INPUT:
+            logging.debug("input: %s", repr(symbol))
+        else:
+            logging.debug("output: %s << %s", data_path.output_port.lazy_value(), repr(symbol))
+
+
+class BinaryTracer(Tracer):
+    """Двоичная трасса. Каждая запись начинается с байта типа:
+
+    - `INSTRUCTION` -- такт, PC, адрес данных, аккумулятор (`<QIIb`);
+    - `SIGNAL` -- номер имени сигнала (`<H`);
+    - `TICK` -- номер завершённого такта (`<Q`);
+    - `INPUT`/`OUTPUT` -- код символа (`<i`);
+    - `HALT` -- такт и номер имени причины (`<QH`);
+    - `NAME` -- объявление имени: номер, длина, UTF-8 (`<HB` + байты).
+      Записывается перед первым использованием имени.
+
+    `stream` -- двоичный поток с методом `write`. Сигналы и такты пишутся,
+    только если `signals`/`ticks` равны `True`.
+    """
+
+    needs_instructions = True
+
+    def __init__(self, stream, signals=False, ticks=False):
+        self.stream = stream
+        self._names = {}
+        if not signals:
+            self.signal = super().signal
+        if not ticks:
+            self.tick = super().tick
+
+    def _name(self, name):
+        number = self._names.get(name)
+        if number is None:
+            number = self._names[name] = len(self._names)
+            data = name.encode("utf-8")
+            self.stream.write(_HEADERS[NAME].pack(NAME, number, len(data)) + data)
+        return number
+
+    def instruction(self, control_unit):
+        data_path = control_unit.data_path
+        self.stream.write(
+            _HEADERS[INSTRUCTION].pack(
+                INSTRUCTION,
+                control_unit.current_tick(),
+                control_unit.program_counter,
+                data_path.data_address,
+                data_path.acc,
+            )
+        )
+
+    def signal(self, name):
+        self.stream.write(_HEADERS[SIGNAL].pack(SIGNAL, self._name(name)))
+
+    def tick(self, control_unit):
+        self.stream.write(_HEADERS[TICK].pack(TICK, control_unit.current_tick() - 1))
+
+    def io(self, data_path, kind, symbol):
+        self.stream.write(_HEADERS[kind].pack(kind, ord(symbol)))
+
+    def halt(self, control_unit, reason):
+        self.stream.write(_HEADERS[HALT].pack(HALT, control_unit.current_tick(), self._name(reason)))
+
+
+_HEADERS = {
+    INSTRUCTION: struct.Struct("<BQIIb"),
+    SIGNAL: struct.Struct("<BH"),
+    TICK: struct.Struct("<BQ"),
+    INPUT: struct.Struct("<Bi"),
+    OUTPUT: struct.Struct("<Bi"),
+    HALT: struct.Struct("<BQH"),
+    NAME: struct.Struct("<BHB"),
+}
+
+
+def read_binary_trace(data):
+    """Разобрать двоичную трассу (`bytes`) в последовательность кортежей
+    `(тип, поля...)`. Номера имён заменяются самими именами, записи `NAME` не
+    возвращаются.
+
+    >>> import io
+    >>> stream = io.BytesIO()
+    >>> tracer = BinaryTracer(stream, signals=True)
+    >>> tracer.signal("signal_wr"); tracer.signal("signal_wr")
+    >>> list(read_binary_trace(stream.getvalue()))
+    [(1, 'signal_wr'), (1, 'signal_wr')]
+    """
+    names = []
+    offset = 0
+    while offset < len(data):
+        header = _HEADERS[data[offset]]
+        record = header.unpack_from(data, offset)
+        offset += header.size
+        kind = record[0]
+        if kind == NAME:
+            names.append(data[offset : offset + record[2]].decode("utf-8"))
+            offset += record[2]
+        elif kind == SIGNAL:
+            yield SIGNAL, names[record[1]]
+        elif kind == HALT:
+            yield HALT, record[1], names[record[2]]
+        else:
+            yield record
+
+
+RECORD = struct.Struct("<QIIbb")
+"Запись `RingRecorder`: такт, PC, адрес данных, значение ячейки, аккумулятор."
+
+
+class RingRecorder(Tracer):
+    """Регистратор последних инструкций для посмертного анализа.
+
+    На каждой границе инструкций в заранее выделенный кольцевой буфер на
+    `depth` записей упаковывается запись `RECORD`. Если задан `spill` (двоичный
+    поток), то заполненный буфер перед перезаписью сбрасывается в него, а
+    остаток -- при остановке (`halt`) или вызове `flush`; так на диске
+    сохраняется полная трасса.
+
+    >>> recorder = RingRecorder(depth=2)
+    >>> for pc in range(3):
+    ...     recorder._record(pc, pc, 0, 0, 0)
+    >>> [record[1] for record in RECORD.iter_unpack(recorder.records())]
+    [1, 2]
+    """
+
+    depth = None
+    "Глубина буфера (количество записей)."
+
+    count = None
+    "Общее количество записанных инструкций."
+
+    needs_instructions = True
+
+    def __init__(self, depth=1 << 20, spill=None):
+        assert depth > 0, "depth should be positive"
+        self.depth = depth
+        self.spill = spill
+        self.count = 0
+        self._buffer = bytearray(depth * RECORD.size)
+        self._offset = 0
+        self._spilled = 0
+
+    def _record(self, tick, pc, addr, value, acc):
+        RECORD.pack_into(self._buffer, self._offset, tick, pc, addr, value, acc)
+        self.count += 1
+        self._offset += RECORD.size
+        if self._offset == len(self._buffer):
+            if self.spill is not None:
+                self.spill.write(memoryview(self._buffer)[self._spilled :])
+            self._offset = self._spilled = 0
+
+    def instruction(self, control_unit):
+        data_path = control_unit.data_path
+        addr = data_path.data_address
+        self._record(control_unit._tick, control_unit.program_counter, addr, data_path.data_memory[addr], data_path.acc)
+
+    def halt(self, control_unit, reason):
+        self.flush()
+
+    def flush(self):
+        """Сбросить в `spill` записи, ещё не сброшенные туда."""
+        if self.spill is not None and self._spilled < self._offset:
+            self.spill.write(memoryview(self._buffer)[self._spilled : self._offset])
+            self._spilled = self._offset
+
+    def records(self):
+        """Последние (не более `depth`) записи в порядке исполнения (`bytes`)."""
+        if self.count <= self.depth:
+            return bytes(self._buffer[: self._offset])
+        return bytes(self._buffer[self._offset :] + self._buffer[: self._offset])
+
+
+def state_repr(program, tick, pc, addr, value, acc):
+    """Состояние процессора в формате журнала (см. `machine.ControlUnit`)."""
+    state = "TICK: {:3} PC: {:3} ADDR: {:3} MEM_OUT: {} ACC: {}".format(tick, pc, addr, value, acc)
+
+    instr = str(program.opcode(pc))
+    if program.args[pc] != NO_ARG:
+        instr += " {}".format(program.args[pc])
+
+    term = program.terms[pc]
+    if term is not None:
+        instr += "  ('{}'@{}:{})".format(term.symbol, term.line, term.pos)
+
+    return "{} \t{}".format(state, instr)
+
+
+def render_records(data, program):
+    """Декодировать записи `RECORD` (`bytes` или файл сброса) в строки журнала.
+    `program` -- машинный код (`isa.DecodedProgram`), которым записи получены.
+    """
+    for tick, pc, addr, value, acc in RECORD.iter_unpack(data):
+        yield state_repr(program, tick, pc, addr, value, acc)
@@ -0,0 +1,84 @@
+"""Кэш результатов трансляции.
+
+Ключ записи -- хэш исходного текста и версии транслятора (content-addressed):
+изменение исходника или транслятора даёт новый ключ, поэтому инвалидация не
+нужна. Запись -- файл с машинным кодом в формате `isa.write_code`.
+
+Размер каталога ограничен (`max_bytes`): при превышении удаляются записи, к
+которым дольше всего не обращались (LRU). Время обращения -- время изменения
+файла, оно обновляется при каждом попадании.
+"""
+
+import contextlib
+import hashlib
+import os
+import tempfile
+
+
+def default_cache_dir():
+    """Каталог кэша по умолчанию."""
+    return os.path.join(tempfile.gettempdir(), "translation_cache")
+
+
+class TranslationCache:
+    """Кэш трансляции в каталоге `directory`.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     cache = TranslationCache(directory, max_bytes=10)
+    ...     first, second = cache.key("a", "1"), cache.key("b", "1")
+    ...     cache.put(first, "12345678")
+    ...     cache.put(second, "87654321")
+    ...     cache.get(first), cache.get(second)
+    (None, '87654321')
+    """
+
+    def __init__(self, directory=None, max_bytes=64 << 20):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def key(self, source, version):
+        """Ключ записи для исходного текста `source` и версии транслятора."""
+        return hashlib.sha256("{}\0{}".format(version, source).encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        """Машинный код (текст) по ключу или `None` при промахе."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as file:
+                text = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return text
+
+    def put(self, key, text):
+        """Сохранить машинный код и при необходимости вытеснить старые записи."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp_path, self._path(key))
+        self._evict(self._path(key))
+
+    def _evict(self, keep):
+        """Удалять самые старые записи, кроме `keep`, пока размер кэша больше `max_bytes`."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                total += stat.st_size
+                if entry.path != keep:
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            # Запись могла удалить другая копия транслятора.
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
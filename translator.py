@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+"""Транслятор Brainfuck в машинный код.
+
+Трансляция выполняется за один проход по тексту программы:
+
+1. Выделение значимых символов (остальные символы -- комментарии).
+2. Проверка парности квадратных скобок: адреса `jz` незакрытых `[` хранятся в
+   стеке, поэтому сопоставление скобок -- O(n).
+3. Генерация машинного кода: один символ -- одна инструкция, `[` -- `jz` на
+   инструкцию после парной `]`, `]` -- `jmp` на парную `[`.
+
+Оптимизация (`optimize`):
+
+- соседние взаимно уничтожающиеся команды (`+-`, `-+`, `<>`, `><`) не
+  порождают инструкций. Выход за границу памяти внутри такой пары (`<>` на
+  нулевой ячейке) при этом не обнаруживается;
+- мёртвые циклы удаляются целиком. Цикл мёртвый, если перед ним текущая
+  ячейка заведомо равна нулю: в начале программы (пока ни одна ячейка не
+  изменялась, например, цикл-комментарий) и сразу после другого цикла.
+
+Экономия (`Savings`): `instr` -- на сколько инструкций меньше машинный код,
+`ticks` -- сколько тактов экономится при однократном исполнении каждого
+удалённого фрагмента (пара команд -- сумма их тактов, мёртвый цикл -- такты
+`jz`, тело которого не исполнялось бы).
+"""
+
+import re
+import sys
+from array import array
+
+import optimizer
+from isa import (
+    NO_ARG,
+    OP_DEC,
+    OP_HALT,
+    OP_INC,
+    OP_INPUT,
+    OP_JMP,
+    OP_JZ,
+    OP_LEFT,
+    OP_PRINT,
+    OP_RIGHT,
+    TICKS,
+    DecodedProgram,
+    LazyTerms,
+    Savings,
+    Term,
+    write_code,
+)
+
+SYMBOLS = {"+": OP_INC, "-": OP_DEC, "<": OP_LEFT, ">": OP_RIGHT, ".": OP_PRINT, ",": OP_INPUT, "[": OP_JZ, "]": OP_JMP}
+"Значимые символы языка и соответствующие им коды операций."
+
+OPPOSITE = {OP_INC: OP_DEC, OP_DEC: OP_INC, OP_LEFT: OP_RIGHT, OP_RIGHT: OP_LEFT}
+"Взаимно уничтожающиеся команды."
+
+_COMMANDS = re.compile(r"[-+<>.,\[\]]")
+
+_SYMBOL_OF = {opcode: symbol for symbol, opcode in SYMBOLS.items()}
+
+
+def translate_program(text, optimize=False):
+    """Трансляция текста программы в `DecodedProgram`. Вернуть программу и
+    экономию от оптимизации (`Savings`).
+
+    >>> program, saved = translate_program("[-]+-++>.<[>]", optimize=True)
+    >>> [str(program.opcode(pc)) for pc in range(len(program))], saved
+    (['increment', 'increment', 'right', 'print', 'left', 'jz', 'right', 'jmp', 'halt'], Savings(instr=5, ticks=6))
+    """
+    opcodes = array("B")
+    args = array("i")
+    lines = array("I")
+    positions = array("I")
+    jumps = []
+    saved_instr = saved_ticks = 0
+
+    dead = 0  # глубина вложенности внутри удаляемого мёртвого цикла
+    zero = True  # текущая ячейка заведомо равна нулю
+    pristine = True  # ни одна ячейка ещё не изменялась
+
+    for line_num, line in enumerate(text.splitlines(), 1):
+        for match in _COMMANDS.finditer(line):
+            opcode = SYMBOLS[match.group()]
+
+            if dead:
+                dead += 1 if opcode == OP_JZ else -1 if opcode == OP_JMP else 0
+                saved_instr += 1
+                continue
+
+            arg = NO_ARG
+            if opcode == OP_JZ:
+                if optimize and zero:
+                    dead = 1
+                    saved_instr += 1
+                    saved_ticks += TICKS[OP_JZ]
+                    continue
+                jumps.append(len(opcodes))
+                zero = False
+            elif opcode == OP_JMP:
+                assert jumps, "Unbalanced brackets!"
+                arg = jumps.pop()
+                args[arg] = len(opcodes) + 1
+                zero = True
+            elif opcode in (OP_LEFT, OP_RIGHT):
+                zero = pristine
+            elif opcode != OP_PRINT:
+                zero = pristine = False
+
+            if optimize and opcodes and opcodes[-1] == OPPOSITE.get(opcode):
+                # Отменяемая команда -- последняя инструкция: её можно убрать,
+                # на неё не бывает переходов (`jz` ведёт за `jmp`, `jmp` -- на `jz`).
+                opcodes.pop()
+                args.pop()
+                lines.pop()
+                positions.pop()
+                saved_instr += 2
+                saved_ticks += TICKS[opcode] + TICKS[OPPOSITE[opcode]]
+                continue
+
+            opcodes.append(opcode)
+            args.append(arg)
+            lines.append(line_num)
+            positions.append(match.start() + 1)
+
+    assert not jumps and not dead, "Unbalanced brackets!"
+    opcodes.append(OP_HALT)
+    args.append(NO_ARG)
+
+    def term(pc):
+        if opcodes[pc] == OP_HALT:
+            return None
+        return Term(lines[pc], positions[pc], _SYMBOL_OF[opcodes[pc]])
+
+    return DecodedProgram(opcodes, args, LazyTerms(len(opcodes), term)), Savings(saved_instr, saved_ticks)
+
+
+def translate(text, optimize=False):
+    """Трансляция текста программы в машинный код (список инструкций)."""
+    program, _ = translate_program(text, optimize)
+    return program.to_code()
+
+
+def main(source, target, optimize=False):
+    """Функция запуска транслятора. Параметры -- исходный и целевой файлы,
+    `optimize` -- включить оптимизацию (в том числе `optimizer`) и напечатать
+    экономию.
+    """
+    with open(source, encoding="utf-8") as f:
+        source = f.read()
+
+    program, saved = translate_program(source, optimize)
+    if optimize:
+        program, peephole = optimizer.optimize(program)
+        saved = Savings(saved.instr + peephole.instr, saved.ticks + peephole.ticks)
+    write_code(target, program)
+
+    print("source LoC:", len(source.split("\n")), "code instr:", len(program))
+    if optimize:
+        print("saved instr:", saved.instr, "ticks:", saved.ticks)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    optimize = "-O" in args
+    if optimize:
+        args.remove("-O")
+    assert len(args) == 2, "Wrong arguments: translator.py [-O] <input_file> <target_file>"
+    main(*args, optimize=optimize)
@@ -2,9 +2,20 @@
 """Транслятор Asm в машинный код.
 """
 
+import json
+import logging
 import sys
+from array import array
 
-from isa import Opcode, Term, write_code
+import optimizer
+from isa import NO_ARG, OPCODES, DecodedProgram, LazyTerms, Opcode, Term, dump_code, write_binary, write_code
+from translation_cache import TranslationCache
+
+VERSION = "1"
+"Версия транслятора. Входит в ключ кэша трансляции."
+
+BINARY_SUFFIX = ".bin"
+"Расширение целевого файла, для которого используется двоичный формат."
 
 
 def get_meaningful_token(line):
@@ -14,85 +25,164 @@ def get_meaningful_token(line):
     return line.split(";", 1)[0].strip()
 
 
-def translate_stage_1(text):
-    """Первый проход транслятора. Преобразование текста программы в список
-    инструкций и определение адресов меток.
+class Assembler:
+    """Однопроходный ассемблер.
+
+    Строки исходного текста подаются по одной (`feed`), инструкции сразу
+    записываются в компактные массивы: коды операций, аргументы, номера строк и
+    мнемоники (`Term` создаются только по запросу, см. `isa.LazyTerms`).
+
+    Ссылка на уже определённую метку подставляется сразу. Ссылка вперёд
+    записывается в таблицу исправлений (`fixups`: метка -> адреса инструкций) и
+    исправляется, когда встречается определение метки.
 
     Особенность: транслятор ожидает, что в строке может быть либо 1 метка,
     либо 1 инструкция. Поэтому: `col` заполняется всегда 0, так как не несёт
     смысловой нагрузки.
     """
-    code = []
-    labels = {}
 
-    for line_num, raw_line in enumerate(text.splitlines(), 1):
+    def __init__(self):
+        self.opcodes = array("B")
+        self.args = array("i")
+        self.lines = array("I")
+        self.symbols = []
+        self.labels = {}
+        self.fixups = {}
+        self.line_num = 0
+
+    def feed(self, raw_line):
+        """Разобрать очередную строку исходного текста (без перевода строки)."""
+        self.line_num += 1
         token = get_meaningful_token(raw_line)
         if token == "":
-            continue
+            return
 
-        pc = len(code)
+        pc = len(self.opcodes)
 
         if token.endswith(":"):  # токен содержит метку
             label = token.strip(":")
-            assert label not in labels, "Redefinition of label: {}".format(label)
-            labels[label] = pc  # привязываем к метке место, на которая она указывает (индекс pc)
-        elif " " in token:  # токен содержит инструкцию с операндом (отделены пробелом)
+            assert label not in self.labels, "Redefinition of label: {}".format(label)
+            self.labels[label] = pc  # привязываем к метке место, на которая она указывает (индекс pc)
+            for fixup in self.fixups.pop(label, ()):
+                self.args[fixup] = pc
+            return
+
+        if " " in token:  # токен содержит инструкцию с операндом (отделены пробелом)
             sub_tokens = token.split(" ")
             assert len(sub_tokens) == 2, "Invalid instruction: {}".format(token)  # предусмотрен 1 операнд !
-            mnemonic, arg = sub_tokens  # разделяем токен на команду и аргумент
-            opcode = Opcode(mnemonic)   # представляем код операции в виде Enum Opcode
+            mnemonic, label = sub_tokens  # разделяем токен на команду и аргумент
+            opcode = Opcode(mnemonic)  # представляем код операции в виде Enum Opcode
             assert opcode == Opcode.JZ or opcode == Opcode.JMP, "Only `jz` and `jnz` instructions take an argument"
-            code.append({"index": pc, "opcode": opcode, "arg": arg, "term": Term(line_num, 0, token)})
+            arg = self.labels.get(label)
+            if arg is None:
+                self.fixups.setdefault(label, []).append(pc)
+                arg = NO_ARG
         else:  # токен содержит инструкцию без операндов
             opcode = Opcode(token)
-            code.append({"index": pc, "opcode": opcode, "term": Term(line_num, 0, token)})
+            arg = NO_ARG
+
+        self.opcodes.append(_CODES[opcode])
+        self.args.append(arg)
+        self.lines.append(self.line_num)
+        self.symbols.append(token)
+
+    def finish(self):
+        """Проверить, что все метки определены, и вернуть `DecodedProgram`."""
+        assert not self.fixups, "Label not defined: " + next(iter(self.fixups), "")
+        logging.debug("labels: %s", self.labels)
 
-    print("stage 1")
-    print(labels)
-    print(code)
+        lines, symbols = self.lines, self.symbols
+        terms = LazyTerms(len(symbols), lambda pc: Term(lines[pc], 0, symbols[pc]))
+        return DecodedProgram(self.opcodes, self.args, terms)
 
-    return labels, code
 
+_CODES = {opcode: number for number, opcode in enumerate(OPCODES)}
 
-def translate_stage_2(labels, code):
-    """Второй проход транслятора. В уже определённые инструкции подставляются
-    адреса меток."""
-    for instruction in code:
-        if "arg" in instruction:
-            label = instruction["arg"]
-            assert label in labels, "Label not defined: " + label
-            instruction["arg"] = labels[label]
-    return code
+
+def assemble(lines):
+    """Трансляция строк исходного текста (любой итерируемый объект, например
+    открытый файл) в `DecodedProgram` за один проход.
+    """
+    assembler = Assembler()
+    for line in lines:
+        # Разбиение на строки -- как у `str.splitlines` для всего текста.
+        for raw_line in line.splitlines() or [""]:
+            assembler.feed(raw_line)
+    return assembler.finish()
 
 
 def translate(text):
-    """Трансляция текста программы на Asm в машинный код.
+    """Трансляция текста программы на Asm в машинный код (список инструкций)."""
+    return assemble(text.splitlines()).to_code()
 
-    Выполняется в два прохода:
 
-    1. Разбор текста на метки и инструкции.
+def _counted(lines, counter):
+    """Передать строки дальше, подсчитывая переводы строк в `counter[0]`."""
+    for line in lines:
+        counter[0] += line.count("\n")
+        yield line
 
-    2. Подстановка адресов меток в операнды инструкции.
-    """
-    labels, code = translate_stage_1(text)
-    code = translate_stage_2(labels, code)
 
-    # ruff: noqa: RET504
-    return code
+def main(source, target, cache_dir=None, quiet=False, optimize=False):
+    """Функция запуска транслятора. Параметры -- исходный и целевой файлы.
 
+    Исходный файл читается построчно и транслируется за один проход
+    (`assemble`), машинный код пишется в целевой файл по одной инструкции.
 
-def main(source, target):
-    """Функция запуска транслятора. Параметры -- исходный и целевой файлы."""
-    with open(source, encoding="utf-8") as f:
-        source = f.read()
+    Если имя целевого файла оканчивается на `BINARY_SUFFIX`, машинный код
+    записывается в двоичном формате (`isa.write_binary`), иначе -- в JSON.
 
-    code = translate(source)
+    Если задан `cache_dir`, результат берётся из кэша трансляции
+    (`translation_cache`), а при промахе -- сохраняется в него. Ключ кэша --
+    хэш всего исходного текста, поэтому в этом случае файл читается целиком.
 
-    write_code(target, code)
-    print("source LoC:", len(source.split("\n")), "code instr:", len(code))
+    `optimize` -- пропустить машинный код через `optimizer` (в кэше хранится
+    неоптимизированный код) и напечатать экономию.
+
+    `quiet` -- не печатать итоговую статистику.
+    """
+    code = None
+    text = None
+    newlines = [0]
+    with open(source, encoding="utf-8") as f:
+        if cache_dir is None:
+            code = assemble(_counted(f, newlines))
+        else:
+            source = f.read()
+            newlines[0] = source.count("\n")
+            cache = TranslationCache(cache_dir)
+            key = cache.key(source, VERSION)
+            text = cache.get(key)
+            if text is None:
+                code = assemble(source.splitlines())
+                text = dump_code(code)
+                cache.put(key, text)
+            else:
+                code = json.loads(text)
+
+    if optimize:
+        code, saved = optimizer.optimize(code)
+        text = None
+
+    if target.endswith(BINARY_SUFFIX):
+        write_binary(target, code)
+    elif text is not None:
+        # Готовый текст JSON (из кэша или только что сохранённый в кэш).
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        write_code(target, code)
+
+    if not quiet:
+        print("source LoC:", newlines[0] + 1, "code instr:", len(code))
+        if optimize:
+            print("saved instr:", saved.instr, "ticks:", saved.ticks)
 
 
 if __name__ == "__main__":
-    assert len(sys.argv) == 3, "Wrong arguments: translator_asm.py <input_file> <target_file>"
-    _, source, target = sys.argv
-    main(source, target)
+    args = sys.argv[1:]
+    flags = {flag for flag in ("-q", "-O") if flag in args}
+    for flag in flags:
+        args.remove(flag)
+    assert len(args) in (2, 3), "Wrong arguments: translator_asm.py [-q] [-O] <input_file> <target_file> [<cache_dir>]"
+    main(*args, quiet="-q" in flags, optimize="-O" in flags)
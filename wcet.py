@@ -0,0 +1,532 @@
+#!/usr/bin/python3
+"""Статическая оценка времени исполнения (WCET) по графу потока управления.
+
+Машинный код (результат `isa.read_code` или `isa.DecodedProgram`) делится на
+базовые блоки (`basic_blocks`); стоимость блока -- количество инструкций и
+тактов (`isa.TICKS`, как в `machine.ControlUnit`; `halt` не входит в
+`instr_counter` и не занимает тактов). Циклы -- естественные циклы графа:
+обратная дуга ведёт в заголовок, который доминирует над её началом (`loops`).
+
+Оценка (`estimate`) строится снизу вверх: самые вложенные циклы сворачиваются
+первыми. Для цикла с заголовком `h` по ациклическому графу тела вычисляются
+кратчайший и длиннейший пути одной итерации (от `h` до обратной дуги) и пути
+до каждого выхода. Если тело исполняется от `low` до `high` раз за вход в
+цикл, цикл заменяется узлом, выход из которого стоит
+`low * итерация_min + выход_min` ... `high * итерация_max + выход_max`. На
+внешнем уровне результат -- кратчайший и длиннейший пути от начала программы
+до `halt`. Оцениваются только исполнения, завершившиеся `halt` (не по концу
+ввода и не по ошибке).
+
+Границы циклов (`loop_bounds`) -- количество исполнений тела за вход в цикл,
+задаются по адресу заголовка: число (верхняя граница) или пара
+`(low, high)`. Если граница не задана, она выводится (`infer_bounds`) для
+структурированного кода (переходы -- только пары `jz`/`jmp` циклов, как после
+трансляции Brainfuck), тело которого возвращает головку на место (с учётом
+вложенных циклов):
+
+- ячейка заголовка меняется за итерацию на постоянное `d != 0 (mod 256)` --
+  не больше 255 итераций (если цикл завершается, ноль достигается за первые
+  256 значений);
+- головка смещается за итерацию на `s != 0`, задан размер памяти `size` --
+  не больше `(size - 1) // |s|` итераций (иначе головка выйдет за границы);
+- значения ячеек перед циклами внешнего уровня известны, пока их можно
+  вычислить (память в начале -- нули, ввод неизвестен): тогда количество
+  итераций вычисляется точно.
+
+Цикл без границы даёт неограниченную худшую оценку (`UNBOUNDED`), как и
+несводимый поток управления (возможен в коде на Asm): для него лучшая оценка
+-- кратчайший путь до остановки.
+"""
+
+import heapq
+import math
+import sys
+from collections import namedtuple
+
+from isa import (
+    OP_DEC,
+    OP_HALT,
+    OP_INC,
+    OP_INPUT,
+    OP_JMP,
+    OP_JZ,
+    OP_LEFT,
+    OP_PRINT,
+    OP_RIGHT,
+    TICKS,
+    decode_program,
+    read_program,
+)
+
+UNBOUNDED = math.inf
+"Граница, если цикл может исполняться сколь угодно долго."
+
+COUNTER_BOUND = 255
+"Граница цикла-счётчика: ячейка заголовка меняется на постоянную величину."
+
+
+class Block(namedtuple("Block", "start end instr ticks successors")):
+    """Базовый блок: инструкции `[start, end)`, их количество (без `halt`) и
+    такты, номера блоков-последователей.
+    """
+
+    __slots__ = ()
+
+
+class Loop(namedtuple("Loop", "header body")):
+    """Естественный цикл: номер блока-заголовка и множество номеров блоков
+    тела (вместе с заголовком).
+    """
+
+    __slots__ = ()
+
+
+class Estimate(namedtuple("Estimate", "instr ticks")):
+    """Оценка исполнения: пары `(best, worst)` для количества инструкций и
+    тактов.
+    """
+
+    __slots__ = ()
+
+
+def basic_blocks(program):
+    """Базовые блоки программы (`isa.DecodedProgram`).
+
+    >>> from isa import Opcode
+    >>> program = decode_program([{"opcode": Opcode.INPUT}, {"opcode": Opcode.JZ, "arg": 4},
+    ...     {"opcode": Opcode.DEC}, {"opcode": Opcode.JMP, "arg": 1}, {"opcode": Opcode.HALT}])
+    >>> for block in basic_blocks(program):
+    ...     print(block)
+    Block(start=0, end=1, instr=1, ticks=2, successors=(1,))
+    Block(start=1, end=2, instr=1, ticks=2, successors=(2, 3))
+    Block(start=2, end=4, instr=2, ticks=3, successors=(1,))
+    Block(start=4, end=5, instr=0, ticks=0, successors=())
+    """
+    opcodes = program.opcodes
+    args = program.args
+    size = len(opcodes)
+    leaders = {0}
+    for pc, opcode in enumerate(opcodes):
+        if opcode == OP_JMP or opcode == OP_JZ:
+            leaders.update((args[pc], pc + 1))
+        elif opcode == OP_HALT:
+            leaders.add(pc + 1)
+    starts = sorted(leader for leader in leaders if leader < size)
+    numbers = {start: number for number, start in enumerate(starts)}
+
+    blocks = []
+    for start, end in zip(starts, starts[1:] + [size]):
+        last = end - 1
+        opcode = opcodes[last]
+        if opcode == OP_JMP:
+            targets = [args[last]]
+        elif opcode == OP_JZ:
+            targets = [end, args[last]]
+        elif opcode == OP_HALT:
+            targets = []
+        else:
+            targets = [end]
+        # Переход за конец программы -- остановка с ошибкой, последователя нет.
+        successors = tuple(dict.fromkeys(numbers[target] for target in targets if target in numbers))
+        instr = sum(opcodes[pc] != OP_HALT for pc in range(start, end))
+        ticks = sum(TICKS[opcodes[pc]] for pc in range(start, end))
+        blocks.append(Block(start, end, instr, ticks, successors))
+    return blocks
+
+
+def _reachable(blocks):
+    """Номера блоков, достижимых из начала, в обратном порядке обхода в
+    глубину (reverse postorder).
+    """
+    order = []
+    seen = set()
+    stack = [(0, iter(blocks[0].successors))] if blocks else []
+    if blocks:
+        seen.add(0)
+    while stack:
+        number, successors = stack[-1]
+        for successor in successors:
+            if successor not in seen:
+                seen.add(successor)
+                stack.append((successor, iter(blocks[successor].successors)))
+                break
+        else:
+            stack.pop()
+            order.append(number)
+    return order[::-1]
+
+
+def loops(blocks):
+    """Естественные циклы графа блоков, от вложенных к внешним. Циклы с общим
+    заголовком объединяются.
+    """
+    order = _reachable(blocks)
+    position = {number: index for index, number in enumerate(order)}
+    predecessors = {number: [] for number in order}
+    for number in order:
+        for successor in blocks[number].successors:
+            predecessors[successor].append(number)
+
+    # Доминаторы (Cooper, Harvey, Kennedy): непосредственный доминатор каждого блока.
+    idom = {order[0]: order[0]} if order else {}
+    changed = True
+    while changed:
+        changed = False
+        for number in order[1:]:
+            new = None
+            for predecessor in predecessors[number]:
+                if predecessor not in idom:
+                    continue
+                if new is None:
+                    new = predecessor
+                    continue
+                a, b = predecessor, new
+                while a != b:
+                    while position[a] > position[b]:
+                        a = idom[a]
+                    while position[b] > position[a]:
+                        b = idom[b]
+                new = a
+            if idom.get(number) != new:
+                idom[number] = new
+                changed = True
+
+    def dominates(header, number):
+        while number != header:
+            if idom[number] == number:
+                return False
+            number = idom[number]
+        return True
+
+    bodies = {}
+    for number in order:
+        for successor in blocks[number].successors:
+            if dominates(successor, number):
+                body = bodies.setdefault(successor, {successor})
+                stack = [number]
+                while stack:
+                    node = stack.pop()
+                    if node not in body:
+                        body.add(node)
+                        stack.extend(predecessors[node])
+    return sorted((Loop(header, frozenset(body)) for header, body in bodies.items()), key=lambda loop: len(loop.body))
+
+
+def _structured(program):
+    """Все ли переходы -- пары `jz`/`jmp` циклов (`jz h` ведёт за `jmp h`)."""
+    opcodes = program.opcodes
+    args = program.args
+    for pc, opcode in enumerate(opcodes):
+        if opcode == OP_JZ:
+            target = args[pc]
+            if not pc < target <= len(opcodes) or opcodes[target - 1] != OP_JMP or args[target - 1] != pc:
+                return False
+        elif opcode == OP_JMP:
+            target = args[pc]
+            if not 0 <= target < pc or opcodes[target] != OP_JZ or args[target] != pc + 1:
+                return False
+    return True
+
+
+def _effect(program, start, end, cache):
+    """Действие участка `[start, end)` структурированного кода на память
+    относительно начального положения головки: `(shift, deltas, linear)`, где
+    `deltas` -- изменения ячеек по смещениям (`None` -- значение неизвестно),
+    `linear` -- нет вложенных циклов и ввода. `None`, если действие нельзя
+    описать так (вложенный цикл смещает головку, `halt`).
+    """
+    key = (start, end)
+    if key in cache:
+        return cache[key]
+    opcodes = program.opcodes
+    shift = 0
+    deltas = {}
+    linear = True
+    pc = start
+    result = None
+    while pc < end:
+        opcode = opcodes[pc]
+        if opcode == OP_RIGHT:
+            shift += 1
+        elif opcode == OP_LEFT:
+            shift -= 1
+        elif opcode == OP_INC or opcode == OP_DEC:
+            if deltas.get(shift, 0) is not None:
+                deltas[shift] = (deltas.get(shift, 0) + (1 if opcode == OP_INC else -1)) & 0xFF
+        elif opcode == OP_INPUT:
+            deltas[shift] = None
+            linear = False
+        elif opcode == OP_JZ:
+            after = program.args[pc]
+            inner = _effect(program, pc + 1, after - 1, cache)
+            if inner is None or inner[0] != 0:
+                break
+            for offset in inner[1]:
+                deltas[shift + offset] = None
+            deltas[shift] = None
+            linear = False
+            pc = after
+            continue
+        elif opcode != OP_PRINT:
+            break
+        pc += 1
+    else:
+        result = (shift, deltas, linear)
+    cache[key] = result
+    return result
+
+
+def _exact(program, cache):
+    """Точное количество итераций циклов внешнего уровня, перед которыми
+    значения ячеек известны: адрес заголовка -> `(n, n)`.
+    """
+    opcodes = program.opcodes
+    args = program.args
+    exact = {}
+    cells = {}  # адрес -> значение; None -- неизвестно, отсутствует -- ноль
+    addr = 0
+    pc = 0
+    while pc < len(opcodes):
+        opcode = opcodes[pc]
+        if opcode == OP_RIGHT:
+            addr += 1
+        elif opcode == OP_LEFT:
+            addr -= 1
+        elif opcode == OP_INC or opcode == OP_DEC:
+            if cells.get(addr, 0) is not None:
+                cells[addr] = (cells.get(addr, 0) + (1 if opcode == OP_INC else -1)) & 0xFF
+        elif opcode == OP_INPUT:
+            cells[addr] = None
+        elif opcode == OP_JZ:
+            after = args[pc]
+            value = cells.get(addr, 0)
+            if value == 0:
+                exact[pc] = (0, 0)
+                pc = after
+                continue
+            effect = _effect(program, pc + 1, after - 1, cache)
+            if effect is None or effect[0] != 0:
+                break
+            _, deltas, linear = effect
+            iterations = None
+            if value is not None and deltas.get(0, 0) is not None:
+                step = deltas.get(0, 0)
+                iterations = next((n for n in range(256) if (value + n * step) & 0xFF == 0), None)
+                if iterations is None:  # цикл не завершается
+                    break
+                exact[pc] = (iterations, iterations)
+            for offset, delta in deltas.items():
+                cell = addr + offset
+                known = iterations is not None and linear and cells.get(cell, 0) is not None
+                cells[cell] = (cells.get(cell, 0) + iterations * delta) & 0xFF if known else None
+            cells[addr] = 0
+            pc = after
+            continue
+        elif opcode != OP_PRINT:
+            break
+        pc += 1
+    return exact
+
+
+def infer_bounds(program, size=None):
+    """Выведенные границы циклов структурированного кода: адрес заголовка
+    (`jz`) -> `(low, high)`. `size` -- размер памяти данных (для циклов,
+    смещающих головку).
+
+    >>> from translator import translate
+    >>> infer_bounds(decode_program(translate("++[>+++[-]<-]>[>]")), 10)
+    {2: (2, 2), 7: (0, 255), 14: (0, 9)}
+    """
+    program = decode_program(program)
+    if not _structured(program):
+        return {}
+    cache = {}
+    bounds = {}
+    for pc, opcode in enumerate(program.opcodes):
+        if opcode != OP_JZ:
+            continue
+        effect = _effect(program, pc + 1, program.args[pc] - 1, cache)
+        if effect is None:
+            continue
+        shift, deltas, _ = effect
+        if shift == 0 and deltas.get(0, 0) not in (None, 0):
+            bounds[pc] = (0, COUNTER_BOUND)
+        elif shift != 0 and size is not None:
+            bounds[pc] = (0, (size - 1) // abs(shift))
+    bounds.update(_exact(program, cache))
+    return bounds
+
+
+def _times(count, cost):
+    return 0 if count == 0 or cost == 0 else count * cost
+
+
+def _merge(old, path):
+    return path if old is None else (min(old[0], path[0]), max(old[1], path[1]))
+
+
+def _paths(region, start, cost, edges, rep, header):
+    """Кратчайшие и длиннейшие пути по ациклическому графу узлов `region` от
+    `start`. Вернуть пути до обратных дуг в `header` (или `None`) и до каждого
+    выхода из области по номеру блока (`None` -- остановка): `(best, worst)`.
+    Если граф не ациклический (поток управления несводимый), вернуть `None`.
+    """
+    indegree = dict.fromkeys(region, 0)
+    for node in region:
+        for target, _ in edges[node]:
+            if target != header and rep(target) in indegree:
+                indegree[rep(target)] += 1
+    ready = [node for node in region if indegree[node] == 0]
+    arrival = {start: (0, 0)}
+    back = None
+    exits = {}
+    processed = 0
+    while ready:
+        node = ready.pop()
+        processed += 1
+        path = arrival.get(node)  # `None` -- недостижим от `start` внутри области
+        if path is not None:
+            path = (path[0] + cost[node][0], path[1] + cost[node][1])
+            if not edges[node]:
+                exits[None] = _merge(exits.get(None), path)
+        for target, (edge_best, edge_worst) in edges[node]:
+            inner = target != header and rep(target) in indegree
+            if path is not None:
+                edge = (path[0] + edge_best, path[1] + edge_worst)
+                if target == header:
+                    back = _merge(back, edge)
+                elif inner:
+                    arrival[rep(target)] = _merge(arrival.get(rep(target)), edge)
+                else:
+                    exits[target] = _merge(exits.get(target), edge)
+            if inner:
+                indegree[rep(target)] -= 1
+                if indegree[rep(target)] == 0:
+                    ready.append(rep(target))
+    if processed != len(region):
+        return None
+    return back, exits
+
+
+def _estimate(blocks, program_loops, bounds, weight):
+    cost = {number: (weight(block), weight(block)) for number, block in enumerate(blocks)}
+    edges = {number: [(successor, (0, 0)) for successor in block.successors] for number, block in enumerate(blocks)}
+    owner = {}
+
+    def rep(number):
+        while number in owner:
+            number = owner[number]
+        return number
+
+    for index, loop in enumerate(program_loops):
+        node = ("loop", index)
+        region = {rep(number) for number in loop.body}
+        paths = _paths(region, loop.header, cost, edges, rep, loop.header)
+        if paths is None:
+            return _shortest(blocks, weight), UNBOUNDED
+        back, exits = paths
+        low, high = bounds.get(blocks[loop.header].start, (0, UNBOUNDED))
+        cost[node] = (0, 0)
+        edges[node] = [
+            (target, (_times(low, back[0]) + best, _times(high, back[1]) + worst))
+            for target, (best, worst) in exits.items()
+        ]
+        if not edges[node]:  # из цикла нет выхода: остановки нет
+            edges[node] = [("never", (0, 0))]
+        for member in region:
+            owner[member] = node
+
+    region = {rep(number) for number in _reachable(blocks)}
+    if not region:
+        return UNBOUNDED, UNBOUNDED
+    paths = _paths(region, rep(0), cost, edges, rep, -1)
+    if paths is None:
+        return _shortest(blocks, weight), UNBOUNDED
+    return paths[1].get(None, (UNBOUNDED, UNBOUNDED))
+
+
+def _shortest(blocks, weight):
+    """Кратчайший путь от начала до остановки без учёта границ циклов
+    (алгоритм Дейкстры) -- нижняя оценка для несводимого потока управления.
+    """
+    distance = {0: weight(blocks[0])}
+    queue = [(distance[0], 0)]
+    while queue:
+        path, number = heapq.heappop(queue)
+        if path > distance[number]:
+            continue
+        if not blocks[number].successors:
+            return path
+        for successor in blocks[number].successors:
+            through = path + weight(blocks[successor])
+            if through < distance.get(successor, UNBOUNDED):
+                distance[successor] = through
+                heapq.heappush(queue, (through, successor))
+    return UNBOUNDED
+
+
+def estimate(code, loop_bounds=None, size=None):
+    """Оценить количество инструкций и тактов исполнения программы (список
+    инструкций или `isa.DecodedProgram`), завершившегося `halt`. Вернуть
+    `Estimate`.
+
+    `loop_bounds` -- границы циклов по адресу заголовка (число или пара
+    `(low, high)`), дополняют и заменяют выведенные `infer_bounds` (`size` --
+    размер памяти данных).
+
+    >>> from translator import translate
+    >>> estimate(translate("++[>+++<-]"))
+    Estimate(instr=(19, 19), ticks=(32, 32))
+    >>> estimate(translate(",[-]"))
+    Estimate(instr=(2, 767), ticks=(4, 1279))
+    >>> estimate(translate(",[>]"))
+    Estimate(instr=(2, inf), ticks=(4, inf))
+    >>> estimate(translate(",[>]"), size=10)
+    Estimate(instr=(2, 29), ticks=(4, 40))
+    """
+    program = decode_program(code)
+    bounds = _bounds(program, loop_bounds, size)
+    blocks = basic_blocks(program)
+    program_loops = loops(blocks)
+    return Estimate(
+        _estimate(blocks, program_loops, bounds, lambda block: block.instr),
+        _estimate(blocks, program_loops, bounds, lambda block: block.ticks),
+    )
+
+
+def _bounds(program, loop_bounds, size):
+    """Выведенные границы циклов, дополненные и заменённые заданными."""
+    bounds = infer_bounds(program, size)
+    for header, bound in (loop_bounds or {}).items():
+        bounds[header] = bound if isinstance(bound, tuple) else (0, bound)
+    return bounds
+
+
+def main(code_file, size=None, loop_bounds=None):
+    """Напечатать базовые блоки, циклы с границами и оценку программы."""
+    with read_program(code_file) as program:
+        blocks = basic_blocks(program)
+        bounds = _bounds(program, loop_bounds, size)
+        for block in blocks:
+            successors = " ".join(str(blocks[successor].start) for successor in block.successors)
+            print(
+                "block {}-{} instr: {} ticks: {} ->".format(block.start, block.end - 1, block.instr, block.ticks),
+                successors,
+            )
+        for loop in loops(blocks):
+            header = blocks[loop.header].start
+            low, high = bounds.get(header, (0, UNBOUNDED))
+            print("loop {} blocks: {} iterations: {}..{}".format(header, len(loop.body), low, high))
+        result = estimate(program, loop_bounds, size)
+        print("instr: {}..{} ticks: {}..{}".format(*result.instr, *result.ticks))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 2, (
+        "Wrong arguments: wcet.py <code_file> [<data_memory_size> [<header>=[<low>:]<high> ...]]"
+    )
+    bounds = {}
+    for arg in sys.argv[3:]:
+        header, bound = arg.split("=")
+        bounds[int(header)] = tuple(map(int, bound.split(":"))) if ":" in bound else int(bound)
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None, bounds)